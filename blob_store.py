@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+from datetime import datetime
+
+import zstandard
+
+from state_db import open_state_db
+
+class BlobStore:
+    """
+    Content-addressed store of zstd-compressed values.
+
+    Each distinct value is written once to objects/<hash[:2]>/<hash>.zst, so
+    dumps that share a store directory also share all unchanged blobs.
+    """
+
+    def __init__(self, store_dir, level=3):
+        self.store_dir = store_dir
+        self.objects_dir = os.path.join(store_dir, "objects")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self._compressor = zstandard.ZstdCompressor(level=level)
+        self._decompressor = zstandard.ZstdDecompressor()
+
+    @staticmethod
+    def hash_value(value):
+        return hashlib.sha256(value).hexdigest()
+
+    def object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], f"{digest}.zst")
+
+    def put(self, value):
+        """
+        Store value (bytes) if not present yet. Returns (hash, newly_written).
+        """
+        digest = self.hash_value(value)
+        path = self.object_path(digest)
+        if os.path.exists(path):
+            return digest, False
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp.{os.getpid()}"
+        with open(tmp_path, "wb") as f:
+            f.write(self._compressor.compress(value))
+        os.replace(tmp_path, path)  # Atomic, so a crashed dump never leaves half-written objects
+        return digest, True
+
+    def get(self, digest):
+        with open(self.object_path(digest), "rb") as f:
+            return self._decompressor.decompress(f.read())
+
+    def get_text(self, digest):
+        return self.get(digest).decode('utf-8', errors='ignore')
+
+    def get_json(self, digest):
+        return json.loads(self.get(digest))
+
+
+def decoded_form_flags(value):
+    """
+    Flags describing which views of a BLOB are meaningful (mirrors the .txt/.json files of a full dump).
+    """
+    flags = {"text": False, "json": False}
+    try:
+        value.decode('utf-8')
+        flags["text"] = True
+    except UnicodeDecodeError:
+        pass
+    try:
+        json.loads(value)
+        flags["json"] = True
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        pass
+    return flags
+
+
+def _create_index_file(indexes_dir):
+    """
+    Path of a new, empty index file named after the current time. Created exclusively,
+    so dumps started in the same microsecond still get separate indexes.
+    """
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+    for attempt in range(1000):
+        index_path = os.path.join(indexes_dir, f"{stamp}.jsonl" if attempt == 0 else f"{stamp}_{attempt}.jsonl")
+        try:
+            with open(index_path, "x"):
+                return index_path
+        except FileExistsError:
+            continue
+    raise FileExistsError(f"No free index file name for {stamp} in {indexes_dir}")
+
+
+def key_index_path(index_path):
+    """
+    Sidecar of an index file mapping (table, key) to the byte offset of the entry, for find_entry
+    """
+    return os.path.splitext(index_path)[0] + ".keys.sqlite"
+
+
+# Columns kept inline in the index even when they hold text, so entries can be found by them
+INLINE_COLUMNS = {"key"}
+
+
+def dump_sqlite_db_to_store(db_path, store_dir="sqlite_store"):
+    """
+    Dump all tables into a content-addressed blob store.
+
+    Instead of .bin/.txt/.json/_meta.json files per row, every distinct BLOB is
+    stored once and a single index file (indexes/<timestamp>.jsonl) maps
+    table/key/column to its hash, size and decoded-form flags. TEXT values (which is
+    how state.vscdb stores its values) are stored UTF-8 encoded and flagged "stored_text";
+    numbers, NULLs and the key column are kept inline in the index. A sidecar (key_index_path) holds the
+    offset of every keyed entry, so single values are looked up without a scan.
+    """
+    store = BlobStore(store_dir)
+    indexes_dir = os.path.join(store_dir, "indexes")
+    os.makedirs(indexes_dir, exist_ok=True)
+    index_path = _create_index_file(indexes_dir)
+
+    conn = open_state_db(db_path)
+    try:
+        # On the cursor only: the connection may be shared with the caller
+        cursor = conn.cursor()
+        cursor.row_factory = sqlite3.Row
+
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
+        tables = [row['name'] for row in cursor.fetchall()]
+        print(f"Found {len(tables)} tables: {', '.join(tables)}")
+
+        total_rows = 0
+        total_bytes = 0
+        new_blobs = 0
+        new_bytes = 0
+        # Flags only depend on content, so compute them once per distinct value
+        flags_by_hash = {}
+
+        keys = sqlite3.connect(key_index_path(index_path))
+        keys.execute("CREATE TABLE IF NOT EXISTS entries (tbl TEXT NOT NULL, key TEXT NOT NULL, offset INTEGER NOT NULL, PRIMARY KEY (tbl, key)) WITHOUT ROWID")
+        offset = 0
+        with keys, open(index_path, "w", encoding="utf-8", buffering=1024 * 1024) as index_file:
+            for table in tables:
+                print(f"\nDumping table: {table}")
+                table_rows = 0
+                cursor.execute(f"SELECT rowid AS _rowid, * FROM {table};")
+                for row in cursor:
+                    entry = {"table": table, "rowid": row["_rowid"], "columns": {}, "blobs": {}}
+                    for column in row.keys()[1:]:
+                        value = row[column]
+                        stored_text = isinstance(value, str) and column not in INLINE_COLUMNS
+                        if stored_text:
+                            value = value.encode("utf-8")
+                        elif not isinstance(value, bytes):
+                            entry["columns"][column] = value
+                            continue
+                        digest, is_new = store.put(value)
+                        if digest not in flags_by_hash:
+                            flags_by_hash[digest] = decoded_form_flags(value)
+                        entry["blobs"][column] = {"hash": digest, "size": len(value), "stored_text": stored_text, **flags_by_hash[digest]}
+                        total_bytes += len(value)
+                        if is_new:
+                            new_blobs += 1
+                            new_bytes += len(value)
+                    line = json.dumps(entry) + "\n"
+                    index_file.write(line)
+                    key = entry["columns"].get("key")
+                    if isinstance(key, str):
+                        keys.execute("INSERT OR IGNORE INTO entries (tbl, key, offset) VALUES (?, ?, ?)", (table, key, offset))
+                    offset += len(line.encode("utf-8"))
+                    table_rows += 1
+                print(f"  Table has {table_rows} rows")
+                total_rows += table_rows
+        keys.close()
+    finally:
+        if conn is not db_path:
+            conn.close()
+
+    # Point 'latest' at this dump for the on-demand viewer below
+    with open(os.path.join(store_dir, "LATEST"), "w") as f:
+        f.write(os.path.relpath(index_path, store_dir))
+
+    print(f"\nDatabase dump complete. Index written to {index_path}")
+    print(f"{total_rows} rows, {len(flags_by_hash)} distinct blobs ({total_bytes} bytes referenced)")
+    print(f"{new_blobs} new blobs stored ({new_bytes} bytes before compression)")
+    return index_path
+
+
+def iter_index(store_dir, index_path=None):
+    """
+    Yield the entries of a dump index (the latest one by default).
+    """
+    with open(_resolve_index_path(store_dir, index_path), "r", encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def _resolve_index_path(store_dir, index_path):
+    if index_path is None:
+        with open(os.path.join(store_dir, "LATEST"), "r") as f:
+            index_path = os.path.join(store_dir, f.read().strip())
+    return index_path
+
+
+def find_entry(store_dir, table, key, index_path=None):
+    """
+    The entry of table/key, read at the offset recorded in the index's sidecar.
+    Indexes written before sidecars existed are scanned.
+    """
+    index_path = _resolve_index_path(store_dir, index_path)
+    if os.path.exists(key_index_path(index_path)):
+        keys = sqlite3.connect(key_index_path(index_path))
+        try:
+            row = keys.execute("SELECT offset FROM entries WHERE tbl = ? AND key = ?", (table, key)).fetchone()
+        finally:
+            keys.close()
+        if row is None:
+            return None
+        with open(index_path, "rb") as f:
+            f.seek(row[0])
+            return json.loads(f.readline())
+    for entry in iter_index(store_dir, index_path):
+        if entry["table"] == table and entry["columns"].get("key") == key:
+            return entry
+    return None
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Usage: python blob_store.py <store_directory> <command> [args]")
+        print("\nCommands:")
+        print("  keys <table>                          - List keys of a table in the latest dump")
+        print("  show <table> <key> [bin|text|json]    - Print a value in the requested form (default: text)")
+        sys.exit(1)
+
+    store_dir = sys.argv[1]
+    command = sys.argv[2]
+
+    if command == "keys" and len(sys.argv) >= 4:
+        for entry in iter_index(store_dir):
+            if entry["table"] == sys.argv[3]:
+                print(entry["columns"].get("key", f"row_{entry['rowid']}"))
+    elif command == "show" and len(sys.argv) >= 5:
+        view = sys.argv[5] if len(sys.argv) >= 6 else "text"
+        entry = find_entry(store_dir, sys.argv[3], sys.argv[4])
+        if entry is None or "value" not in entry["blobs"]:
+            print(f"No stored value for {sys.argv[3]}.{sys.argv[4]}")
+            sys.exit(1)
+        blob = entry["blobs"]["value"]
+        store = BlobStore(store_dir)
+        if view == "bin":
+            sys.stdout.buffer.write(store.get(blob["hash"]))
+        elif view == "json":
+            if not blob["json"]:
+                print("Value is not valid JSON")
+                sys.exit(1)
+            print(json.dumps(store.get_json(blob["hash"]), indent=2))
+        else:
+            print(store.get_text(blob["hash"]))
+    else:
+        print(f"Unknown command or missing arguments: {' '.join(sys.argv[2:])}")
+        sys.exit(1)
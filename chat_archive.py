@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+
+import hashlib
+import os
+import sqlite3
+import sys
+import time
+import zlib
+from datetime import datetime
+
+from vscode_chat_viewer.app.archive import CODEC_RAW, CODEC_ZLIB, CODEC_ZSTD, register_archive_functions
+
+TABLES = ["ItemTable", "cursorDiskKV"]
+
+# Values are stored uncompressed below this size, compression wouldn't pay for its header
+MIN_COMPRESS_SIZE = 64
+# Rows read and written per batch while ingesting
+INGEST_BATCH_SIZE = 500
+
+# archive_blobs:     every distinct value once, keyed by its SHA-256
+# archive_versions:  every (table, key, value) ever seen, with the first and last snapshot time it was seen at
+# archive_entries:   the most recent version of every key ever seen, exposed as the ItemTable / cursorDiskKV
+#                    views, so readers see the union of all snapshots as if it were one state.vscdb
+# archive_snapshots: one row per ingested snapshot
+# Nothing is ever deleted; ingesting only adds rows and widens first_seen/last_seen.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS archive_blobs (
+    hash BLOB PRIMARY KEY,
+    codec INTEGER NOT NULL,
+    is_text INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS archive_versions (
+    tbl TEXT NOT NULL,
+    key TEXT NOT NULL,
+    hash BLOB NOT NULL,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    PRIMARY KEY (tbl, key, hash)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS archive_entries (
+    tbl TEXT NOT NULL,
+    key TEXT NOT NULL,
+    hash BLOB NOT NULL,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    PRIMARY KEY (tbl, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS archive_snapshots (
+    id INTEGER PRIMARY KEY,
+    source TEXT,
+    snapshot_time REAL NOT NULL,
+    ingested_at REAL NOT NULL,
+    keys INTEGER NOT NULL,
+    new_versions INTEGER NOT NULL,
+    new_blobs INTEGER NOT NULL,
+    new_bytes INTEGER NOT NULL
+);
+CREATE VIEW IF NOT EXISTS ItemTable AS
+    SELECT e.key AS key, archive_decode(b.codec, b.is_text, b.data) AS value
+    FROM archive_entries e JOIN archive_blobs b ON b.hash = e.hash WHERE e.tbl = 'ItemTable';
+CREATE VIEW IF NOT EXISTS cursorDiskKV AS
+    SELECT e.key AS key, archive_decode(b.codec, b.is_text, b.data) AS value
+    FROM archive_entries e JOIN archive_blobs b ON b.hash = e.hash WHERE e.tbl = 'cursorDiskKV';
+"""
+
+
+def _compressor(level=9):
+    """
+    (codec, compress function): zstd if zstandard is installed, zlib otherwise
+    """
+    try:
+        import zstandard
+    except ImportError:
+        return CODEC_ZLIB, lambda data: zlib.compress(data, 6)
+    return CODEC_ZSTD, zstandard.ZstdCompressor(level=level).compress
+
+
+def open_archive(archive_path):
+    conn = sqlite3.connect(archive_path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    register_archive_functions(conn)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def ingest_snapshot(db, archive_path="chat_archive.db", snapshot_time=None):
+    """
+    Merge one state.vscdb snapshot (path or connection) into the archive.
+    snapshot_time (epoch seconds) defaults to the snapshot file's modification time.
+    Snapshots can be ingested in any order; the newest version of each key is what the views show.
+    Returns the counts of keys read, new versions, new values and the bytes they take up.
+    """
+    from state_db import open_state_db
+
+    if snapshot_time is None:
+        snapshot_time = os.path.getmtime(db) if isinstance(db, str) else time.time()
+    conn = open_state_db(db)
+    archive = open_archive(archive_path)
+    codec, compress = _compressor()
+    stats = {"keys": 0, "new_versions": 0, "new_blobs": 0, "new_bytes": 0}
+    try:
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'view')")}
+        with archive:  # One transaction, so an interrupted ingest leaves the archive unchanged
+            for table in TABLES:
+                if table not in tables:
+                    continue
+                cursor = conn.execute(f"SELECT key, value FROM {table} WHERE value IS NOT NULL")
+                while rows := cursor.fetchmany(INGEST_BATCH_SIZE):
+                    _ingest_rows(archive, table, rows, snapshot_time, codec, compress, stats)
+
+            archive.execute("INSERT INTO archive_snapshots (source, snapshot_time, ingested_at, keys, new_versions, new_blobs, new_bytes) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            (db if isinstance(db, str) else None, snapshot_time, time.time(), stats["keys"], stats["new_versions"], stats["new_blobs"], stats["new_bytes"]))
+    finally:
+        archive.close()
+        if conn is not db:
+            conn.close()
+    return stats
+
+
+def _ingest_rows(archive, table, rows, snapshot_time, codec, compress, stats):
+    """
+    Add one batch of (key, value) rows of table to the archive, a few batched statements per batch
+    """
+    versions = []
+    values = {}
+    for key, value in rows:
+        if isinstance(value, bytes):
+            is_text, data = False, value
+        else:
+            is_text, data = True, str(value).encode("utf-8")
+        digest = hashlib.sha256(data).digest()
+        versions.append((table, key, digest, snapshot_time, snapshot_time))
+        values[digest] = (is_text, data)
+    stats["keys"] += len(rows)
+
+    placeholders = ", ".join("?" * len(values))
+    existing = {row[0] for row in archive.execute(f"SELECT hash FROM archive_blobs WHERE hash IN ({placeholders})", list(values))}
+    new_blobs = []
+    for digest, (is_text, data) in values.items():
+        if digest in existing:
+            continue
+        stored_codec, stored = CODEC_RAW, data
+        if len(data) >= MIN_COMPRESS_SIZE:
+            compressed = compress(data)
+            if len(compressed) < len(data):
+                stored_codec, stored = codec, compressed
+        new_blobs.append((digest, stored_codec, is_text, len(data), stored))
+        stats["new_bytes"] += len(stored)
+    archive.executemany("INSERT INTO archive_blobs (hash, codec, is_text, size, data) VALUES (?, ?, ?, ?, ?)", new_blobs)
+    stats["new_blobs"] += len(new_blobs)
+
+    # Versions seen before only get their time range widened; rowcount sums the rows inserted over the batch
+    stats["new_versions"] += archive.executemany(
+        "INSERT OR IGNORE INTO archive_versions (tbl, key, hash, first_seen, last_seen) VALUES (?, ?, ?, ?, ?)", versions).rowcount
+    archive.executemany(
+        "UPDATE archive_versions SET first_seen = min(first_seen, ?), last_seen = max(last_seen, ?) WHERE tbl = ? AND key = ? AND hash = ?",
+        [(snapshot_time, snapshot_time, table, key, digest) for table, key, digest, _, _ in versions])
+
+    # The entry follows the most recently seen version (ties keep the current one)
+    archive.executemany(
+        "INSERT INTO archive_entries (tbl, key, hash, first_seen, last_seen) VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT (tbl, key) DO UPDATE SET "
+        "hash = CASE WHEN excluded.last_seen > archive_entries.last_seen THEN excluded.hash ELSE archive_entries.hash END, "
+        "first_seen = min(archive_entries.first_seen, excluded.first_seen), "
+        "last_seen = max(archive_entries.last_seen, excluded.last_seen)",
+        versions)
+
+
+def _format_time(timestamp):
+    return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def print_archive_info(archive_path):
+    from state_db import open_state_db
+
+    if not os.path.exists(archive_path):
+        print(f"Error: Archive '{archive_path}' does not exist!")
+        sys.exit(1)
+    # Read-only, so looking at an archive never creates or migrates one
+    archive = open_state_db(archive_path, snapshot="")
+    try:
+        print(f"Archive: {archive_path}")
+        print("Snapshots:")
+        for source, snapshot_time, keys, new_versions, new_blobs, new_bytes in archive.execute(
+                "SELECT source, snapshot_time, keys, new_versions, new_blobs, new_bytes FROM archive_snapshots ORDER BY snapshot_time"):
+            print(f"  {_format_time(snapshot_time)}  {source or '-'}: {keys} keys, {new_versions} new versions, {new_blobs} new values ({new_bytes:,} bytes stored)")
+        entries, versions = archive.execute("SELECT (SELECT count(*) FROM archive_entries), (SELECT count(*) FROM archive_versions)").fetchone()
+        blobs, raw_bytes, stored_bytes = archive.execute("SELECT count(*), coalesce(sum(size), 0), coalesce(sum(length(data)), 0) FROM archive_blobs").fetchone()
+        print(f"Keys: {entries}, versions: {versions}, distinct values: {blobs}")
+        print(f"Values: {raw_bytes:,} bytes, stored compressed in {stored_bytes:,} bytes")
+    finally:
+        archive.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in ("ingest", "info"):
+        print("Usage: python chat_archive.py ingest <state.vscdb> [archive.db]")
+        print("       python chat_archive.py info <archive.db>")
+        sys.exit(1)
+
+    if sys.argv[1] == "info":
+        print_archive_info(sys.argv[2])
+    else:
+        archive_path = sys.argv[3] if len(sys.argv) > 3 else "chat_archive.db"
+        print(f"Ingesting {sys.argv[2]} into {archive_path}")
+        result = ingest_snapshot(sys.argv[2], archive_path)
+        print(f"{result['keys']} keys, {result['new_versions']} new versions, {result['new_blobs']} new values ({result['new_bytes']:,} bytes stored)")
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+
+import os
+import runpy
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+VIEWER_DIR = os.path.join(ROOT_DIR, "vscode_chat_viewer")
+
+USAGE = """Usage: python chat_cli.py [--snapshot memory|tmpfs] <command> [args]
+
+  --snapshot memory|tmpfs  Read databases from a consistent copy made with the SQLite backup API
+                           (in memory, or pinned in /dev/shm and reused while the database is unchanged)
+                           instead of the live file, so long runs don't hold up the editor
+
+Commands:
+  dump <db> [output_dir] [--store] [--terms a,b|@file]   Dump every table (sqlite_dump.py)
+  extract <db> [output_dir]                              Extract chat history (sqlite_dump.py)
+  search [--mode M] [--ignore-case] [--matches-only] <db> <term> [output_dir]
+                                                         Deep search (deep_search_extract.py)
+  organize [input_dir] [output_dir] [--no-dedup] [--inline-limit N] [--page-size N]
+                                                         Build conversation markdown (organize_chats.py)
+  render [input_dir] [output_dir] [--single]             Markdown to HTML (md_to_html.py)
+  index update|search ...                                Trigram index (trigram_index.py)
+  diff <old_db> <new_db> [--json]                        Changed conversations between snapshots (snapshot_diff.py)
+  archive ingest <db> [archive_db] | info <archive_db>   Long-term snapshot archive (chat_archive.py)
+  snapshot <db> [snapshot_dir]                           Pin a snapshot of the database, print its path (state_db.py)
+  profile-storage <db> [--sample N] [--top N] [--no-dbstat] [--json]
+                                                         Bytes per key prefix, conversation and JSON field (storage_profile.py)
+  serve [--db <db>] [--host H] [--port P]                Run the chat viewer
+  run <db> [--search <term>] [--html] [--single] [--out <dir>]
+                                                         extract + organize (+ render) in one process
+"""
+
+def _run_script(script, args):
+    """
+    Run one of the standalone scripts in this process, with its own argument handling.
+    Only that script's imports are loaded.
+    """
+    sys.argv = [script] + args
+    runpy.run_path(os.path.join(ROOT_DIR, script), run_name="__main__")
+
+
+def _pop_option(args, name, default=None):
+    if name not in args:
+        return default
+    idx = args.index(name)
+    if idx + 1 >= len(args):
+        print(f"Error: {name} requires a value")
+        sys.exit(1)
+    value = args[idx + 1]
+    del args[idx:idx + 2]
+    return value
+
+
+def cmd_dump(args):
+    if not args or args[0].startswith("--"):
+        _run_script("sqlite_dump.py", args)  # Prints usage
+        return
+    _run_script("sqlite_dump.py", [args[0], "dump"] + args[1:])
+
+
+def cmd_extract(args):
+    if not args:
+        _run_script("sqlite_dump.py", args)
+        return
+    _run_script("sqlite_dump.py", [args[0], "extract"] + args[1:])
+
+
+def cmd_render(args):
+    single = "--single" in args
+    args = [arg for arg in args if arg != "--single"]
+    _run_script("md_to_html.py", args)
+    if single:
+        from md_to_html import generate_single_page
+        generate_single_page(args[1] if len(args) > 1 else (args[0] if args else "organized_chats"), "index_one_page.html")
+
+
+def cmd_serve(args):
+    db_path = _pop_option(args, "--db")
+    host = _pop_option(args, "--host", "127.0.0.1")
+    port = int(_pop_option(args, "--port", "8000"))
+    if db_path:
+        os.environ["VSCODE_STATE_DB_PATH"] = os.path.abspath(db_path)
+
+    # The viewer serves web/ relative to its own directory and imports itself as 'app'
+    os.chdir(VIEWER_DIR)
+    sys.path.insert(0, VIEWER_DIR)
+    from dotenv import load_dotenv
+    load_dotenv()
+    import uvicorn
+    uvicorn.run("app.main:app", host=host, port=port)
+
+
+def cmd_run(args):
+    """
+    The extract_and_organize.sh pipeline in one interpreter, with one database connection
+    shared by the steps reading the database.
+    """
+    search_term = _pop_option(args, "--search")
+    out_dir = _pop_option(args, "--out", "organized_chats")
+    single = "--single" in args
+    html = "--html" in args or single
+    args = [arg for arg in args if arg not in ("--html", "--single")]
+    if not args:
+        print("Usage: python chat_cli.py run <db> [--search <term>] [--html] [--single] [--out <dir>]")
+        sys.exit(1)
+
+    from sqlite_dump import extract_chats
+    from state_db import open_state_db
+
+    conn = open_state_db(args[0])
+    try:
+        if search_term:
+            from deep_search_extract import deep_search_and_extract
+            print(f"\n==== Deep search for '{search_term}' ====")
+            deep_search_and_extract(conn, search_term, "found_matches")
+        print("\n==== Extracting chats ====")
+        extract_chats(conn, "extracted_chats")
+    finally:
+        conn.close()
+
+    from organize_chats import organize_chats
+    print("\n==== Organizing chats ====")
+    organize_chats("extracted_chats", out_dir)
+
+    if html:
+        from md_to_html import convert_md_to_html, generate_single_page
+        html_dir = os.path.join(out_dir, "html")
+        print("\n==== Converting to HTML ====")
+        convert_md_to_html(out_dir, html_dir)
+        if single:
+            generate_single_page(html_dir, "index_one_page.html")
+
+
+COMMANDS = {
+    "dump": cmd_dump,
+    "extract": cmd_extract,
+    "search": lambda args: _run_script("deep_search_extract.py", args),
+    "organize": lambda args: _run_script("organize_chats.py", args),
+    "render": cmd_render,
+    "index": lambda args: _run_script("trigram_index.py", args),
+    "diff": lambda args: _run_script("snapshot_diff.py", args),
+    "archive": lambda args: _run_script("chat_archive.py", args),
+    "snapshot": lambda args: _run_script("state_db.py", args),
+    "profile-storage": lambda args: _run_script("storage_profile.py", args),
+    "serve": cmd_serve,
+    "run": cmd_run,
+}
+
+if __name__ == "__main__":
+    # Read by state_db.open_state_db in every subcommand
+    snapshot_mode = _pop_option(sys.argv, "--snapshot")
+    if snapshot_mode:
+        from state_db import SNAPSHOT_MODE_ENV, SNAPSHOT_MODES
+        if snapshot_mode not in SNAPSHOT_MODES:
+            print(f"Error: --snapshot must be one of {', '.join(SNAPSHOT_MODES)}")
+            sys.exit(1)
+        os.environ[SNAPSHOT_MODE_ENV] = snapshot_mode
+    if len(sys.argv) < 2 or sys.argv[1] not in COMMANDS:
+        print(USAGE)
+        sys.exit(0 if len(sys.argv) >= 2 and sys.argv[1] in ("-h", "--help") else 1)
+    COMMANDS[sys.argv[1]](sys.argv[2:])
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+
+import io
+import json
+import re
+
+CHATDATA_KEY = "workbench.panel.aichat.view.aichat.chatdata"
+CHUNK_SIZE = 1024 * 1024
+
+_WHITESPACE = re.compile(rb'[ \t\r\n]*')
+_BACKSLASH = 0x5C
+_STRUCTURAL = re.compile(rb'["\[\]{}]')
+_SCALAR = re.compile(rb'[^,\]}\s]*')
+
+
+def open_value(conn, table, key):
+    """
+    Readable file-like object over the value of one key, without loading it: an incremental
+    sqlite3.Blob handle where available (Python 3.11+), else the value in a BytesIO.
+    Returns None if the key doesn't exist or its value is not text/blob.
+    """
+    is_view = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'view' AND name = ?", (table,)).fetchone()
+    if is_view:
+        # No rowid to open a Blob on (e.g. the views of a chat_archive.py archive)
+        row = conn.execute(f"SELECT value FROM {table} WHERE key = ?", (key,)).fetchone()
+        if row is None or not isinstance(row[0], (bytes, str)):
+            return None
+        value = row[0]
+        return io.BytesIO(value if isinstance(value, bytes) else value.encode("utf-8"))
+    row = conn.execute(f"SELECT rowid, typeof(value) FROM {table} WHERE key = ?", (key,)).fetchone()
+    if row is None or row[1] not in ("blob", "text"):
+        return None
+    if hasattr(conn, "blobopen"):
+        return conn.blobopen(table, "value", row[0], readonly=True)
+    value = conn.execute(f"SELECT value FROM {table} WHERE rowid = ?", (row[0],)).fetchone()[0]
+    return io.BytesIO(value if isinstance(value, bytes) else value.encode("utf-8"))
+
+
+class _Reader:
+    """
+    Scans JSON from a file-like object chunk by chunk. Only the value being captured
+    (and the current chunk) is held in memory; skipped values are never accumulated.
+    """
+
+    def __init__(self, fp, chunk_size=CHUNK_SIZE):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.buf = b""
+        self.pos = 0
+        self.consumed = 0  # Stream offset of buf[0], for error positions
+        self.eof = False
+
+    def _fill(self, keep_from=None):
+        """
+        Read the next chunk, dropping buffered bytes before keep_from (or before pos).
+        Returns how far buffer indices shifted, or None at the end of the stream.
+        """
+        if self.eof:
+            return None
+        chunk = self.fp.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return None
+        drop = self.pos if keep_from is None else keep_from
+        self.buf = self.buf[drop:] + chunk
+        self.pos -= drop
+        self.consumed += drop
+        return drop
+
+    def error(self, message):
+        return json.JSONDecodeError(message, "<stream>", self.consumed + self.pos)
+
+    def next_char(self):
+        """
+        The next non-whitespace byte (not consumed), b"" at the end of the stream.
+        """
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos:self.pos + 1]
+            if self._fill() is None:
+                return b""
+
+    def expect(self, allowed):
+        char = self.next_char()
+        if not char or char not in allowed:
+            raise self.error(f"Expected one of {allowed.decode()!r}")
+        self.pos += 1
+        return char
+
+    def _scan_string(self, keep_from):
+        # self.pos is just after the opening quote; returns keep_from shifted by refills
+        while True:
+            quote = self.buf.find(b'"', self.pos)
+            if quote >= 0:
+                # Escaped if preceded by an odd number of backslashes
+                first = quote
+                while first > 0 and self.buf[first - 1] == _BACKSLASH:
+                    first -= 1
+                self.pos = quote + 1
+                if (quote - first) % 2 == 0:
+                    return keep_from
+                continue
+            # Out of data; keep a trailing run of backslashes, it decides about the next quote
+            end = len(self.buf)
+            while end > self.pos and self.buf[end - 1] == _BACKSLASH:
+                end -= 1
+            self.pos = end
+            drop = self._fill(keep_from)
+            if drop is None:
+                raise self.error("Unterminated string")
+            if keep_from is not None:
+                keep_from -= drop
+
+    def value(self, keep=True):
+        """
+        Consume the next value; returns its raw bytes if keep, else None.
+        """
+        char = self.next_char()
+        if not char:
+            raise self.error("Expected a value")
+        start = self.pos
+        keep_from = start if keep else None
+        if char == b'"':
+            self.pos += 1
+            keep_from = self._scan_string(keep_from)
+        elif char in b"{[":
+            depth = 0
+            while True:
+                match = _STRUCTURAL.search(self.buf, self.pos)
+                if match is None:
+                    self.pos = len(self.buf)
+                    drop = self._fill(keep_from)
+                    if drop is None:
+                        raise self.error("Unterminated object or array")
+                    if keep_from is not None:
+                        keep_from -= drop
+                    continue
+                token = match.group()
+                self.pos = match.end()
+                if token == b'"':
+                    keep_from = self._scan_string(keep_from)
+                elif token in b"{[":
+                    depth += 1
+                else:
+                    depth -= 1
+                    if depth == 0:
+                        break
+        else:
+            while True:
+                self.pos = _SCALAR.match(self.buf, self.pos).end()
+                if self.pos < len(self.buf):
+                    break
+                drop = self._fill(keep_from)
+                if drop is None:
+                    break
+                if keep_from is not None:
+                    keep_from -= drop
+        return self.buf[keep_from:self.pos] if keep else None
+
+
+def iter_chatdata(fp, chunk_size=CHUNK_SIZE):
+    """
+    Parse the aichat chatdata document incrementally, yielding (key, index, value) in document order:
+    (key, None, value) for each top-level member except a "tabs" array, and ("tabs", i, tab) for
+    each of its elements (("tabs", None, []) if it is empty). Peak memory is about one tab.
+    Raises json.JSONDecodeError on malformed input.
+    """
+    reader = _Reader(fp, chunk_size)
+    reader.expect(b"{")
+    if reader.next_char() == b"}":
+        return
+    while True:
+        key = json.loads(reader.value())
+        if not isinstance(key, str):
+            raise reader.error("Expected an object key")
+        reader.expect(b":")
+        if key == "tabs" and reader.next_char() == b"[":
+            reader.expect(b"[")
+            if reader.next_char() == b"]":
+                reader.expect(b"]")
+                yield key, None, []
+            else:
+                index = 0
+                while True:
+                    yield key, index, json.loads(reader.value())
+                    index += 1
+                    if reader.expect(b",]") == b"]":
+                        break
+        else:
+            yield key, None, json.loads(reader.value())
+        if reader.expect(b",}") == b"}":
+            return
+
+
+def _indented(value, prefix):
+    return json.dumps(value, indent=2).replace("\n", "\n" + prefix)
+
+
+def chatdata_json_chunks(events, on_tab=None):
+    """
+    Serialize iter_chatdata events back into the text json.dump(data, f, indent=2) would write,
+    one chunk per member or tab. on_tab(index, tab) is called for every tab once it is written out.
+    """
+    members = 0
+    in_array = False
+    for key, index, value in events:
+        if not index:  # A new top-level member
+            if in_array:
+                yield "\n  ]"
+                in_array = False
+            yield ("{\n" if members == 0 else ",\n") + "  " + json.dumps(key) + ": "
+            members += 1
+            if index is None:
+                yield _indented(value, "  ")
+                continue
+            yield "[\n"
+            in_array = True
+        else:
+            yield ",\n"
+        yield "    " + _indented(value, "    ")
+        if on_tab is not None:
+            on_tab(index, value)
+    if in_array:
+        yield "\n  ]"
+    yield "{}" if members == 0 else "\n}"
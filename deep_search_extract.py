@@ -1,29 +1,33 @@
 #!/usr/bin/env python3
 
-import sqlite3
 import json
 import os
 import sys
-import re
 
-def deep_search_and_extract(db_path, search_term, output_dir="found_matches"):
+from search_query import SEARCH_MODES, build_query, context_window, printable_run
+from state_db import open_state_db
+
+def deep_search_and_extract(db_path, search_term, output_dir="found_matches", mode="literal", ignore_case=False, matches_only=False):
     """
     Deeply search through all data in the database for a specific search term,
     including binary BLOB data that might contain JSON or text with the term.
     
     This handles VSCode's storage format which may include complex nested structures.
+    
+    mode is one of search_query.SEARCH_MODES (literal, icase, regex, bool). With
+    matches_only, only the list of matching keys is produced: every value stops
+    at its first hit and nothing is decoded or written per match.
+    db_path may also be an open sqlite3 connection.
     """
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
         
-    conn = sqlite3.connect(db_path)
+    conn = open_state_db(db_path)
     cursor = conn.cursor()
     
-    print(f"Searching for: '{search_term}'")
+    print(f"Searching for: '{search_term}' ({mode} mode{', ignoring case' if ignore_case else ''})")
     
-    # Compile regex patterns for binary and text search
-    binary_pattern = re.compile(search_term.encode('utf-8'))
-    text_pattern = re.compile(search_term)
+    query = build_query(search_term, mode, ignore_case)
     
     # Store all matches
     matches = []
@@ -32,62 +36,66 @@ def deep_search_and_extract(db_path, search_term, output_dir="found_matches"):
     # Search both tables in the database
     for table in ["ItemTable", "cursorDiskKV"]:
         print(f"\nSearching table: {table}")
-        cursor.execute(f"SELECT key, value FROM {table}")
-        rows = cursor.fetchall()
+        # Let SQLite discard non-matching values when the query allows it
+        sql_filter = query.sql_filter("value")
+        if sql_filter:
+            cursor.execute(f"SELECT key, value FROM {table} WHERE {sql_filter[0]}", sql_filter[1])
+        else:
+            cursor.execute(f"SELECT key, value FROM {table}")
         
-        for key, value in rows:
+        for key, value in cursor:
             # Check if value is a binary BLOB containing our search term
-            if isinstance(value, bytes) and binary_pattern.search(value):
-                match_info = {
-                    "table": table,
-                    "key": key,
-                    "match_type": "binary"
-                }
-                
-                # Try different decoding methods to extract content
-                
-                # 1. Try direct UTF-8 decoding
-                try:
-                    text_value = value.decode('utf-8', errors='ignore')
-                    # Find the position of the search term
-                    pos = text_value.find(search_term)
-                    if pos >= 0:
-                        # Extract a window of text around the match
-                        start = max(0, pos - 200)
-                        end = min(len(text_value), pos + len(search_term) + 200)
-                        context = text_value[start:end]
-                        
-                        match_info["context"] = context
-                        match_info["position"] = pos
-                        
-                        # Save the full text content
-                        full_text_file = os.path.join(output_dir, f"{table}_{key.replace('.', '_')}_full.txt")
-                        with open(full_text_file, "w", encoding="utf-8") as f:
-                            f.write(text_value)
-                        
-                        print(f"Found match in {key} as text, saved to {full_text_file}")
-                        
-                        # Also save just the context
-                        context_file = os.path.join(output_dir, f"{table}_{key.replace('.', '_')}_context.txt")
-                        with open(context_file, "w", encoding="utf-8") as f:
-                            f.write(f"Match found at position {pos}:\n")
-                            f.write(f"...\n{context}\n...")
-                        
-                        extracted_content.append({
-                            "key": key,
-                            "context": context,
-                            "full_file": full_text_file,
-                            "context_file": context_file
-                        })
-                except UnicodeDecodeError:
-                    pass
-                
-                # 2. Try JSON decoding (if it's stored as JSON)
+            if not isinstance(value, bytes):
+                continue
+            span = query.first_span(value)
+            if span is None:
+                continue
+            
+            match_info = {
+                "table": table,
+                "key": key,
+                "match_type": "binary"
+            }
+            
+            if matches_only:
+                match_info["position"] = span[0]
+                matches.append(match_info)
+                continue
+            
+            # 1. Extract a window of text around the match straight from the byte offsets
+            pos = span[0]
+            context = context_window(value, span[0], span[1])
+            
+            match_info["context"] = context
+            match_info["position"] = pos
+            
+            # Save the full text content
+            full_text_file = os.path.join(output_dir, f"{table}_{key.replace('.', '_')}_full.txt")
+            with open(full_text_file, "w", encoding="utf-8") as f:
+                f.write(value.decode('utf-8', errors='ignore'))
+            
+            print(f"Found match in {key} as text, saved to {full_text_file}")
+            
+            # Also save just the context
+            context_file = os.path.join(output_dir, f"{table}_{key.replace('.', '_')}_context.txt")
+            with open(context_file, "w", encoding="utf-8") as f:
+                f.write(f"Match found at byte position {pos}:\n")
+                f.write(f"...\n{context}\n...")
+            
+            extracted_content.append({
+                "key": key,
+                "context": context,
+                "full_file": full_text_file,
+                "context_file": context_file
+            })
+            
+            # 2. Try JSON decoding (if it's stored as JSON)
+            if value.lstrip()[:1] in (b'{', b'['):
                 try:
                     json_data = json.loads(value)
                     json_str = json.dumps(json_data, indent=2)
                     
-                    if search_term in json_str:
+                    if query.matches_text(json_str):
                         match_info["match_type"] = "json"
                         
                         # Save the JSON data
@@ -102,38 +110,40 @@ def deep_search_and_extract(db_path, search_term, output_dir="found_matches"):
                             for tab in json_data["tabs"]:
                                 if "bubbles" in tab and isinstance(tab["bubbles"], list):
                                     for bubble in tab["bubbles"]:
-                                        if "content" in bubble and search_term in bubble.get("content", ""):
+                                        if "content" in bubble and query.matches_text(bubble.get("content") or ""):
                                             bubble_content = {
                                                 "type": bubble.get("type", "unknown"),
                                                 "id": bubble.get("id", ""),
                                                 "content": bubble.get("content", "")
                                             }
                                             extracted_content.append(bubble_content)
-                except (json.JSONDecodeError, TypeError):
-                    pass
-                
-                # 3. Try to extract text strings from binary data
-                try:
-                    # Find all strings in the binary data
-                    strings = re.findall(b'[\\x20-\\x7E]{8,}', value)
-                    for s in strings:
-                        str_value = s.decode('utf-8', errors='ignore')
-                        if search_term in str_value:
-                            match_info["binary_string_match"] = str_value
-                            extracted_content.append({
-                                "key": key,
-                                "binary_string": str_value
-                            })
-                except:
+                except (json.JSONDecodeError, UnicodeDecodeError, TypeError):
                     pass
-                
-                # Save the raw binary data (might be useful for further analysis)
-                binary_file = os.path.join(output_dir, f"{table}_{key.replace('.', '_')}.bin")
-                with open(binary_file, "wb") as f:
-                    f.write(value)
-                
-                match_info["binary_file"] = binary_file
-                matches.append(match_info)
+            
+            # 3. Extract the printable strings containing a hit, expanding around each
+            #    hit instead of scanning the whole value for strings
+            run_end = -1
+            for start, end in query.spans(value):
+                if start < run_end:
+                    continue  # Already covered by the previous string
+                run = printable_run(value, start, end)
+                if run is None:
+                    continue
+                run_end = run[1]
+                str_value = value[run[0]:run[1]].decode('ascii')
+                match_info["binary_string_match"] = str_value
+                extracted_content.append({
+                    "key": key,
+                    "binary_string": str_value
+                })
+            
+            # Save the raw binary data (might be useful for further analysis)
+            binary_file = os.path.join(output_dir, f"{table}_{key.replace('.', '_')}.bin")
+            with open(binary_file, "wb") as f:
+                f.write(value)
+            
+            match_info["binary_file"] = binary_file
+            matches.append(match_info)
     
     # Save the match information
     with open(os.path.join(output_dir, "match_summary.json"), "w") as f:
@@ -156,7 +166,8 @@ def deep_search_and_extract(db_path, search_term, output_dir="found_matches"):
                 f.write(f"=== Binary string from {item['key']} ===\n")
                 f.write(f"{item['binary_string']}\n\n")
     
-    conn.close()
+    if conn is not db_path:
+        conn.close()
     
     print(f"\nFound {len(matches)} matches.")
     print(f"Extracted {len(extracted_content)} content items.")
@@ -166,12 +177,29 @@ def deep_search_and_extract(db_path, search_term, output_dir="found_matches"):
     return matches, extracted_content
 
 if __name__ == "__main__":
+    # Options: --mode <literal|icase|regex|bool>, --ignore-case, --matches-only
+    mode = "literal"
+    if "--mode" in sys.argv:
+        mode_idx = sys.argv.index("--mode")
+        mode = sys.argv[mode_idx + 1] if mode_idx + 1 < len(sys.argv) else ""
+        del sys.argv[mode_idx:mode_idx + 2]
+        if mode not in SEARCH_MODES:
+            print(f"Error: --mode must be one of: {', '.join(SEARCH_MODES)}")
+            sys.exit(1)
+    ignore_case = "--ignore-case" in sys.argv
+    if ignore_case:
+        sys.argv.remove("--ignore-case")
+    matches_only = "--matches-only" in sys.argv
+    if matches_only:
+        sys.argv.remove("--matches-only")
+    
     if len(sys.argv) < 3:
-        print("Usage: python deep_search_extract.py <path_to_state.vscdb> <search_term> [output_directory]")
+        print("Usage: python deep_search_extract.py [--mode literal|icase|regex|bool] [--ignore-case] [--matches-only] <path_to_state.vscdb> <search_term> [output_directory]")
+        print("\nIn bool mode the search term is an expression like: 'foo AND bar OR \"some phrase\" AND NOT baz'")
         sys.exit(1)
     
     db_path = sys.argv[1]
     search_term = sys.argv[2]
     output_dir = sys.argv[3] if len(sys.argv) >= 4 else "found_matches"
     
-    deep_search_and_extract(db_path, search_term, output_dir) 
\ No newline at end of file
+    deep_search_and_extract(db_path, search_term, output_dir, mode, ignore_case, matches_only)
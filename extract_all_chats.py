@@ -1,10 +1,54 @@
 #!/usr/bin/env python3
 
-import sqlite3
 import json
 import os
 import sys
 
+from chatdata_stream import CHATDATA_KEY, chatdata_json_chunks, iter_chatdata, open_value
+from state_db import open_state_db
+
+def write_chat_tab(output_dir, i, tab):
+    """
+    Save one chat tab, plus its conversation in readable form
+    """
+    tab_id = tab.get("tabId", f"chat_tab_{i}")
+    
+    # Save each tab as a separate file
+    with open(os.path.join(output_dir, f"chat_tab_{tab_id}.json"), "w") as f:
+        json.dump(tab, f, indent=2)
+    
+    # Extract conversations in a readable format
+    if "bubbles" in tab:
+        conversations = []
+        
+        for bubble in tab["bubbles"]:
+            bubble_type = bubble.get("type", "unknown")
+            content = bubble.get("content", "")
+            message_id = bubble.get("id", "")
+            
+            # Extract message text and metadata
+            message = {
+                "type": bubble_type,
+                "id": message_id,
+                "content": content
+            }
+            
+            # Extract any code blocks or file references
+            if "mentions" in bubble:
+                message["mentions"] = bubble["mentions"]
+            
+            conversations.append(message)
+        
+        # Save the human-readable conversation
+        with open(os.path.join(output_dir, f"conversation_{tab_id}.json"), "w") as f:
+            json.dump(conversations, f, indent=2)
+        
+        # Also save as plain text for easy reading
+        with open(os.path.join(output_dir, f"conversation_{tab_id}.txt"), "w") as f:
+            for msg in conversations:
+                f.write(f"--- {msg['type'].upper()} ---\n")
+                f.write(f"{msg['content']}\n\n")
+
 def extract_all_chat_data(db_path, output_dir="all_extracted_chats"):
     """
     Extract all chat data from the VSCode state database
@@ -12,101 +56,64 @@ def extract_all_chat_data(db_path, output_dir="all_extracted_chats"):
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
         
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+    conn = open_state_db(db_path)
+    try:
+        cursor = conn.cursor()
     
-    # First extract the aichat.chatdata which contains most of the chat history
-    cursor.execute("SELECT value FROM ItemTable WHERE key = 'workbench.panel.aichat.view.aichat.chatdata'")
-    result = cursor.fetchone()
+        # First extract the aichat.chatdata which contains most of the chat history.
+        # It can be hundreds of MB, so it is parsed incrementally from the database
+        # and every tab is written out as soon as it has been read.
+        chat_data_fp = open_value(conn, "ItemTable", CHATDATA_KEY)
     
-    if result:
-        try:
-            chat_data = json.loads(result[0])
-            
-            # Save the full chat data
-            with open(os.path.join(output_dir, "full_chat_data.json"), "w") as f:
-                json.dump(chat_data, f, indent=2)
-            
-            # Extract and save individual chat sessions
-            if "tabs" in chat_data:
-                for i, tab in enumerate(chat_data["tabs"]):
-                    tab_id = tab.get("tabId", f"chat_tab_{i}")
-                    
-                    # Save each tab as a separate file
-                    with open(os.path.join(output_dir, f"chat_tab_{tab_id}.json"), "w") as f:
-                        json.dump(tab, f, indent=2)
-                    
-                    # Extract conversations in a readable format
-                    if "bubbles" in tab:
-                        conversations = []
-                        
-                        for bubble in tab["bubbles"]:
-                            bubble_type = bubble.get("type", "unknown")
-                            content = bubble.get("content", "")
-                            message_id = bubble.get("id", "")
-                            
-                            # Extract message text and metadata
-                            message = {
-                                "type": bubble_type,
-                                "id": message_id,
-                                "content": content
-                            }
-                            
-                            # Extract any code blocks or file references
-                            if "mentions" in bubble:
-                                message["mentions"] = bubble["mentions"]
-                            
-                            conversations.append(message)
-                        
-                        # Save the human-readable conversation
-                        with open(os.path.join(output_dir, f"conversation_{tab_id}.json"), "w") as f:
-                            json.dump(conversations, f, indent=2)
-                        
-                        # Also save as plain text for easy reading
-                        with open(os.path.join(output_dir, f"conversation_{tab_id}.txt"), "w") as f:
-                            for msg in conversations:
-                                f.write(f"--- {msg['type'].upper()} ---\n")
-                                f.write(f"{msg['content']}\n\n")
+        if chat_data_fp:
+            try:
+                # Save the full chat data, and each tab on the way
+                with chat_data_fp, open(os.path.join(output_dir, "full_chat_data.json"), "w") as f:
+                    events = iter_chatdata(chat_data_fp)
+                    for chunk in chatdata_json_chunks(events, lambda i, tab: write_chat_tab(output_dir, i, tab)):
+                        f.write(chunk)
             
-            print(f"Extracted chat data saved to {output_dir}")
+                print(f"Extracted chat data saved to {output_dir}")
         
-        except (json.JSONDecodeError, UnicodeDecodeError) as e:
-            print(f"Error decoding chat data: {e}")
+            except (json.JSONDecodeError, UnicodeDecodeError) as e:
+                print(f"Error decoding chat data: {e}")
     
-    # Get all table names
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-    tables = cursor.fetchall()
+        # Get all table names
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
+        tables = cursor.fetchall()
     
-    # Output tables structure to a file
-    with open(os.path.join(output_dir, "database_structure.txt"), "w") as f:
-        f.write("Database tables and structures:\n\n")
+        # Output tables structure to a file
+        with open(os.path.join(output_dir, "database_structure.txt"), "w") as f:
+            f.write("Database tables and structures:\n\n")
         
-        for table in tables:
-            table_name = table[0]
-            f.write(f"Table: {table_name}\n")
+            for table in tables:
+                table_name = table[0]
+                f.write(f"Table: {table_name}\n")
             
-            # Get table schema
-            cursor.execute(f"PRAGMA table_info({table_name});")
-            columns = cursor.fetchall()
+                # Get table schema
+                cursor.execute(f"PRAGMA table_info({table_name});")
+                columns = cursor.fetchall()
             
-            f.write("Columns:\n")
-            for column in columns:
-                f.write(f"  - {column[1]} ({column[2]})\n")
+                f.write("Columns:\n")
+                for column in columns:
+                    f.write(f"  - {column[1]} ({column[2]})\n")
             
-            # Get row count
-            cursor.execute(f"SELECT COUNT(*) FROM {table_name};")
-            count = cursor.fetchone()[0]
-            f.write(f"Total rows: {count}\n\n")
+                # Get row count
+                cursor.execute(f"SELECT COUNT(*) FROM {table_name};")
+                count = cursor.fetchone()[0]
+                f.write(f"Total rows: {count}\n\n")
     
-    # Extract all entries matching 'chat' keyword
-    cursor.execute("SELECT key FROM ItemTable WHERE key LIKE '%chat%'")
-    chat_keys = cursor.fetchall()
+        # Extract all entries matching 'chat' keyword
+        cursor.execute("SELECT key FROM ItemTable WHERE key LIKE '%chat%'")
+        chat_keys = cursor.fetchall()
     
-    with open(os.path.join(output_dir, "all_chat_related_keys.txt"), "w") as f:
-        for key in chat_keys:
-            f.write(f"{key[0]}\n")
+        with open(os.path.join(output_dir, "all_chat_related_keys.txt"), "w") as f:
+            for key in chat_keys:
+                f.write(f"{key[0]}\n")
+    finally:
+        if conn is not db_path:
+            conn.close()
     
-    conn.close()
     print(f"Database structure information saved to {os.path.join(output_dir, 'database_structure.txt')}")
     print(f"All chat-related keys saved to {os.path.join(output_dir, 'all_chat_related_keys.txt')}")
 
@@ -1,11 +1,38 @@
 #!/usr/bin/env python3
 
-import sqlite3
 import json
 import os
 import sys
 import re
 
+from chatdata_stream import CHATDATA_KEY, chatdata_json_chunks, iter_chatdata, open_value
+from state_db import open_state_db
+
+def _strings(value):
+    """
+    Every key and string of a parsed JSON value
+    """
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            yield key
+            yield from _strings(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _strings(item)
+
+
+def json_contains(value, search_term):
+    """
+    Whether search_term occurs in a parsed JSON value: in one of its decoded strings (so quotes,
+    newlines and non-ASCII characters match as typed) or in its indented JSON text.
+    """
+    if any(search_term in text for text in _strings(value)):
+        return True
+    return search_term in json.dumps(value, indent=2, ensure_ascii=False)
+
+
 def extract_chat_data(db_path, output_dir="extracted_chats"):
     """
     Extract chat data from the VSCode state database
@@ -13,79 +40,118 @@ def extract_chat_data(db_path, output_dir="extracted_chats"):
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
         
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+    conn = open_state_db(db_path)
+    try:
+        cursor = conn.cursor()
     
-    # Get all keys related to chat data
-    cursor.execute("SELECT key, value FROM ItemTable WHERE key LIKE '%chat%'")
-    chat_data = cursor.fetchall()
+        # Get all keys related to chat data (the aichat chatdata value is streamed separately below)
+        cursor.execute("SELECT key, value FROM ItemTable WHERE key LIKE '%chat%' AND key != ?", (CHATDATA_KEY,))
+        chat_data = cursor.fetchall()
     
-    # Search through all tables for specific content
-    search_term = "node demo.js departures 8100013"
-    print(f"Searching for: {search_term}")
+        # Search through all tables for specific content
+        search_term = "node demo.js departures 8100013"
+        print(f"Searching for: {search_term}")
     
-    # Use a regex pattern to find binary data containing the search term
-    pattern = re.compile(search_term.encode('utf-8'))
+        # Use a regex pattern to find binary data containing the search term
+        pattern = re.compile(search_term.encode('utf-8'))
     
-    matches = []
-    messages = []
+        matches = []
+        messages = []
     
-    for key, value in chat_data:
-        try:
-            # First try to decode as JSON
-            data = json.loads(value)
-            json_str = json.dumps(data, indent=2)
+        for key, value in chat_data:
+            try:
+                # First try to decode as JSON
+                data = json.loads(value)
+                json_str = json.dumps(data, indent=2)
             
-            if search_term in json_str:
-                matches.append((key, json_str))
-                output_file = os.path.join(output_dir, f"{key.replace('.', '_')}.json")
-                with open(output_file, "w") as f:
-                    f.write(json_str)
-                print(f"Saved JSON match to {output_file}")
+                if search_term in json_str:
+                    matches.append((key, json_str))
+                    output_file = os.path.join(output_dir, f"{key.replace('.', '_')}.json")
+                    with open(output_file, "w") as f:
+                        f.write(json_str)
+                    print(f"Saved JSON match to {output_file}")
                 
-                # Try to extract messages from the data structure
-                if "tabs" in data:
-                    for tab in data["tabs"]:
-                        if "bubbles" in tab:
-                            for bubble in tab["bubbles"]:
-                                if "content" in bubble:
-                                    messages.append(bubble["content"])
-        except (json.JSONDecodeError, UnicodeDecodeError):
-            # If not JSON, check if raw binary data contains the search term
-            if pattern.search(value):
-                matches.append((key, "Binary data matched"))
+                    # Try to extract messages from the data structure
+                    if "tabs" in data:
+                        for tab in data["tabs"]:
+                            if "bubbles" in tab:
+                                for bubble in tab["bubbles"]:
+                                    if "content" in bubble:
+                                        messages.append(bubble["content"])
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                # If not JSON, check if raw binary data contains the search term
+                if pattern.search(value):
+                    matches.append((key, "Binary data matched"))
                 
-                # Save raw binary data
-                binary_file = os.path.join(output_dir, f"{key.replace('.', '_')}.bin")
-                with open(binary_file, "wb") as f:
-                    f.write(value)
-                print(f"Saved binary match to {binary_file}")
-    
-    # Also search in all tables for any text matching the search term
-    for table in ["ItemTable", "cursorDiskKV"]:
-        cursor.execute(f"SELECT key, value FROM {table}")
-        rows = cursor.fetchall()
-        
-        for key, value in rows:
-            try:
-                # Check if the value contains the search term as a string
-                text_value = value.decode('utf-8', errors='ignore')
-                if search_term in text_value:
-                    matches.append((key, "Text match in " + table))
-                    text_file = os.path.join(output_dir, f"{table}_{key.replace('.', '_')}.txt")
-                    with open(text_file, "w") as f:
-                        f.write(text_value)
-                    print(f"Saved text match to {text_file}")
-            except:
-                # If decoding fails, check binary data
-                if isinstance(value, bytes) and pattern.search(value):
-                    matches.append((key, "Binary match in " + table))
-                    binary_file = os.path.join(output_dir, f"{table}_{key.replace('.', '_')}.bin")
+                    # Save raw binary data
+                    binary_file = os.path.join(output_dir, f"{key.replace('.', '_')}.bin")
                     with open(binary_file, "wb") as f:
                         f.write(value)
                     print(f"Saved binary match to {binary_file}")
     
-    conn.close()
+        # The aichat chatdata can be hundreds of MB, so it is parsed incrementally and written out
+        # while it is checked for the search term; the file is removed again if nothing matched
+        chat_data_fp = open_value(conn, "ItemTable", CHATDATA_KEY)
+        if chat_data_fp:
+            output_file = os.path.join(output_dir, f"{CHATDATA_KEY.replace('.', '_')}.json")
+            found = [False]
+            # Messages of every tab, kept if the search term occurs anywhere in the chatdata
+            tab_messages = []
+        
+            def checked(events):
+                # Each member or tab is matched against its decoded text before it is written out
+                for key, index, value in events:
+                    if not found[0] and (search_term in key or json_contains(value, search_term)):
+                        found[0] = True
+                    yield key, index, value
+        
+            def collect_messages(i, tab):
+                if "bubbles" in tab:
+                    for bubble in tab["bubbles"]:
+                        if "content" in bubble:
+                            tab_messages.append(bubble["content"])
+        
+            try:
+                with chat_data_fp, open(output_file, "w") as f:
+                    for chunk in chatdata_json_chunks(checked(iter_chatdata(chat_data_fp)), collect_messages):
+                        f.write(chunk)
+            except (json.JSONDecodeError, UnicodeDecodeError, AttributeError) as e:
+                print(f"Error decoding {CHATDATA_KEY}: {e}")
+                found[0] = False
+            if found[0]:
+                messages.extend(tab_messages)
+                matches.append((CHATDATA_KEY, "JSON match"))
+                print(f"Saved JSON match to {output_file}")
+            else:
+                os.remove(output_file)
+    
+        # Also search in all tables for any text matching the search term
+        for table in ["ItemTable", "cursorDiskKV"]:
+            # Rows are read one at a time rather than all at once; the chatdata was searched above
+            rows = conn.cursor().execute(f"SELECT key, value FROM {table} WHERE key != ?", (CHATDATA_KEY,))
+        
+            for key, value in rows:
+                try:
+                    # Check if the value contains the search term as a string
+                    text_value = value.decode('utf-8', errors='ignore')
+                    if search_term in text_value:
+                        matches.append((key, "Text match in " + table))
+                        text_file = os.path.join(output_dir, f"{table}_{key.replace('.', '_')}.txt")
+                        with open(text_file, "w") as f:
+                            f.write(text_value)
+                        print(f"Saved text match to {text_file}")
+                except:
+                    # If decoding fails, check binary data
+                    if isinstance(value, bytes) and pattern.search(value):
+                        matches.append((key, "Binary match in " + table))
+                        binary_file = os.path.join(output_dir, f"{table}_{key.replace('.', '_')}.bin")
+                        with open(binary_file, "wb") as f:
+                            f.write(value)
+                        print(f"Saved binary match to {binary_file}")
+    finally:
+        if conn is not db_path:
+            conn.close()
+    
     
     # Print summary of matches
     print("\nMatches found:")
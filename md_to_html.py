@@ -4,34 +4,44 @@ import os
 import sys
 import re
 from datetime import datetime
-import markdown
-import shutil
+
+from output_sink import DirectorySink, open_sink
+from search_index import SEARCH_DIR
+
+# Further index pages written by organize_chats (index.md itself is handled separately)
+INDEX_PAGE = re.compile(r'index_\d+\.md')
 
 def convert_md_to_html(input_dir="organized_chats", output_dir=None):
     """
     Convert all markdown files in the input directory to HTML
     If output_dir is not specified, HTML files are created alongside the markdown files
+    output_dir may also be a *.tar.zst / *.zip / *.sqlite bundle or an OutputSink
     """
     if not os.path.exists(input_dir):
         print(f"Error: Input directory '{input_dir}' does not exist!")
         sys.exit(1)
     
-    # If output_dir is specified, create it and copy all files
+    # Collect all input files, skipping the output directory if it is nested inside the input
+    output_abs = os.path.abspath(output_dir) if isinstance(output_dir, str) else None
+    input_files = []
+    for root, dirs, files in os.walk(input_dir):
+        dirs[:] = [d for d in dirs if os.path.abspath(os.path.join(root, d)) != output_abs]
+        for file in files:
+            input_files.append(os.path.join(root, file))
+    
+    # If output_dir is specified, copy all files into it (except stale HTML that is regenerated below)
     if output_dir:
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
-        
-        # Copy all files and directories from input_dir to output_dir
-        for item in os.listdir(input_dir):
-            source = os.path.join(input_dir, item)
-            dest = os.path.join(output_dir, item)
-            if os.path.isdir(source):
-                shutil.copytree(source, dest, dirs_exist_ok=True)
-            else:
-                shutil.copy2(source, dest)
+        sink = open_sink(output_dir)
+        regenerated = {os.path.splitext(path)[0] + '.html' for path in input_files if path.endswith('.md')}
+        for source in input_files:
+            if source not in regenerated:
+                sink.copy_file(source, os.path.relpath(source, input_dir))
     else:
         # If no output directory is specified, use the input directory
-        output_dir = input_dir
+        sink = DirectorySink(input_dir)
+
+    # Imported here so generate_single_page (and importing this module) doesn't pay for it
+    import markdown
 
     # Configure Markdown with extensions
     md = markdown.Markdown(extensions=['tables', 'fenced_code', 'codehilite'])
@@ -101,23 +111,40 @@ def convert_md_to_html(input_dir="organized_chats", output_dir=None):
         tr:nth-child(even) {
             background-color: #f6f8fa;
         }
+        #chat-search {
+            width: 100%;
+            box-sizing: border-box;
+            padding: 8px 12px;
+            font-size: 1em;
+            border: 1px solid #dfe2e5;
+            border-radius: 3px;
+        }
     </style>
     """
     
     # Find all markdown files
-    md_files = []
-    for root, _, files in os.walk(output_dir):
-        for file in files:
-            if file.endswith('.md'):
-                md_files.append(os.path.join(root, file))
+    md_files = [path for path in input_files if path.endswith('.md')]
     
     print(f"Found {len(md_files)} markdown files to convert")
     
+    # Index pages (index.md, index_2.md, ...) get a search box when organize_chats wrote a search index
+    has_search_index = os.path.exists(os.path.join(input_dir, SEARCH_DIR, "search.js"))
+    
+    def index_body(html_content):
+        if not has_search_index:
+            return html_content
+        return f"""<input type="search" id="chat-search" placeholder="Search conversations by title and content" autocomplete="off">
+    <div id="chat-search-results"></div>
+    <div class="index-listing">
+    {html_content}
+    </div>
+    <script src="{SEARCH_DIR}/search.js"></script>"""
+    
     # Create a mapping for all .md to .html paths for link conversion
     md_to_html_paths = {}
     for md_file in md_files:
-        # Calculate the relative path from output_dir to the file
-        rel_path = os.path.relpath(md_file, output_dir)
+        # Calculate the relative path from input_dir to the file
+        rel_path = os.path.relpath(md_file, input_dir)
         html_path = os.path.splitext(rel_path)[0] + '.html'
         md_to_html_paths[rel_path] = html_path
         
@@ -126,7 +153,7 @@ def convert_md_to_html(input_dir="organized_chats", output_dir=None):
             md_to_html_paths["index.md"] = "index.html"
     
     # Process index.md first to make sure it's available
-    index_md_path = os.path.join(output_dir, "index.md")
+    index_md_path = os.path.join(input_dir, "index.md")
     if os.path.exists(index_md_path):
         print(f"Processing index file: {index_md_path}")
         with open(index_md_path, 'r', encoding='utf-8') as f:
@@ -167,7 +194,7 @@ def convert_md_to_html(input_dir="organized_chats", output_dir=None):
         content = re.sub(r'\[([^\]]+)\]\(([^)]+\.md)(?:\s+"[^"]*")?\)', replace_link, content)
         
         # Convert markdown to HTML
-        html_content = md.convert(content)
+        html_content = index_body(md.convert(content))
         
         # Create complete HTML document for index
         html_doc = f"""<!DOCTYPE html>
@@ -188,26 +215,19 @@ def convert_md_to_html(input_dir="organized_chats", output_dir=None):
 """
         
         # Write HTML to file
-        index_html_path = os.path.join(output_dir, "index.html")
-        with open(index_html_path, 'w', encoding='utf-8') as f:
-            f.write(html_doc)
+        sink.write_text("index.html", html_doc)
         
         print("Created index.html from index.md")
     
     # Process each markdown file (except index.md which was already processed)
     for md_file in md_files:
-        rel_path = os.path.relpath(md_file, output_dir)
-        html_file = os.path.join(output_dir, os.path.splitext(rel_path)[0] + '.html')
+        rel_path = os.path.relpath(md_file, input_dir)
+        html_file = os.path.splitext(rel_path)[0] + '.html'
         
         # Skip index.md since we already processed it
         if os.path.basename(md_file) == "index.md" and os.path.dirname(rel_path) == "":
             continue
         
-        # Ensure directory exists
-        html_dir = os.path.dirname(html_file)
-        if not os.path.exists(html_dir):
-            os.makedirs(html_dir)
-        
         with open(md_file, 'r', encoding='utf-8') as f:
             content = f.read()
         
@@ -248,6 +268,8 @@ def convert_md_to_html(input_dir="organized_chats", output_dir=None):
         
         # Convert markdown to HTML
         html_content = md.convert(content)
+        if INDEX_PAGE.fullmatch(rel_path):
+            html_content = index_body(html_content)
         
         # Create complete HTML document
         html_doc = f"""<!DOCTYPE html>
@@ -255,7 +277,7 @@ def convert_md_to_html(input_dir="organized_chats", output_dir=None):
 <head>
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>{os.path.basename(os.path.splitext(md_file)[0])}</title>
+    <title>{"Chat History Index" if INDEX_PAGE.fullmatch(rel_path) else os.path.basename(os.path.splitext(md_file)[0])}</title>
     {css}
 </head>
 <body>
@@ -268,10 +290,12 @@ def convert_md_to_html(input_dir="organized_chats", output_dir=None):
 """
         
         # Write HTML to file
-        with open(html_file, 'w', encoding='utf-8') as f:
-            f.write(html_doc)
+        sink.write_text(html_file, html_doc)
         
-        print(f"Converted {md_file} to {html_file}")
+        print(f"Converted {md_file} to {html_file} in {sink}")
+    
+    if sink is not output_dir:
+        sink.close()
     
     print(f"\nHTML conversion complete. {len(md_files)} files converted.")
 
@@ -342,7 +366,8 @@ def generate_single_page(input_dir="organized_chats_html", output_file="index_on
                 combined_content.append(f'<hr id="{bubble_dir}">')
                 combined_content.append(f'<h3>Conversation: {bubble_dir}</h3>')
                 combined_content.append('<div class="conversation">')
-                combined_content.append(conv_match.group(1))
+                # Links to out-of-line tool outputs are relative to the conversation's directory
+                combined_content.append(conv_match.group(1).replace('href="./tool_outputs/', f'href="{bubble_dir}/tool_outputs/'))
                 combined_content.append('</div>')
         except Exception as e:
             print(f"Error processing conversation {rel_path}: {str(e)}")
@@ -1,19 +1,35 @@
 #!/usr/bin/env python3
 
+import io
 import json
 import os
 import glob
 import re
 from datetime import datetime
-import shutil
 import sys
 
-def organize_chats(input_dir="extracted_chats", output_dir="organized_chats"):
+from output_sink import DirectorySink, open_sink
+from payload_dedup import PayloadDeduplicator, dedup_fenced_blocks
+from search_index import INDEX_PAGE_SIZE, SearchIndexBuilder, index_pages
+
+# Tool outputs larger than this (bytes) are written to their own file and only previewed in conversation.md
+TOOL_OUTPUT_INLINE_LIMIT = 64 * 1024
+TOOL_OUTPUT_PREVIEW_CHARS = 2000
+
+def organize_chats(input_dir="extracted_chats", output_dir="organized_chats", dedup=True, inline_limit=TOOL_OUTPUT_INLINE_LIMIT, page_size=INDEX_PAGE_SIZE):
     """
-    Organize the extracted chat files into coherent conversation threads
+    Organize the extracted chat files into coherent conversation threads.
+    output_dir may be a directory, a *.tar.zst / *.zip / *.sqlite bundle or an OutputSink.
+    With dedup, tool outputs and code blocks already written elsewhere in the corpus are
+    replaced by a reference (plus a diff for near-identical ones).
+    Tool outputs above inline_limit bytes (0 = no limit) go to <bubble_dir>/tool_outputs/<message_id>.txt,
+    and diffs of tool outputs above it to <bubble_dir>/tool_outputs/<message_id>.diff;
+    conversation.md keeps a preview and a link.
+    The index is split into pages of page_size conversations (index.md, index_2.md, ...; 0 = one page),
+    and a search index over titles and message text is written to search/ (see search_index.py).
     """
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
+    sink = open_sink(output_dir)
+    deduplicator = PayloadDeduplicator() if dedup else None
     
     # Helper function to clean title text for display
     def clean_title_text(text):
@@ -27,6 +43,28 @@ def organize_chats(input_dir="extracted_chats", output_dir="organized_chats"):
         # Strip leading/trailing whitespace
         return text.strip()
     
+    # Helper function to render a reference to a payload written earlier.
+    # Diffs above inline_limit bytes go to <current_dir>/<out_of_line_name> when that is given, like tool outputs.
+    def format_reference(location, diff, current_dir, out_of_line_name=None):
+        target_dir, message_id, what = location
+        where = "this conversation" if target_dir == current_dir else f"[{target_dir}](../{target_dir}/conversation.md)"
+        if diff is None:
+            return f"*Identical to the {what} of message `{message_id}` in {where}.*"
+        header = f"*Same as the {what} of message `{message_id}` in {where}, except:*\n\n"
+        diff_size = len(diff.encode("utf-8"))
+        if out_of_line_name and inline_limit and diff_size > inline_limit:
+            return header + format_out_of_line(diff, diff_size, current_dir, out_of_line_name, "diff")
+        return header + f"```diff\n{diff}\n```"
+    
+    # Helper function to write an oversized tool output (or diff) out of line, returning its preview and link
+    def format_out_of_line(content, size, bubble_dir, output_name, language=""):
+        sink.write_text(f"{bubble_dir}/{output_name}", content)
+        preview = content[:TOOL_OUTPUT_PREVIEW_CHARS]
+        if "\n" in preview:
+            preview = preview[:preview.rindex("\n")]
+        what = "diff" if language == "diff" else "output"
+        return f"```{language}\n{preview}\n```\n\n*Preview of {size:,} bytes, see the [full {what}](./{output_name}).*"
+    
     # Helper function to find all conversation files in the output directory
     def find_conversation_files(directory):
         result = []
@@ -50,16 +88,18 @@ def organize_chats(input_dir="extracted_chats", output_dir="organized_chats"):
     print(f"Found {len(bubble_files)} message bubble JSON files")
     print(f"Found {len(tool_output_files)} tool output files")
     
-    # Create an index file
-    with open(os.path.join(output_dir, "index.md"), "w", encoding="utf-8") as index_file:
-        index_file.write("# Chat History Index\n\n")
-        index_file.write(f"Organized on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-        
+    # Collect the index entries per section (paginated and written once at the end),
+    # and the search index alongside
+    index_header = f"# Chat History Index\n\nOrganized on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
+    index_sections = []
+    search_index = SearchIndexBuilder()
+    with io.StringIO() as index_footer:
         conversation_files_processed = False
         
         # Organize bubbles by main conversation ID (bubbleId from filename)
         if bubble_files:
-            index_file.write("\n## Message Bubbles (Conversations)\n\n")
+            bubble_entries = []
+            index_sections.append(("Message Bubbles (Conversations)", bubble_entries))
             
             bubble_groups = {}
             for bubble_file_path in bubble_files:
@@ -79,8 +119,6 @@ def organize_chats(input_dir="extracted_chats", output_dir="organized_chats"):
                 files_in_group = sorted(bubble_groups[bubble_id]) # Sort files within a group (e.g., by message_id part of filename)
                 
                 bubble_dir_name = f"bubble_{i+1:03d}_{bubble_id}"
-                bubble_dir_path = os.path.join(output_dir, bubble_dir_name)
-                os.makedirs(bubble_dir_path, exist_ok=True)
                 
                 messages = []
                 
@@ -181,8 +219,7 @@ def organize_chats(input_dir="extracted_chats", output_dir="organized_chats"):
                 # This is a common heuristic for ordering if message_ids are sortable
                 messages.sort(key=lambda m: m["original_file"])
                 
-                conversation_md_file = os.path.join(bubble_dir_path, "conversation.md")
-                with open(conversation_md_file, "w", encoding="utf-8") as f:
+                with io.StringIO() as f:
                     f.write(f"# Conversation from Bubble {bubble_id}\n\n")
                     
                     for message in messages:
@@ -190,7 +227,15 @@ def organize_chats(input_dir="extracted_chats", output_dir="organized_chats"):
                         f.write(f"## {sender_marker}\n\n")
                         
                         if message['text'] or not (message["attachments"] or message["tool_output"]):
-                            f.write(f"{message['text']}\n\n")
+                            text = message['text']
+                            if deduplicator:
+                                text = dedup_fenced_blocks(
+                                    text,
+                                    deduplicator,
+                                    lambda idx, m=message: (bubble_dir_name, m["id"], f"code block {idx + 1}"),
+                                    lambda location, diff: format_reference(location, diff, bubble_dir_name),
+                                )
+                            f.write(f"{text}\n\n")
                         elif not message['text'] and (message["attachments"] or message["tool_output"]):
                             # If text is empty but there are attachments or tool output, add a placeholder or just proceed
                             f.write("\n") # Ensures a blank line if text is empty but attachments follow
@@ -203,9 +248,19 @@ def organize_chats(input_dir="extracted_chats", output_dir="organized_chats"):
                         
                         if message["tool_output"]:
                             f.write("### Tool Output:\n\n")
-                            f.write("```\n") # Start code block for tool output
-                            f.write(message["tool_output"])
-                            f.write("\n```\n\n") # End code block
+                            reference = deduplicator.check(message["tool_output"], (bubble_dir_name, message["id"], "tool output")) if deduplicator else None
+                            tool_output_size = len(message["tool_output"].encode("utf-8"))
+                            if reference:
+                                f.write(format_reference(*reference, bubble_dir_name, f"tool_outputs/{message['id']}.diff"))
+                                f.write("\n\n")
+                            elif inline_limit and tool_output_size > inline_limit:
+                                f.write(format_out_of_line(message["tool_output"], tool_output_size, bubble_dir_name, f"tool_outputs/{message['id']}.txt"))
+                                f.write("\n\n")
+                            else:
+                                f.write("```\n") # Start code block for tool output
+                                f.write(message["tool_output"])
+                                f.write("\n```\n\n") # End code block
+                    sink.write_text(f"{bubble_dir_name}/conversation.md", f.getvalue())
                 
                 first_message_text = messages[0]["text"] if messages and messages[0]["text"] else f"Conversation {bubble_id}"
                 
@@ -219,21 +274,23 @@ def organize_chats(input_dir="extracted_chats", output_dir="organized_chats"):
                     # Truncate if still too long
                     title = clean_text[:60] + "..." if len(clean_text) > 60 else clean_text
                 
-                index_file.write(f"- [{title}](./{bubble_dir_name}/conversation.md) ({len(messages)} messages)\n")
+                bubble_entries.append(f"- [{title}](./{bubble_dir_name}/conversation.md) ({len(messages)} messages)")
+                search_index.add(title, f"{bubble_dir_name}/conversation", [message["text"] for message in messages], len(messages))
                 
                 # Copy all related JSON files to the bubble directory
                 for file_path_to_copy in files_in_group:
-                    shutil.copy2(file_path_to_copy, os.path.join(bubble_dir_path, os.path.basename(file_path_to_copy)))
+                    sink.copy_file(file_path_to_copy, f"{bubble_dir_name}/{os.path.basename(file_path_to_copy)}")
                     
                     # Copy associated tool output if exists
                     potential_tool_output_file = file_path_to_copy.replace(".json", "_tool_output.txt")
                     if os.path.exists(potential_tool_output_file):
-                        shutil.copy2(potential_tool_output_file, os.path.join(bubble_dir_path, os.path.basename(potential_tool_output_file)))
+                        sink.copy_file(potential_tool_output_file, f"{bubble_dir_name}/{os.path.basename(potential_tool_output_file)}")
 
         # Process legacy conversation files (if any, and if desired)
         if conversation_files:
             conversation_files_processed = True
-            index_file.write("\n## Legacy Conversations (from .txt files)\n\n")
+            legacy_entries = []
+            index_sections.append(("Legacy Conversations (from .txt files)", legacy_entries))
             for i, conv_file_path in enumerate(conversation_files):
                 # This part remains as is, as it processes different source files
                 basename = os.path.basename(conv_file_path)
@@ -253,24 +310,22 @@ def organize_chats(input_dir="extracted_chats", output_dir="organized_chats"):
                     title = clean_title[:57] + "..." if len(clean_title) > 57 else clean_title
                 
                 new_filename = f"legacy_conversation_{i+1:03d}_{conv_id}.md"
-                with open(os.path.join(output_dir, new_filename), "w", encoding="utf-8") as f_new:
-                    f_new.write(f"# Legacy Conversation: {clean_title}\n\n")
-                    f_new.write(f"ID: {conv_id}\n\n")
-                    f_new.write("```\n")
-                    f_new.write(content)
-                    f_new.write("\n```\n")
+                sink.write_text(new_filename, f"# Legacy Conversation: {clean_title}\n\nID: {conv_id}\n\n```\n{content}\n```\n")
                 
-                index_file.write(f"- (Legacy) [{title}](./{new_filename})\n")
+                legacy_entries.append(f"- (Legacy) [{title}](./{new_filename})")
+                search_index.add(title, os.path.splitext(new_filename)[0], [content], None)
 
         # If no bubble or conversation files were processed, try to find existing conversation files
-        if not bubble_files and not conversation_files_processed:
+        # (only possible when writing into a plain directory)
+        if not bubble_files and not conversation_files_processed and isinstance(sink, DirectorySink):
             # Find all conversation.md files in the output directory
-            conversation_md_files = find_conversation_files(output_dir)
+            conversation_md_files = find_conversation_files(sink.root)
             if conversation_md_files:
-                index_file.write("\n## Existing Conversations\n\n")
+                existing_entries = []
+                index_sections.append(("Existing Conversations", existing_entries))
                 for i, conv_file_path in enumerate(conversation_md_files):
                     # Get the relative path to the output directory
-                    rel_path = os.path.relpath(conv_file_path, output_dir)
+                    rel_path = os.path.relpath(conv_file_path, sink.root)
                     
                     # Read the file to extract a title
                     with open(conv_file_path, "r", encoding="utf-8") as f_content:
@@ -279,11 +334,12 @@ def organize_chats(input_dir="extracted_chats", output_dir="organized_chats"):
                         if len(title) > 60:
                             title = title[:57] + "..."
                     
-                    index_file.write(f"- [{title}](./{rel_path})\n")
+                    existing_entries.append(f"- [{title}](./{rel_path})")
+                    search_index.add(title, os.path.splitext(rel_path)[0], [], None)
 
         # Section for specific search term (add only if desired)
         search_term = "node demo.js departures 8100013"
-        index_file.write(f"\n## Search Results for '{search_term}'\n\n")
+        index_footer.write(f"\n## Search Results for '{search_term}'\n\n")
         search_results_list = []
         # This search might need to be adapted if tool_output_files are not the sole source
         for tool_file_path in tool_output_files:
@@ -296,8 +352,7 @@ def organize_chats(input_dir="extracted_chats", output_dir="organized_chats"):
                     })
         
         if search_results_list:
-            search_result_md_file = os.path.join(output_dir, "search_results_node_demo.md")
-            with open(search_result_md_file, "w", encoding="utf-8") as f_search:
+            with io.StringIO() as f_search:
                 f_search.write(f"# Search Results for '{search_term}'\n\n")
                 for idx, result in enumerate(search_results_list):
                     filename = os.path.basename(result["file"])
@@ -305,23 +360,50 @@ def organize_chats(input_dir="extracted_chats", output_dir="organized_chats"):
                     f_search.write("```\n")
                     f_search.write(result["content"])
                     f_search.write("\n```\n\n")
+                sink.write_text("search_results_node_demo.md", f_search.getvalue())
             
-            index_file.write(f"Found {len(search_results_list)} matches. [View all 'node demo.js' matches](./search_results_node_demo.md)\n\n")
+            index_footer.write(f"Found {len(search_results_list)} matches. [View all 'node demo.js' matches](./search_results_node_demo.md)\n\n")
         else:
-            index_file.write(f"No matches found for '{search_term}'.\n")
+            index_footer.write(f"No matches found for '{search_term}'.\n")
+        
+        for page_name, page in index_pages(index_header, index_sections, index_footer.getvalue(), page_size):
+            sink.write_text(page_name, page)
+    
+    shard_count = search_index.write(sink)
+    print(f"Search index: {len(search_index.docs)} conversations, {len(search_index.postings)} terms in {shard_count} shards")
+    
+    if sink is not output_dir:
+        sink.close()
     
-    print(f"\nChat organization complete. All files saved to {output_dir}")
-    print(f"Check {os.path.join(output_dir, 'index.md')} for an index of all conversations")
+    if deduplicator:
+        dedup_stats = deduplicator.stats
+        print(f"Deduplicated {dedup_stats['exact']} identical and {dedup_stats['near']} near-identical payloads, saving {dedup_stats['bytes_saved']} bytes")
+    print(f"\nChat organization complete. All files saved to {sink}")
+    print(f"Check index.md in {sink} for an index of all conversations")
 
 if __name__ == "__main__":
     # Default input_dir can be changed here if needed, e.g. from sys.argv
     input_dir_arg = "extracted_chats" 
     output_dir_arg = "organized_chats"
 
-    if len(sys.argv) > 1:
-        input_dir_arg = sys.argv[1]
-    if len(sys.argv) > 2:
-        output_dir_arg = sys.argv[2]
+    # --no-dedup writes every tool output and code block in full
+    # --inline-limit N moves tool outputs above N bytes to separate files (0 keeps all of them inline)
+    args = [arg for arg in sys.argv[1:] if arg != "--no-dedup"]
+    inline_limit_arg = TOOL_OUTPUT_INLINE_LIMIT
+    if "--inline-limit" in args:
+        idx = args.index("--inline-limit")
+        inline_limit_arg = int(args[idx + 1])
+        del args[idx:idx + 2]
+    # --page-size N lists N conversations per index page (0 puts them all on index.md)
+    page_size_arg = INDEX_PAGE_SIZE
+    if "--page-size" in args:
+        idx = args.index("--page-size")
+        page_size_arg = int(args[idx + 1])
+        del args[idx:idx + 2]
+    if len(args) > 0:
+        input_dir_arg = args[0]
+    if len(args) > 1:
+        output_dir_arg = args[1]
         
     print(f"Running chat organization from '{input_dir_arg}' to '{output_dir_arg}'")
-    organize_chats(input_dir=input_dir_arg, output_dir=output_dir_arg) 
\ No newline at end of file
+    organize_chats(input_dir=input_dir_arg, output_dir=output_dir_arg, dedup="--no-dedup" not in sys.argv, inline_limit=inline_limit_arg, page_size=page_size_arg) 
\ No newline at end of file
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+
+import io
+import os
+import shutil
+import sqlite3
+import tarfile
+import tempfile
+import time
+import zipfile
+from abc import ABC, abstractmethod
+
+class OutputSink(ABC):
+    """
+    Destination for generated files, addressed by relative path ('dir/file.md').
+
+    Producers hand over complete file contents in one call, so every backend
+    can issue large sequential writes instead of many small appends.
+    """
+
+    @abstractmethod
+    def write_bytes(self, name, data):
+        """
+        Write data as the complete contents of name.
+        """
+
+    def write_text(self, name, text):
+        self.write_bytes(name, text.encode("utf-8"))
+
+    def copy_file(self, source_path, name):
+        with open(source_path, "rb") as f:
+            self.write_bytes(name, f.read())
+
+    def write_stream(self, name, chunks):
+        """
+        Write a file produced piecewise from an iterable of bytes chunks, for contents too
+        large to build in memory. Producing the chunks may write other files meanwhile.
+        Backends that can't append join the chunks.
+        """
+        self.write_bytes(name, b"".join(chunks))
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class DirectorySink(OutputSink):
+    """
+    Plain directory tree (the classic output layout).
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._known_dirs = {root}
+
+    def _path_for(self, name):
+        path = os.path.join(self.root, name)
+        parent = os.path.dirname(path)
+        if parent not in self._known_dirs:
+            os.makedirs(parent, exist_ok=True)
+            self._known_dirs.add(parent)
+        return path
+
+    def write_bytes(self, name, data):
+        with open(self._path_for(name), "wb") as f:
+            f.write(data)
+
+    def copy_file(self, source_path, name):
+        shutil.copy2(source_path, self._path_for(name))
+
+    def write_stream(self, name, chunks):
+        with open(self._path_for(name), "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+
+    def __str__(self):
+        return self.root
+
+
+class TarZstSink(OutputSink):
+    """
+    Streaming zstd-compressed tar archive; entries are appended as they are produced.
+    """
+
+    def __init__(self, path, level=3):
+        import zstandard  # Only needed for this output format
+
+        self.path = path
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self._raw = open(path, "wb")
+        self._stream = zstandard.ZstdCompressor(level=level).stream_writer(self._raw)
+        self._tar = tarfile.open(fileobj=self._stream, mode="w|")
+
+    def write_bytes(self, name, data):
+        info = tarfile.TarInfo(name=name)
+        info.size = len(data)
+        info.mtime = int(time.time())
+        self._tar.addfile(info, io.BytesIO(data))
+
+    def write_stream(self, name, chunks):
+        # Tar headers carry the size, so spool the contents (to disk once they are large)
+        with tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024) as spool:
+            for chunk in chunks:
+                spool.write(chunk)
+            info = tarfile.TarInfo(name=name)
+            info.size = spool.tell()
+            info.mtime = int(time.time())
+            spool.seek(0)
+            self._tar.addfile(info, spool)
+
+    def close(self):
+        if self._tar is None:
+            return
+        self._tar.close()
+        self._stream.close()  # Flushes the zstd frame and closes the file
+        self._tar = None
+
+    def __str__(self):
+        return self.path
+
+
+class ZipSink(OutputSink):
+    """
+    Single zip archive (deflate compressed).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self._zip = zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED)
+
+    def write_bytes(self, name, data):
+        self._zip.writestr(name, data)
+
+    def write_stream(self, name, chunks):
+        # Spooled first: no other entry can be written while an entry is open
+        with tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024) as spool:
+            for chunk in chunks:
+                spool.write(chunk)
+            spool.seek(0)
+            with self._zip.open(name, "w", force_zip64=True) as f:
+                shutil.copyfileobj(spool, f, 1024 * 1024)
+
+    def close(self):
+        self._zip.close()
+
+    def __str__(self):
+        return self.path
+
+
+class SqliteSink(OutputSink):
+    """
+    Single SQLite bundle with one row per file, written in a single transaction.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=OFF")
+        self._conn.execute("PRAGMA synchronous=OFF")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, data BLOB, mtime REAL)")
+
+    def write_bytes(self, name, data):
+        self._conn.execute("INSERT OR REPLACE INTO files (path, data, mtime) VALUES (?, ?, ?)", (name, data, time.time()))
+
+    def close(self):
+        if self._conn is None:
+            return
+        self._conn.commit()
+        self._conn.close()
+        self._conn = None
+
+    def __str__(self):
+        return self.path
+
+
+def open_sink(target):
+    """
+    Pick the sink from the target name: *.tar.zst, *.zip and *.sqlite/*.db
+    produce single-file bundles, anything else is treated as a directory.
+    """
+    if isinstance(target, OutputSink):
+        return target
+    if target.endswith(".tar.zst"):
+        return TarZstSink(target)
+    if target.endswith(".zip"):
+        return ZipSink(target)
+    if target.endswith(".sqlite") or target.endswith(".db"):
+        return SqliteSink(target)
+    return DirectorySink(target)
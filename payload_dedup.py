@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+
+import difflib
+import hashlib
+import re
+
+# Payloads smaller than this are always written out, a reference wouldn't be much shorter
+MIN_DEDUP_SIZE = 256
+# Near-duplicates are only written as a diff when it is at most this fraction of the payload
+MAX_DIFF_RATIO = 0.5
+# Line-level diffs are skipped for payloads above this size (difflib is superlinear)
+MAX_DIFF_INPUT_SIZE = 2 * 1024 * 1024
+# At most this many candidates (those sharing the most LSH bands first) are compared per payload
+MAX_DIFF_CANDIDATES = 4
+# Candidates whose line-level similarity upper bound (SequenceMatcher.quick_ratio) is below this
+# are skipped without diffing: at least half of their lines differ, so the diff can't be short
+MIN_QUICK_RATIO = 0.5
+
+_SIGNATURE_SIZE = 64
+_BAND_ROWS = 8
+_EMPTY_BIN = 1 << 64
+_FENCED_BLOCK = re.compile(r'^```[^\n`]*\n[\s\S]*?\n```[ \t]*$', re.MULTILINE)
+# Tool results are often JSON with whole files in one string, so escaped newlines split lines too
+_LINE_BREAK = re.compile(r'\n|\\n')
+
+def _lines(text):
+    return _LINE_BREAK.split(text)
+
+
+def _feature_hash(feature):
+    return int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def minhash_signature(text):
+    """
+    MinHash signature of the payload's set of lines (whitespace-normalized), using
+    one-permutation hashing: each line hash falls into one of _SIGNATURE_SIZE bins
+    and every bin keeps its minimum. Payloads sharing most lines share most bins.
+    """
+    signature = [_EMPTY_BIN] * _SIGNATURE_SIZE
+    for line in {" ".join(line.split()) for line in _lines(text)}:
+        if not line:
+            continue
+        h = _feature_hash(line)
+        bin_idx = h % _SIGNATURE_SIZE
+        value = h // _SIGNATURE_SIZE
+        if value < signature[bin_idx]:
+            signature[bin_idx] = value
+    return signature
+
+
+def _bands(signature):
+    # Probability of becoming a candidate is 1 - (1 - J^rows)^bands for line-set Jaccard similarity J
+    return [(i, tuple(signature[i * _BAND_ROWS:(i + 1) * _BAND_ROWS])) for i in range(_SIGNATURE_SIZE // _BAND_ROWS)]
+
+
+class PayloadDeduplicator:
+    """
+    Remembers tool outputs and code blocks seen so far across the whole corpus.
+
+    check() returns None for a payload that has to be written out, or
+    (location, diff) when an identical (diff is None) or near-identical payload
+    was already written at location. Near-duplicate candidates are found by
+    locality-sensitive hashing of MinHash signatures, then confirmed with a line diff
+    (for at most MAX_DIFF_CANDIDATES candidates that pass a quick similarity bound).
+    """
+
+    def __init__(self):
+        self.exact = {}
+        self.payloads = []
+        self.band_index = {}
+        self.stats = {"exact": 0, "near": 0, "bytes_saved": 0}
+
+    def check(self, payload, location):
+        if len(payload) < MIN_DEDUP_SIZE:
+            return None
+
+        digest = hashlib.sha1(payload.encode('utf-8')).digest()
+        reference = self.exact.get(digest)
+        if reference is None:
+            signature = minhash_signature(payload)
+            reference = self._near_duplicate(payload, signature)
+            if reference is None:
+                self._remember(payload, digest, signature, location)
+                return None
+            # Repeats of this near-duplicate get the same diff against the same base
+            self.exact[digest] = reference
+
+        diff = reference[1]
+        self.stats["exact" if diff is None else "near"] += 1
+        self.stats["bytes_saved"] += len(payload) - len(diff or "")
+        return reference
+
+    def _near_duplicate(self, payload, signature):
+        if len(payload) > MAX_DIFF_INPUT_SIZE:
+            return None
+        shared_bands = {}
+        for band in _bands(signature):
+            for payload_idx in self.band_index.get(band, ()):
+                shared_bands[payload_idx] = shared_bands.get(payload_idx, 0) + 1
+        if not shared_bands:
+            return None
+
+        payload_lines = _lines(payload)
+        # seq2 is the side SequenceMatcher caches, so it is set up once for all candidates
+        matcher = difflib.SequenceMatcher(None, autojunk=False)
+        matcher.set_seq2(payload_lines)
+        candidates = sorted(shared_bands, key=lambda idx: (-shared_bands[idx], idx))[:MAX_DIFF_CANDIDATES]
+        for payload_idx in candidates:
+            base, base_location = self.payloads[payload_idx]
+            base_lines = _lines(base)
+            matcher.set_seq1(base_lines)
+            if matcher.real_quick_ratio() < MIN_QUICK_RATIO or matcher.quick_ratio() < MIN_QUICK_RATIO:
+                continue
+            # Skip the ---/+++ file header, the reference already names the base
+            diff = "\n".join(list(difflib.unified_diff(base_lines, payload_lines, lineterm="", n=1))[2:])
+            if len(diff) <= len(payload) * MAX_DIFF_RATIO:
+                return base_location, diff
+        return None
+
+    def _remember(self, payload, digest, signature, location):
+        self.exact[digest] = (location, None)
+        if len(payload) > MAX_DIFF_INPUT_SIZE:
+            return  # Too big to diff against, only exact repeats are detected
+        self.payloads.append((payload, location))
+        for band in _bands(signature):
+            self.band_index.setdefault(band, []).append(len(self.payloads) - 1)
+
+
+def dedup_fenced_blocks(text, dedup, make_location, format_reference):
+    """
+    Run every fenced code block of a markdown text through dedup. Blocks written before
+    are replaced by format_reference(location, diff); make_location(index) names the
+    position of the index-th block for later references.
+    """
+    block_idx = [0]
+
+    def replace(match):
+        block = match.group(0)
+        reference = dedup.check(block, make_location(block_idx[0]))
+        block_idx[0] += 1
+        if reference is None:
+            return block
+        return format_reference(*reference)
+
+    return _FENCED_BLOCK.sub(replace, text)
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+
+import json
+import re
+import sys
+import unicodedata
+
+# Conversations listed per index page (index.md, index_2.md, ...)
+INDEX_PAGE_SIZE = 500
+# Terms are sharded by their first SHARD_PREFIX characters; the client loads one shard per query word
+SHARD_PREFIX = 2
+# Longer tokens (hashes, base64, minified code) are left out of the index
+MAX_TERM_LENGTH = 32
+
+SEARCH_DIR = "search"
+
+_token = None
+
+
+def _token_pattern():
+    # Runs of letters, marks, digits and '_' after NFC normalization, the same as the client's
+    # /[\p{L}\p{M}\p{N}_]+/u. \w already covers letters, digits and '_'; combining marks are added.
+    global _token
+    if _token is None:
+        ranges = []
+        for code in range(sys.maxunicode + 1):
+            if unicodedata.category(chr(code)).startswith("M"):
+                if ranges and ranges[-1][1] == code - 1:
+                    ranges[-1][1] = code
+                else:
+                    ranges.append([code, code])
+        marks = "".join(f"\\U{start:08x}-\\U{end:08x}" for start, end in ranges)
+        _token = re.compile(f"[\\w{marks}]+")
+    return _token
+
+
+def tokenize(text):
+    """
+    Lowercased word tokens that go into the index (the client splits queries the same way)
+    """
+    text = unicodedata.normalize("NFC", text).lower()
+    return {token for token in _token_pattern().findall(text) if len(token) <= MAX_TERM_LENGTH}
+
+
+def shard_name(prefix):
+    """
+    File-name-safe name of a term shard: ASCII letters and digits as is, other characters as -<hex>-
+    (delimited, so "\u00e99" and "\u0e99" don't both become -e99)
+    """
+    return "".join(c if c.isascii() and c.isalnum() else f"-{ord(c):x}-" for c in prefix)
+
+
+def _script(name, payload):
+    # Wrapped in a call instead of plain JSON so the pages also work when opened from file://,
+    # where fetch() of local files is blocked but <script> tags are not
+    return f"chatSearchIndex.load({json.dumps(name)}, {json.dumps(payload, ensure_ascii=False, separators=(',', ':'))});\n"
+
+
+class SearchIndexBuilder:
+    """
+    Collects conversations while they are organized and writes a precomputed search index:
+
+    search/docs.js         [title, path, message count or null] per conversation, plus the shard names
+    search/terms-<p>.js    term -> ascending conversation numbers (delta-encoded) for terms starting with <p>
+    search/search.js       the client, which filters titles locally and prefix-matches query words
+                           against the shard of each word, so a query loads a few small files
+    """
+
+    def __init__(self):
+        self.docs = []
+        self.postings = {}
+
+    def add(self, title, path, texts, message_count):
+        """
+        Add a conversation; path is its page without extension (".html" is appended by the client)
+        """
+        doc = len(self.docs)
+        self.docs.append([title, path, message_count])
+        terms = tokenize(title)
+        for text in texts:
+            terms |= tokenize(text)
+        for term in terms:
+            self.postings.setdefault(term, []).append(doc)
+
+    def write(self, sink):
+        shards = {}
+        for term in sorted(self.postings):
+            docs = self.postings[term]
+            shards.setdefault(term[:SHARD_PREFIX], {})[term] = [docs[0]] + [b - a for a, b in zip(docs, docs[1:])]
+        names = {shard_name(prefix): terms for prefix, terms in shards.items()}
+        for name, terms in names.items():
+            sink.write_text(f"{SEARCH_DIR}/terms-{name}.js", _script(name, terms))
+        sink.write_text(f"{SEARCH_DIR}/docs.js", _script("docs", {"docs": self.docs, "shards": sorted(names), "prefix": SHARD_PREFIX}))
+        sink.write_text(f"{SEARCH_DIR}/search.js", SEARCH_JS)
+        return len(names)
+
+
+def index_page_name(page):
+    return "index.md" if page == 1 else f"index_{page}.md"
+
+
+def index_pages(header, sections, footer="", page_size=INDEX_PAGE_SIZE):
+    """
+    Split the index into pages of at most page_size entries.
+    sections is a list of (heading, entry lines); a section continues on the next page where needed.
+    header goes on every page, footer on the first. Yields (file name, markdown).
+    """
+    entries = [(heading, line) for heading, lines in sections for line in lines]
+    page_count = max(1, -(-len(entries) // page_size)) if page_size else 1
+    per_page = page_size or max(1, len(entries))
+    for page in range(1, page_count + 1):
+        nav = [f"Page {page} of {page_count}"]
+        if page > 1:
+            nav.insert(0, f"[« Previous](./{index_page_name(page - 1)})")
+        if page < page_count:
+            nav.append(f"[Next »](./{index_page_name(page + 1)})")
+        nav = " | ".join(nav) + "\n"
+
+        parts = [header]
+        if page_count > 1:
+            parts.append(nav + "\n")
+        current_heading = None
+        for heading, line in entries[(page - 1) * per_page:page * per_page]:
+            if heading != current_heading:
+                parts.append(f"\n## {heading}\n\n")
+                current_heading = heading
+            parts.append(line + "\n")
+        if page_count > 1:
+            parts.append("\n" + nav)
+        if page == 1:
+            parts.append(footer)
+        yield index_page_name(page), "".join(parts)
+
+
+SEARCH_JS = r"""// Client for the index written by search_index.py: filters conversations by title and content
+(function () {
+  var base = document.currentScript.src.replace(/[^\/]*$/, "");
+  var loaded = {};
+  var waiting = {};
+  var meta = null;
+
+  window.chatSearchIndex = {
+    load: function (name, data) {
+      loaded[name] = data;
+      (waiting[name] || []).forEach(function (resolve) { resolve(data); });
+      delete waiting[name];
+    }
+  };
+
+  function fetchPart(name, file) {
+    if (name in loaded) return Promise.resolve(loaded[name]);
+    return new Promise(function (resolve) {
+      if (!waiting[name]) {
+        waiting[name] = [];
+        var script = document.createElement("script");
+        script.src = base + file;
+        script.onerror = function () { chatSearchIndex.load(name, null); };
+        document.head.appendChild(script);
+      }
+      waiting[name].push(resolve);
+    });
+  }
+
+  function shardName(prefix) {
+    var name = "";
+    for (var c of prefix) {
+      name += /^[a-z0-9]$/i.test(c) ? c : "-" + c.codePointAt(0).toString(16) + "-";
+    }
+    return name;
+  }
+
+  // Conversations having a term that starts with word, as a Set of conversation numbers
+  function contentMatches(word) {
+    var prefix = Array.from(word).slice(0, meta.prefix).join("");
+    var name = shardName(prefix);
+    if (Array.from(word).length < meta.prefix || meta.shards.indexOf(name) < 0) return Promise.resolve(new Set());
+    return fetchPart(name, "terms-" + name + ".js").then(function (terms) {
+      var docs = new Set();
+      Object.keys(terms || {}).forEach(function (term) {
+        if (term.lastIndexOf(word, 0) !== 0) return;
+        var doc = 0;
+        terms[term].forEach(function (delta) { doc += delta; docs.add(doc); });
+      });
+      return docs;
+    });
+  }
+
+  function search(query) {
+    var words = query.normalize("NFC").toLowerCase().match(/[\p{L}\p{M}\p{N}_]+/gu) || [];
+    return Promise.all(words.map(contentMatches)).then(function (matches) {
+      var results = [];
+      meta.docs.forEach(function (doc, i) {
+        var title = doc[0].normalize("NFC").toLowerCase();
+        var all = words.every(function (word, w) { return matches[w].has(i) || title.indexOf(word) >= 0; });
+        if (all) results.push(doc);
+      });
+      return results;
+    });
+  }
+
+  var MAX_RESULTS = 200;
+
+  function render(box, listing, query, results) {
+    if (!query) {
+      box.innerHTML = "";
+      listing.forEach(function (el) { el.style.display = ""; });
+      return;
+    }
+    listing.forEach(function (el) { el.style.display = "none"; });
+    var html = "<p>" + results.length + " matching conversation" + (results.length === 1 ? "" : "s") +
+      (results.length > MAX_RESULTS ? ", showing the first " + MAX_RESULTS : "") + "</p><ul>";
+    results.slice(0, MAX_RESULTS).forEach(function (doc) {
+      var link = document.createElement("a");
+      link.href = doc[1] + ".html";
+      link.textContent = doc[0];
+      html += "<li>" + link.outerHTML + (doc[2] === null ? "" : " (" + doc[2] + " messages)") + "</li>";
+    });
+    box.innerHTML = html + "</ul>";
+  }
+
+  document.addEventListener("DOMContentLoaded", function () {
+    var input = document.getElementById("chat-search");
+    var box = document.getElementById("chat-search-results");
+    if (!input || !box) return;
+    var listing = Array.prototype.slice.call(document.querySelectorAll(".index-listing"));
+    var pending = null;
+    var latest = 0;
+    input.addEventListener("input", function () {
+      clearTimeout(pending);
+      pending = setTimeout(function () {
+        var query = input.value.trim();
+        var ticket = ++latest;
+        fetchPart("docs", "docs.js").then(function (data) {
+          meta = data;
+          return query && meta ? search(query) : [];
+        }).then(function (results) {
+          if (ticket === latest) render(box, listing, query, results);
+        });
+      }, 150);
+    });
+  });
+})();
+"""
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+
+import re
+import shlex
+from abc import ABC, abstractmethod
+
+SEARCH_MODES = ["literal", "icase", "regex", "bool"]
+
+class Query(ABC):
+    """
+    A search over raw BLOB bytes.
+
+    Implementations work on bytes and report byte offsets so callers never have
+    to decode a whole value just to locate a match.
+    """
+
+    @abstractmethod
+    def first_span(self, data):
+        """
+        Return (start, end) byte offsets of the first hit, or None.
+        """
+
+    @abstractmethod
+    def spans(self, data):
+        """
+        Yield (start, end) byte offsets of all hits.
+        """
+
+    def matches(self, data):
+        return self.first_span(data) is not None
+
+    def matches_text(self, text):
+        return self.matches(text.encode('utf-8'))
+
+    def sql_filter(self, column="value"):
+        """
+        Optional SQL prefilter (fragment, params) letting SQLite skip non-matching rows
+        without handing their values to Python. None if the query can't be expressed.
+        """
+        return None
+
+
+class LiteralQuery(Query):
+    """
+    Plain substring search via bytes.find (ASCII case folding when ignore_case is set).
+    """
+
+    def __init__(self, term, ignore_case=False):
+        self.term = term
+        self.ignore_case = ignore_case
+        encoded = term.encode('utf-8')
+        self._needle = encoded.lower() if ignore_case else encoded
+
+    def _haystack(self, data):
+        return data.lower() if self.ignore_case else data
+
+    def first_span(self, data):
+        pos = self._haystack(data).find(self._needle)
+        if pos < 0:
+            return None
+        return pos, pos + len(self._needle)
+
+    def spans(self, data):
+        haystack = self._haystack(data)
+        pos = haystack.find(self._needle)
+        while pos >= 0 and self._needle:
+            yield pos, pos + len(self._needle)
+            pos = haystack.find(self._needle, pos + 1)
+
+    def sql_filter(self, column="value"):
+        if self.ignore_case:
+            return None
+        return f"instr({column}, ?) > 0", [self._needle]
+
+
+class RegexQuery(Query):
+    """
+    Regular expression over the raw bytes (IGNORECASE folds ASCII only).
+    """
+
+    def __init__(self, pattern, ignore_case=False):
+        self.pattern = pattern
+        self._regex = re.compile(pattern.encode('utf-8'), re.IGNORECASE if ignore_case else 0)
+
+    def first_span(self, data):
+        match = self._regex.search(data)
+        return match.span() if match else None
+
+    def spans(self, data):
+        for match in self._regex.finditer(data):
+            yield match.span()
+
+
+class BooleanQuery(Query):
+    """
+    Literal terms combined in disjunctive normal form: any group matches when all
+    of its positive terms are present and none of its negated terms are.
+    """
+
+    def __init__(self, groups, ignore_case=False):
+        # groups: list of (positive_terms, negative_terms)
+        self.ignore_case = ignore_case
+        self.groups = [
+            ([LiteralQuery(t, ignore_case) for t in positive], [LiteralQuery(t, ignore_case) for t in negative])
+            for positive, negative in groups
+        ]
+
+    def _matching_group(self, data):
+        if self.ignore_case:
+            data = data.lower()  # Fold once for all terms instead of once per term
+        for positive, negative in self.groups:
+            if all(q._needle in data for q in positive) and not any(q._needle in data for q in negative):
+                return positive
+        return None
+
+    def matches(self, data):
+        return self._matching_group(data) is not None
+
+    def first_span(self, data):
+        positive = self._matching_group(data)
+        if positive is None:
+            return None
+        hits = [q.first_span(data) for q in positive]
+        hits = [span for span in hits if span is not None]
+        return min(hits) if hits else (0, 0)
+
+    def spans(self, data):
+        positive = self._matching_group(data)
+        if positive is None:
+            return
+        yield from sorted(span for q in positive for span in q.spans(data))
+
+    def sql_filter(self, column="value"):
+        if self.ignore_case:
+            return None
+        clauses = []
+        params = []
+        for positive, negative in self.groups:
+            parts = [f"instr({column}, ?) > 0" for _ in positive] + [f"instr({column}, ?) = 0" for _ in negative]
+            if not parts:
+                return None
+            clauses.append("(" + " AND ".join(parts) + ")")
+            params.extend(q._needle for q in positive)
+            params.extend(q._needle for q in negative)
+        return "(" + " OR ".join(clauses) + ")", params
+
+
+def parse_boolean(expression):
+    """
+    Parse 'a AND b OR "c d" AND NOT e' into DNF groups; AND binds tighter than OR.
+    """
+    groups = []
+    positive, negative = [], []
+    negate = False
+    for token in shlex.split(expression):
+        if token == "OR":
+            groups.append((positive, negative))
+            positive, negative = [], []
+        elif token == "AND":
+            continue
+        elif token == "NOT":
+            negate = True
+        else:
+            (negative if negate else positive).append(token)
+            negate = False
+    groups.append((positive, negative))
+    return [group for group in groups if group[0] or group[1]]
+
+
+def build_query(search_term, mode="literal", ignore_case=False):
+    if mode == "literal":
+        return LiteralQuery(search_term, ignore_case)
+    if mode == "icase":
+        return LiteralQuery(search_term, ignore_case=True)
+    if mode == "regex":
+        return RegexQuery(search_term, ignore_case)
+    if mode == "bool":
+        return BooleanQuery(parse_boolean(search_term), ignore_case)
+    raise ValueError(f"Unknown search mode '{mode}', expected one of: {', '.join(SEARCH_MODES)}")
+
+
+def context_window(data, start, end, radius=200):
+    """
+    Decode only the bytes around a hit; partial characters at the edges are dropped.
+    """
+    return data[max(0, start - radius):end + radius].decode('utf-8', errors='ignore')
+
+
+_NON_PRINTABLE = re.compile(b'[^\\x20-\\x7E]')
+
+
+def printable_run(data, start, end, min_length=8, chunk_size=4096):
+    """
+    Return (left, right) bounds of the run of printable ASCII bytes enclosing [start, end),
+    or None if it's shorter than min_length or the hit itself contains non-printable bytes.
+    Only the bytes of the run itself are examined, never the whole value.
+    """
+    if start >= end or _NON_PRINTABLE.search(data, start, end):
+        return None
+
+    non_printable = _NON_PRINTABLE.search(data, end)
+    right = non_printable.start() if non_printable else len(data)
+
+    left = start
+    while left > 0:
+        chunk_start = max(0, left - chunk_size)
+        last = None
+        for last in _NON_PRINTABLE.finditer(data, chunk_start, left):
+            pass
+        if last is not None:
+            left = last.end()
+            break
+        left = chunk_start
+
+    if right - left < min_length:
+        return None
+    return left, right
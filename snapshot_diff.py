@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+
+import hashlib
+import json
+import re
+import sys
+
+from state_db import open_state_db
+
+TABLES = ["ItemTable", "cursorDiskKV"]
+
+# cursorDiskKV keys of conversations and their messages (bubbles)
+_COMPOSER_KEY = re.compile(r'composerData:(.+)')
+_BUBBLE_KEY = re.compile(r'(?:cursor_)?bubbleId:([^:]+):(.+)')
+
+
+def _value_digest(value):
+    return None if value is None else hashlib.blake2b(value, digest_size=16).digest()
+
+
+def iter_key_digests(conn, table):
+    """
+    (key, size in bytes, digest) of every row in key order. The value is hashed inside the query,
+    so it is read once and never decoded or returned to Python as a whole.
+    """
+    conn.create_function("value_digest", 1, _value_digest, deterministic=True)
+    return conn.execute(f"SELECT key, length(CAST(value AS BLOB)), value_digest(CAST(value AS BLOB)) FROM {table} ORDER BY key")
+
+
+def merge_join(old_rows, new_rows):
+    """
+    Walk two key-ordered (key, size, digest) streams side by side.
+    Yields (key, status, old_size, new_size) for every key, status being
+    "added", "removed", "modified" or None (unchanged).
+    """
+    old_rows = iter(old_rows)
+    new_rows = iter(new_rows)
+    old = next(old_rows, None)
+    new = next(new_rows, None)
+    while old is not None or new is not None:
+        if new is None or (old is not None and old[0] < new[0]):
+            yield old[0], "removed", old[1], None
+            old = next(old_rows, None)
+        elif old is None or new[0] < old[0]:
+            yield new[0], "added", None, new[1]
+            new = next(new_rows, None)
+        else:
+            changed = old[1] != new[1] or old[2] != new[2]
+            yield old[0], "modified" if changed else None, old[1], new[1]
+            old = next(old_rows, None)
+            new = next(new_rows, None)
+
+
+def _table_names(conn):
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'view')")}
+
+
+def diff_snapshots(old_db, new_db):
+    """
+    Compare two state.vscdb snapshots (paths or connections) key by key.
+    Returns {"conversations": {composer_id: {"status", "messages": {"added", "removed", "modified"}}},
+             "keys": {table: {"added", "removed", "modified"}}} listing only what changed;
+    message and key lists hold ids/keys, "keys" covers everything that is not a conversation or message.
+    """
+    old_conn = open_state_db(old_db)
+    new_conn = open_state_db(new_db)
+    conversations = {}
+    keys = {}
+    in_old = set()
+    in_new = set()
+    try:
+        old_tables = _table_names(old_conn)
+        new_tables = _table_names(new_conn)
+        for table in TABLES:
+            old_rows = iter_key_digests(old_conn, table) if table in old_tables else []
+            new_rows = iter_key_digests(new_conn, table) if table in new_tables else []
+            for key, status, old_size, new_size in merge_join(old_rows, new_rows):
+                match = (_BUBBLE_KEY.fullmatch(key) or _COMPOSER_KEY.fullmatch(key)) if table == "cursorDiskKV" else None
+                if match is None:
+                    if status:
+                        keys.setdefault(table, {"added": [], "removed": [], "modified": []})[status].append(key)
+                    continue
+                composer_id = match.group(1)
+                if old_size is not None:
+                    in_old.add(composer_id)
+                if new_size is not None:
+                    in_new.add(composer_id)
+                if status:
+                    conversation = conversations.setdefault(composer_id, {"status": "modified", "messages": {"added": [], "removed": [], "modified": []}})
+                    if match.re is _BUBBLE_KEY:
+                        conversation["messages"][status].append(match.group(2))
+    finally:
+        if old_conn is not old_db:
+            old_conn.close()
+        if new_conn is not new_db:
+            new_conn.close()
+
+    for composer_id, conversation in conversations.items():
+        if composer_id not in in_old:
+            conversation["status"] = "added"
+        elif composer_id not in in_new:
+            conversation["status"] = "removed"
+    return {"conversations": conversations, "keys": keys}
+
+
+def print_diff(diff):
+    conversations = diff["conversations"]
+    counts = {"added": 0, "removed": 0, "modified": 0}
+    message_counts = {"added": 0, "removed": 0, "modified": 0}
+    for conversation in conversations.values():
+        counts[conversation["status"]] += 1
+        for status, message_ids in conversation["messages"].items():
+            message_counts[status] += len(message_ids)
+
+    print(f"Conversations: {counts['added']} added, {counts['removed']} removed, {counts['modified']} modified")
+    markers = {"added": "+", "removed": "-", "modified": "~"}
+    for composer_id, conversation in sorted(conversations.items(), key=lambda item: (item[1]["status"], item[0])):
+        messages = conversation["messages"]
+        if conversation["status"] == "added":
+            detail = f"{len(messages['added'])} messages"
+        elif conversation["status"] == "removed":
+            detail = f"{len(messages['removed'])} messages"
+        else:
+            detail = f"messages: {len(messages['added'])} added, {len(messages['removed'])} removed, {len(messages['modified'])} modified"
+        print(f"  {markers[conversation['status']]} {composer_id} ({detail})")
+    print(f"Messages: {message_counts['added']} added, {message_counts['removed']} removed, {message_counts['modified']} modified")
+
+    for table, changes in diff["keys"].items():
+        print(f"{table}: {len(changes['added'])} keys added, {len(changes['removed'])} removed, {len(changes['modified'])} modified")
+        for status in ["added", "removed", "modified"]:
+            for key in changes[status]:
+                print(f"  {markers[status]} {key}")
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if arg != "--json"]
+    if len(args) != 2:
+        print("Usage: python snapshot_diff.py <old_state.vscdb> <new_state.vscdb> [--json]")
+        sys.exit(1)
+
+    result = diff_snapshots(args[0], args[1])
+    if "--json" in sys.argv:
+        print(json.dumps(result, indent=2))
+    else:
+        print_diff(result)
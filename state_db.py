@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+
+import hashlib
+import os
+import sqlite3
+import sys
+import tempfile
+from pathlib import Path
+
+from vscode_chat_viewer.app.archive import register_archive_functions
+
+# Reading from a snapshot instead of the live database: "memory" copies it into memory for this
+# connection, "tmpfs" reuses (or refreshes) a pinned copy in SNAPSHOT_DIR. Empty reads the live file.
+SNAPSHOT_MODE_ENV = "CHAT_STATE_SNAPSHOT"
+SNAPSHOT_DIR_ENV = "CHAT_STATE_SNAPSHOT_DIR"
+SNAPSHOT_MODES = ("memory", "tmpfs")
+
+# Pages copied per backup step. The source is only locked during a step, so the editor
+# can keep writing in between; a write makes SQLite restart the copy to stay consistent.
+BACKUP_PAGES_PER_STEP = 4096
+BACKUP_STEP_SLEEP = 0.005
+# After this many restarts the rest is copied in one step, which locks out writers for that step only
+MAX_BACKUP_RESTARTS = 3
+
+
+class _BackupRestarted(Exception):
+    pass
+
+
+def _read_only_uri(db_path):
+    return f"{Path(db_path).absolute().as_uri()}?mode=ro"
+
+
+def _connect(target, **kwargs):
+    conn = sqlite3.connect(target, **kwargs)
+    register_archive_functions(conn)
+    return conn
+
+
+def default_snapshot_dir():
+    """
+    Where pinned snapshots go: $CHAT_STATE_SNAPSHOT_DIR, else /dev/shm (tmpfs on Linux), else the temp directory
+    """
+    configured = os.environ.get(SNAPSHOT_DIR_ENV)
+    if configured:
+        return configured
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm"
+    return tempfile.gettempdir()
+
+
+def copy_state_db(db_path, target, pages=BACKUP_PAGES_PER_STEP, sleep=BACKUP_STEP_SLEEP, max_restarts=MAX_BACKUP_RESTARTS):
+    """
+    Consistent copy of a (possibly live) state.vscdb into the connection target, made with the
+    SQLite online backup API in steps of pages pages.
+    In WAL mode one read transaction is held across all steps: it pins the copied snapshot, so
+    the editor's commits neither restart the copy nor wait for it. Otherwise every commit between
+    two steps restarts the copy; after max_restarts the copy is finished in a single step, so
+    it always completes while the editor keeps writing.
+    """
+    source = sqlite3.connect(_read_only_uri(db_path), uri=True)
+    try:
+        if source.execute("PRAGMA journal_mode").fetchone()[0].lower() == "wal":
+            source.execute("BEGIN")
+            source.execute("SELECT count(*) FROM sqlite_master").fetchone()  # Starts the read transaction
+            source.backup(target, pages=pages, sleep=sleep)
+            source.rollback()
+            return
+
+        last_remaining = [None]
+        restarts = [0]
+
+        def progress(status, remaining, total):
+            # Remaining pages only go up when SQLite started over
+            if last_remaining[0] is not None and remaining > last_remaining[0]:
+                restarts[0] += 1
+                if restarts[0] >= max_restarts:
+                    raise _BackupRestarted()
+            last_remaining[0] = remaining
+
+        try:
+            source.backup(target, pages=pages, progress=progress, sleep=sleep)
+        except _BackupRestarted:
+            source.backup(target)
+    finally:
+        source.close()
+
+
+def _private_dir(parent):
+    """
+    Per-user directory for snapshots inside parent (e.g. the shared /dev/shm), readable only by its owner
+    """
+    path = os.path.join(parent, f"chat-state-snapshots-{os.getuid()}" if hasattr(os, "getuid") else "chat-state-snapshots")
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if hasattr(os, "getuid") and (info.st_uid != os.getuid() or info.st_mode & 0o077):
+        raise PermissionError(f"Snapshot directory {path} must be owned by the current user with mode 0700")
+    return path
+
+
+def pin_snapshot(db_path, snapshot_dir=None):
+    """
+    Path of a snapshot of db_path in snapshot_dir (default_snapshot_dir()), made or refreshed only
+    if the database (or its WAL) changed since the snapshot was taken. Later runs reuse it.
+    """
+    snapshot_dir = _private_dir(snapshot_dir or default_snapshot_dir())
+    source = os.path.abspath(db_path)
+    digest = hashlib.sha1(source.encode("utf-8")).hexdigest()[:12]
+    snapshot_path = os.path.join(snapshot_dir, f"state-snapshot-{digest}.vscdb")
+
+    source_mtime = max(os.path.getmtime(path) for path in (source, source + "-wal") if os.path.exists(path))
+    if os.path.exists(snapshot_path) and os.path.getmtime(snapshot_path) > source_mtime:
+        return snapshot_path
+
+    # Copied under a temporary name, so readers of the previous snapshot never see a partial one
+    tmp_path = f"{snapshot_path}.tmp.{os.getpid()}"
+    # Created 0600 up front (SQLite keeps the mode, also for its journal): it is the user's whole chat history
+    os.close(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600))
+    target = sqlite3.connect(tmp_path)
+    try:
+        copy_state_db(source, target)
+    finally:
+        target.close()
+    os.replace(tmp_path, snapshot_path)
+    return snapshot_path
+
+
+def open_state_db(db, snapshot=None):
+    """
+    Connection to a state.vscdb given its path, or db itself if it already is a connection.
+    Callers close the connection only if they opened it (conn is not db), so chained
+    steps can share one connection.
+    A chat_archive.py archive can be opened the same way; its ItemTable and cursorDiskKV
+    views then read like a state.vscdb holding every conversation ever archived.
+    snapshot ("memory" or "tmpfs", default $CHAT_STATE_SNAPSHOT) reads from a consistent copy
+    instead of the live file, so long scans neither block the editor nor see its writes half-way.
+    """
+    if isinstance(db, sqlite3.Connection):
+        return db
+    snapshot = snapshot if snapshot is not None else os.environ.get(SNAPSHOT_MODE_ENV, "")
+    if snapshot == "memory":
+        conn = _connect(":memory:")
+        copy_state_db(db, conn)
+        return conn
+    if snapshot == "tmpfs":
+        return _connect(_read_only_uri(pin_snapshot(db)), uri=True)
+    if snapshot:
+        raise ValueError(f"Unknown snapshot mode {snapshot!r}, expected one of {', '.join(SNAPSHOT_MODES)}")
+    return _connect(_read_only_uri(db), uri=True)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python state_db.py <path_to_state.vscdb> [snapshot_dir]")
+        sys.exit(1)
+
+    print(pin_snapshot(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None))
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+
+import json
+import random
+import sqlite3
+import sys
+
+from state_db import open_state_db
+
+TABLES = ["ItemTable", "cursorDiskKV"]
+
+# cursorDiskKV key prefixes whose second component is the conversation (composer) id
+CONVERSATION_PREFIXES = {"bubbleId", "cursor_bubbleId", "composerData", "checkpointId", "codeBlockDiff", "messageRequestContext"}
+
+DEFAULT_SAMPLE_SIZE = 100
+# Larger values are left out of the field sample; their size alone already shows up per prefix
+MAX_SAMPLE_VALUE_BYTES = 8 * 1024 * 1024
+DEFAULT_TOP = 20
+
+
+def size_expression():
+    """
+    SQL for a value's size in bytes that doesn't load the value. octet_length (SQLite 3.43+) does this
+    for TEXT and BLOB; before that only length() of a BLOB does, so TEXT values are read to be measured.
+    """
+    if sqlite3.sqlite_version_info >= (3, 43, 0):
+        return "octet_length(value)"
+    return "CASE typeof(value) WHEN 'blob' THEN length(value) ELSE length(CAST(value AS BLOB)) END"
+
+
+def key_prefix(key):
+    """
+    Group of a key: the part before the first ':' (bubbleId, composerData, ...),
+    else the first component of a dotted key (workbench, aiCodeTrackingLines, ...)
+    """
+    if ":" in key:
+        return key.split(":", 1)[0]
+    return key.split(".", 1)[0]
+
+
+def _conversation_id(prefix, key):
+    if prefix not in CONVERSATION_PREFIXES:
+        return None
+    parts = key.split(":", 2)
+    return parts[1] if len(parts) > 1 else None
+
+
+def _field_sizes(value):
+    """
+    Serialized size per top-level JSON field of a sampled value (or one pseudo-field for anything else)
+    """
+    try:
+        data = json.loads(value)
+    except (json.JSONDecodeError, UnicodeDecodeError, TypeError):
+        return {"<not json>": len(value)}
+    if isinstance(data, dict):
+        return {field: len(json.dumps(field_value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")) for field, field_value in data.items()}
+    return {"<array>" if isinstance(data, list) else "<scalar>": len(value)}
+
+
+def dbstat_usage(conn):
+    """
+    Pages and bytes per table and index from the dbstat virtual table (None if SQLite lacks it),
+    plus the free pages VACUUM would give back.
+    """
+    try:
+        rows = conn.execute("SELECT name, count(*), sum(pgsize), sum(payload), sum(unused) FROM dbstat GROUP BY name ORDER BY sum(pgsize) DESC").fetchall()
+    except sqlite3.Error:
+        return None
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return {
+        "objects": [{"name": name, "pages": pages, "bytes": size, "payload": payload, "unused": unused} for name, pages, size, payload, unused in rows],
+        "free_bytes": free_pages * page_size,
+    }
+
+
+def profile_storage(db, sample_size=DEFAULT_SAMPLE_SIZE, use_dbstat=True, seed=0):
+    """
+    Where the bytes of a state.vscdb go, from one pass over keys and value sizes:
+    per table, per key prefix and per conversation. Only up to sample_size randomly chosen
+    values per prefix are read, to estimate how their bytes split over top-level JSON fields.
+    """
+    conn = open_state_db(db)
+    rng = random.Random(seed)
+    profile = {"tables": {}, "prefixes": {}, "conversations": {}, "fields": {}, "dbstat": None}
+    try:
+        names = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'view')")}
+        samples = {}
+        for table in TABLES:
+            if table not in names:
+                continue
+            table_stats = profile["tables"][table] = {"rows": 0, "bytes": 0, "key_bytes": 0}
+            for key, size in conn.execute(f"SELECT key, {size_expression()} FROM {table}"):
+                size = size or 0
+                table_stats["rows"] += 1
+                table_stats["bytes"] += size
+                table_stats["key_bytes"] += len(key.encode("utf-8"))
+
+                prefix = key_prefix(key)
+                prefix_stats = profile["prefixes"].setdefault((table, prefix), {"rows": 0, "bytes": 0, "max_bytes": 0, "max_key": None})
+                prefix_stats["rows"] += 1
+                prefix_stats["bytes"] += size
+                if size > prefix_stats["max_bytes"]:
+                    prefix_stats["max_bytes"] = size
+                    prefix_stats["max_key"] = key
+
+                conversation_id = _conversation_id(prefix, key)
+                if conversation_id:
+                    conversation = profile["conversations"].setdefault(conversation_id, {"rows": 0, "bytes": 0, "by_prefix": {}})
+                    conversation["rows"] += 1
+                    conversation["bytes"] += size
+                    conversation["by_prefix"][prefix] = conversation["by_prefix"].get(prefix, 0) + size
+
+                # Reservoir sample of the keys in each prefix
+                if sample_size and 0 < size <= MAX_SAMPLE_VALUE_BYTES:
+                    sample = samples.setdefault((table, prefix), {"seen": 0, "keys": []})
+                    sample["seen"] += 1
+                    if len(sample["keys"]) < sample_size:
+                        sample["keys"].append(key)
+                    else:
+                        slot = rng.randrange(sample["seen"])
+                        if slot < sample_size:
+                            sample["keys"][slot] = key
+
+        # Field sizes of the sampled values, scaled up to the prefix's total bytes
+        for (table, prefix), sample in samples.items():
+            field_bytes = {}
+            sampled_bytes = 0
+            for key in sample["keys"]:
+                row = conn.execute(f"SELECT value FROM {table} WHERE key = ?", (key,)).fetchone()
+                if row is None or row[0] is None:
+                    continue
+                value = row[0]
+                sampled_bytes += len(value.encode("utf-8") if isinstance(value, str) else value)
+                for field, size in _field_sizes(value).items():
+                    field_bytes[field] = field_bytes.get(field, 0) + size
+            if not sampled_bytes:
+                continue
+            total = profile["prefixes"][(table, prefix)]["bytes"]  # Includes values too large to sample
+            profile["fields"][(table, prefix)] = {
+                "sampled": len(sample["keys"]),
+                "estimated_bytes": {field: round(size / sampled_bytes * total) for field, size in sorted(field_bytes.items(), key=lambda item: -item[1])},
+            }
+
+        if use_dbstat:
+            profile["dbstat"] = dbstat_usage(conn)
+    finally:
+        if conn is not db:
+            conn.close()
+    return profile
+
+
+def _human(size):
+    for unit in ["B", "KiB", "MiB", "GiB"]:
+        if size < 1024 or unit == "GiB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def print_profile(profile, top=DEFAULT_TOP):
+    print("Tables:")
+    for table, stats in profile["tables"].items():
+        print(f"  {table}: {stats['rows']} rows, {_human(stats['bytes'])} of values, {_human(stats['key_bytes'])} of keys")
+
+    print("\nKey prefixes:")
+    for (table, prefix), stats in sorted(profile["prefixes"].items(), key=lambda item: -item[1]["bytes"]):
+        print(f"  {table} {prefix}: {stats['rows']} rows, {_human(stats['bytes'])} (largest {_human(stats['max_bytes'])}: {stats['max_key']})")
+        fields = profile["fields"].get((table, prefix))
+        if fields:
+            shown = list(fields["estimated_bytes"].items())[:8]
+            print(f"      fields (estimated from {fields['sampled']} values): " + ", ".join(f"{field} {_human(size)}" for field, size in shown))
+
+    conversations = sorted(profile["conversations"].items(), key=lambda item: -item[1]["bytes"])
+    print(f"\nLargest conversations ({len(conversations)} total):")
+    for conversation_id, stats in conversations[:top]:
+        by_prefix = ", ".join(f"{prefix} {_human(size)}" for prefix, size in sorted(stats["by_prefix"].items(), key=lambda item: -item[1]))
+        print(f"  {conversation_id}: {stats['rows']} rows, {_human(stats['bytes'])} ({by_prefix})")
+
+    if profile["dbstat"]:
+        print("\nOn disk (dbstat):")
+        for obj in profile["dbstat"]["objects"]:
+            print(f"  {obj['name']}: {obj['pages']} pages, {_human(obj['bytes'])} ({_human(obj['unused'])} unused)")
+        print(f"  free pages: {_human(profile['dbstat']['free_bytes'])} (reclaimed by VACUUM)")
+
+
+def _json_profile(profile):
+    # Tuple keys as "table/prefix"
+    result = dict(profile)
+    result["prefixes"] = {f"{table}/{prefix}": stats for (table, prefix), stats in profile["prefixes"].items()}
+    result["fields"] = {f"{table}/{prefix}": stats for (table, prefix), stats in profile["fields"].items()}
+    return result
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    options = {"--sample": DEFAULT_SAMPLE_SIZE, "--top": DEFAULT_TOP}
+    for option in options:
+        if option in args:
+            idx = args.index(option)
+            options[option] = int(args[idx + 1])
+            del args[idx:idx + 2]
+    as_json = "--json" in args
+    use_dbstat = "--no-dbstat" not in args
+    args = [arg for arg in args if arg not in ("--json", "--no-dbstat")]
+    if len(args) != 1:
+        print("Usage: python storage_profile.py <path_to_state.vscdb> [--sample N] [--top N] [--no-dbstat] [--json]")
+        sys.exit(1)
+
+    result = profile_storage(args[0], sample_size=options["--sample"], use_dbstat=use_dbstat)
+    if as_json:
+        print(json.dumps(_json_profile(result), indent=2))
+    else:
+        print_profile(result, top=options["--top"])
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+import os
+
+DEFAULT_SEARCH_TERMS = [
+    "node demo.js departures",
+    "chat",
+    "conversation",
+    "message",
+    "assistant",
+    "user",
+    "bubbles"
+]
+
+class MultiTermMatcher:
+    """
+    Find which of many search terms occur in a BLOB.
+
+    With pyahocorasick installed, the terms' UTF-8 bytes are compiled into an
+    Aho-Corasick automaton, so a single scan finds all of them whatever their number.
+    Otherwise each term is looked up with bytes' own (C-level) substring search,
+    longest first; a term contained in one already found is known to be present
+    through a precomputed implication map and is not searched for.
+    """
+
+    def __init__(self, terms):
+        # Keep the caller's order (it drives output order) but drop duplicates and empty terms
+        self.terms = [t for t in dict.fromkeys(terms) if t]
+        self._encoded = {term: term.encode('utf-8') for term in self.terms}
+        self._by_length = sorted(self.terms, key=lambda t: len(self._encoded[t]), reverse=True)
+
+        # term -> all terms that are guaranteed to be present when it is present
+        self._implied = {}
+        for term in self.terms:
+            encoded = self._encoded[term]
+            self._implied[term] = {other for other in self.terms if self._encoded[other] in encoded}
+
+        self._automaton = None
+        if self.terms:
+            try:
+                import ahocorasick
+            except ImportError:
+                return
+            # pyahocorasick matches str: bytes are mapped 1:1 to code points through latin-1
+            self._automaton = ahocorasick.Automaton()
+            for term in self.terms:
+                self._automaton.add_word(self._encoded[term].decode('latin-1'), term)
+            self._automaton.make_automaton()
+
+    def find_terms(self, data):
+        """
+        Return the set of terms occurring in data (bytes or str).
+        """
+        if not self.terms or not data:
+            return set()
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+
+        found = set()
+        if self._automaton is not None:
+            for _, term in self._automaton.iter(data.decode('latin-1')):
+                found.add(term)
+                if len(found) == len(self.terms):
+                    break  # Every term already seen, nothing left to find
+            return found
+
+        for term in self._by_length:
+            if term not in found and self._encoded[term] in data:
+                found |= self._implied[term]
+        return found
+
+
+class MatchWriters:
+    """
+    Buffered per-term match files that are opened once, on the first hit.
+    """
+
+    def __init__(self, output_dir, buffer_size=1024 * 1024):
+        self.output_dir = output_dir
+        self.buffer_size = buffer_size
+        self._files = {}
+
+    @staticmethod
+    def filename_for(term):
+        return f"matches_{term.replace(' ', '_')}.txt"
+
+    def write(self, term, text):
+        f = self._files.get(term)
+        if f is None:
+            match_file = os.path.join(self.output_dir, self.filename_for(term))
+            f = open(match_file, "w", encoding="utf-8", buffering=self.buffer_size)
+            self._files[term] = f
+        f.write(text)
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._files.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def load_search_terms(spec):
+    """
+    Parse a term list given as '@path/to/file' (one term per line) or a comma separated string.
+    """
+    if spec.startswith("@"):
+        with open(spec[1:], "r", encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip()]
+    return [term.strip() for term in spec.split(",") if term.strip()]
@@ -0,0 +1,63 @@
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from state_db import copy_state_db, pin_snapshot  # noqa: E402
+
+
+def _make_db(path, journal_mode, rows=2000):
+    conn = sqlite3.connect(path)
+    conn.execute(f"PRAGMA journal_mode = {journal_mode}")
+    conn.execute("CREATE TABLE ItemTable (key TEXT UNIQUE ON CONFLICT REPLACE, value BLOB)")
+    conn.executemany("INSERT INTO ItemTable VALUES (?, ?)", ((f"key{i}", os.urandom(4096)) for i in range(rows)))
+    conn.commit()
+    conn.close()
+
+
+@pytest.mark.parametrize("journal_mode", ["wal", "delete"])
+def test_copy_finishes_under_concurrent_writes(tmp_path, journal_mode):
+    db_path = str(tmp_path / "state.vscdb")
+    _make_db(db_path, journal_mode)
+    stop = threading.Event()
+    commits = [0]
+
+    def writer():
+        conn = sqlite3.connect(db_path, timeout=10)
+        while not stop.is_set():
+            conn.execute("INSERT INTO ItemTable VALUES (?, ?)", (f"write{commits[0]}", os.urandom(512)))
+            conn.commit()
+            commits[0] += 1
+            time.sleep(0.02)
+        conn.close()
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        time.sleep(0.05)
+        target = sqlite3.connect(":memory:")
+        started = time.monotonic()
+        # One page per step, so every commit in between would restart a plain stepped backup
+        copy_state_db(db_path, target, pages=1, sleep=0.001)
+        elapsed = time.monotonic() - started
+    finally:
+        stop.set()
+        thread.join()
+
+    assert commits[0] > 0
+    assert elapsed < 10
+    assert target.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+    assert target.execute("SELECT count(*) FROM ItemTable WHERE key LIKE 'key%'").fetchone()[0] == 2000
+
+
+def test_pin_snapshot_is_private(tmp_path):
+    db_path = str(tmp_path / "state.vscdb")
+    _make_db(db_path, "delete", rows=10)
+    snapshot_path = pin_snapshot(db_path, str(tmp_path / "shared"))
+    assert os.stat(snapshot_path).st_mode & 0o777 == 0o600
+    assert os.stat(os.path.dirname(snapshot_path)).st_mode & 0o777 == 0o700
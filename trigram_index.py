@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+from array import array
+
+try:
+    import re._parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+from search_query import SEARCH_MODES, BooleanQuery, LiteralQuery, RegexQuery, build_query
+from state_db import open_state_db
+
+BUBBLE_KEY_PATTERNS = ["bubbleId:%", "cursor_bubbleId:%"]
+# A trigram's posting segments are merged into one once it has more than this many
+MAX_SEGMENTS = 8
+# All posting lists are rewritten without removed docs once these make up this share of the docs
+COMPACT_STALE_FRACTION = 0.25
+
+def bubble_search_text(msg_json):
+    """
+    Searchable text of a bubble: message text, code blocks and tool output.
+    """
+    parts = [msg_json.get("text") or ""]
+    for code_block in msg_json.get("codeBlocks", []):
+        if isinstance(code_block, dict):
+            parts.append(code_block.get("content") or "")
+    tool_former_data = msg_json.get("toolFormerData")
+    if isinstance(tool_former_data, dict) and tool_former_data.get("result"):
+        result = tool_former_data["result"]
+        parts.append(result if isinstance(result, str) else json.dumps(result))
+    for res_list_key in ["interpreterResults", "toolResults"]:
+        for tool_res in msg_json.get(res_list_key, []):
+            if isinstance(tool_res, dict):
+                result = tool_res.get("result") or tool_res.get("output")
+                if result:
+                    parts.append(result if isinstance(result, str) else json.dumps(result))
+    return "\n".join(part for part in parts if part)
+
+
+def _value_digest(value):
+    return None if value is None else hashlib.blake2b(value, digest_size=16).digest()
+
+
+def trigrams(data):
+    """
+    Set of trigrams (packed into 24-bit ints) of ASCII-lowercased bytes.
+    """
+    data = data.lower()
+    return {int.from_bytes(data[i:i + 3], "big") for i in range(len(data) - 2)}
+
+
+def _literal_runs(pattern):
+    """
+    Literal byte strings every match of the regex must contain (top-level literal runs only).
+    """
+    runs = []
+    current = []
+    for op, arg in sre_parse.parse(pattern):
+        if op is sre_parse.LITERAL:
+            current.append(chr(arg))
+            continue
+        if current:
+            runs.append("".join(current))
+            current = []
+    if current:
+        runs.append("".join(current))
+    return [run.encode("utf-8") for run in runs]
+
+
+class TrigramIndex:
+    """
+    Persistent trigram posting lists over bubble text, code blocks and tool output.
+
+    Candidates for a substring, boolean or regex query are found by intersecting
+    the posting lists of the query's trigrams, then verified against the stored
+    text. The index is updated incrementally: only bubbles whose key is new or
+    whose stored value changed (by content hash) are (re)indexed.
+
+    A trigram's posting list is a series of segments, and an update only appends one
+    segment per trigram it touches, so common trigrams' long lists are not rewritten.
+    A trigram's segments are merged once there are more than MAX_SEGMENTS of them.
+    Ids of removed docs stay in the segments (docs ids are never reused, so they
+    resolve to nothing) and are listed in deleted_docs until compact() drops them.
+    """
+
+    def __init__(self, index_path):
+        self.index_path = index_path
+        self.conn = sqlite3.connect(index_path)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(docs)")}
+        posting_columns = {row[1] for row in self.conn.execute("PRAGMA table_info(postings)")}
+        if (columns and "value_hash" not in columns) or (posting_columns and not self._has_deleted_table()):
+            # Index from before content hashes or posting segments: rebuilt on the next update
+            self.conn.executescript("DROP TABLE IF EXISTS docs; DROP TABLE IF EXISTS postings;")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS docs (
+                doc_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                key TEXT UNIQUE,
+                composer_id TEXT,
+                message_id TEXT,
+                value_hash BLOB,
+                data BLOB
+            );
+            CREATE TABLE IF NOT EXISTS postings (trigram INTEGER NOT NULL, doc_ids BLOB NOT NULL);
+            CREATE INDEX IF NOT EXISTS postings_trigram ON postings (trigram);
+            CREATE TABLE IF NOT EXISTS deleted_docs (doc_id INTEGER PRIMARY KEY);
+        """)
+
+    def _has_deleted_table(self):
+        return self.conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'deleted_docs'").fetchone() is not None
+
+    def close(self):
+        self.conn.close()
+
+    def update(self, db_path, full=False):
+        """
+        Bring the index up to date with the bubbles in db_path. Returns (added, removed).
+        """
+        if full:
+            self.conn.execute("DELETE FROM docs")
+            self.conn.execute("DELETE FROM postings")
+            self.conn.execute("DELETE FROM deleted_docs")
+
+        source = open_state_db(db_path)
+        try:
+            added, removed = self._update_from(source)
+        finally:
+            if source is not db_path:
+                source.close()
+        self.conn.commit()
+        return added, removed
+
+    def _update_from(self, source):
+        # Values are hashed inside the query, so unchanged bubbles are never decoded
+        source.create_function("value_digest", 1, _value_digest, deterministic=True)
+        where = " OR ".join("key LIKE ?" for _ in BUBBLE_KEY_PATTERNS)
+        current = dict(source.execute(f"SELECT key, value_digest(CAST(value AS BLOB)) FROM cursorDiskKV WHERE {where}", BUBBLE_KEY_PATTERNS))
+        indexed = dict(self.conn.execute("SELECT key, value_hash FROM docs"))
+
+        removed = [key for key, digest in indexed.items() if current.get(key) != digest]
+        changed = [key for key, digest in current.items() if indexed.get(key) != digest]
+
+        for start in range(0, len(removed), 500):
+            batch = removed[start:start + 500]
+            placeholders = ",".join("?" for _ in batch)
+            self.conn.execute(f"INSERT OR IGNORE INTO deleted_docs (doc_id) SELECT doc_id FROM docs WHERE key IN ({placeholders})", batch)
+        self.conn.executemany("DELETE FROM docs WHERE key = ?", [(key,) for key in removed])
+
+        new_postings = {}
+        for start in range(0, len(changed), 500):
+            batch = changed[start:start + 500]
+            placeholders = ",".join("?" for _ in batch)
+            for key, value in source.execute(f"SELECT key, value FROM cursorDiskKV WHERE key IN ({placeholders})", batch):
+                try:
+                    data = bubble_search_text(json.loads(value)).encode("utf-8")
+                except (json.JSONDecodeError, TypeError, AttributeError):
+                    data = b""  # Still recorded, so it isn't parsed again until its value changes
+                key_parts = key.split(':')
+                cursor = self.conn.execute(
+                    "INSERT INTO docs (key, composer_id, message_id, value_hash, data) VALUES (?, ?, ?, ?, ?)",
+                    (key, key_parts[-2], key_parts[-1], current[key], data),
+                )
+                doc_id = cursor.lastrowid
+                for trigram in trigrams(data):
+                    new_postings.setdefault(trigram, array("I")).append(doc_id)
+
+        self.conn.executemany("INSERT INTO postings (trigram, doc_ids) VALUES (?, ?)", ((trigram, doc_ids.tobytes()) for trigram, doc_ids in new_postings.items()))
+
+        deleted = {row[0] for row in self.conn.execute("SELECT doc_id FROM deleted_docs")}
+        live = self.conn.execute("SELECT count(*) FROM docs").fetchone()[0]
+        if deleted and len(deleted) > COMPACT_STALE_FRACTION * live:
+            self.compact()
+        else:
+            for trigram in new_postings:
+                if self.conn.execute("SELECT count(*) FROM postings WHERE trigram = ?", (trigram,)).fetchone()[0] > MAX_SEGMENTS:
+                    self._merge_segments(trigram, deleted)
+        return len(changed), len(removed)
+
+    def _merge_segments(self, trigram, deleted):
+        segments = self.conn.execute("SELECT rowid, doc_ids FROM postings WHERE trigram = ? ORDER BY rowid", (trigram,)).fetchall()
+        merged = array("I")
+        for _, doc_ids in segments:
+            merged.extend(doc_id for doc_id in array("I", doc_ids) if doc_id not in deleted)
+        self.conn.executemany("DELETE FROM postings WHERE rowid = ?", [(rowid,) for rowid, _ in segments])
+        if merged:
+            self.conn.execute("INSERT INTO postings (trigram, doc_ids) VALUES (?, ?)", (trigram, merged.tobytes()))
+
+    def compact(self):
+        """
+        Merge every posting list into one segment without the ids of removed docs.
+        """
+        deleted = {row[0] for row in self.conn.execute("SELECT doc_id FROM deleted_docs")}
+        trigram_list = [row[0] for row in self.conn.execute("SELECT DISTINCT trigram FROM postings")]
+        for trigram in trigram_list:
+            self._merge_segments(trigram, deleted)
+        self.conn.execute("DELETE FROM deleted_docs")
+        self.conn.commit()
+
+    def _posting(self, trigram):
+        posting = set()
+        for (doc_ids,) in self.conn.execute("SELECT doc_ids FROM postings WHERE trigram = ?", (trigram,)):
+            posting.update(array("I", doc_ids))
+        return posting
+
+    def _candidates_for_literals(self, literals):
+        """
+        Doc ids containing every trigram of every literal; None means 'no narrowing possible'.
+        """
+        grams = set()
+        for literal in literals:
+            grams |= trigrams(literal)
+        if not grams:
+            return None
+        postings = sorted((self._posting(trigram) for trigram in grams), key=len)
+        result = postings[0]
+        for posting in postings[1:]:
+            if not result:
+                break
+            result &= posting
+        return result
+
+    def candidates(self, query):
+        if isinstance(query, LiteralQuery):
+            return self._candidates_for_literals([query._needle])
+        if isinstance(query, RegexQuery):
+            return self._candidates_for_literals(_literal_runs(query.pattern))
+        if isinstance(query, BooleanQuery):
+            result = set()
+            for positive, _ in query.groups:
+                group_candidates = self._candidates_for_literals([q._needle for q in positive])
+                if group_candidates is None:
+                    return None
+                result |= group_candidates
+            return result
+        return None
+
+    def search(self, query, limit=None):
+        """
+        Yield (key, composer_id, message_id) of bubbles matching query.
+        """
+        candidate_ids = self.candidates(query)
+        if candidate_ids is None:
+            rows = self.conn.execute("SELECT key, composer_id, message_id, data FROM docs ORDER BY doc_id")
+        else:
+            rows = self._fetch_docs(sorted(candidate_ids))
+
+        found = 0
+        for key, composer_id, message_id, data in rows:
+            if query.matches(data):
+                yield key, composer_id, message_id
+                found += 1
+                if limit is not None and found >= limit:
+                    return
+
+    def _fetch_docs(self, doc_ids):
+        for start in range(0, len(doc_ids), 500):
+            batch = doc_ids[start:start + 500]
+            placeholders = ",".join("?" for _ in batch)
+            yield from self.conn.execute(
+                f"SELECT key, composer_id, message_id, data FROM docs WHERE doc_id IN ({placeholders}) ORDER BY doc_id", batch
+            )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Usage: python trigram_index.py update <path_to_state.vscdb> [index_file] [--full]")
+        print("       python trigram_index.py search <index_file> <query> [--mode literal|icase|regex|bool] [--limit N]")
+        sys.exit(1)
+
+    command = sys.argv[1]
+    if command == "update":
+        full = "--full" in sys.argv
+        args = [arg for arg in sys.argv[2:] if arg != "--full"]
+        db_path = args[0]
+        index_path = args[1] if len(args) >= 2 else "trigram_index.db"
+        index = TrigramIndex(index_path)
+        added, removed = index.update(db_path, full=full)
+        index.close()
+        print(f"Indexed {added} new or changed bubbles, dropped {removed} stale entries ({os.path.getsize(index_path)} bytes)")
+    elif command == "search" and len(sys.argv) >= 4:
+        mode = "literal"
+        limit = None
+        args = sys.argv[2:]
+        if "--mode" in args:
+            mode_idx = args.index("--mode")
+            mode = args[mode_idx + 1]
+            del args[mode_idx:mode_idx + 2]
+        if "--limit" in args:
+            limit_idx = args.index("--limit")
+            limit = int(args[limit_idx + 1])
+            del args[limit_idx:limit_idx + 2]
+        if mode not in SEARCH_MODES:
+            print(f"Error: --mode must be one of: {', '.join(SEARCH_MODES)}")
+            sys.exit(1)
+        index = TrigramIndex(args[0])
+        for key, composer_id, message_id in index.search(build_query(args[1], mode), limit):
+            print(f"{composer_id}\t{message_id}\t{key}")
+        index.close()
+    else:
+        print(f"Unknown command or missing arguments: {' '.join(sys.argv[1:])}")
+        sys.exit(1)
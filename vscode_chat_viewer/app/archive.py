@@ -0,0 +1,41 @@
+"""
+Read support for chat archives written by chat_archive.py (repository root).
+
+An archive stores every value once, compressed, and exposes the newest version of
+every key it has seen through ItemTable / cursorDiskKV views. The views decode values
+with the archive_decode SQL function, which has to be registered on each connection;
+with that, pointing VSCODE_STATE_DB_PATH at an archive serves all archived history
+as if it were one state.vscdb. chat_archive.py and state_db.py use the codecs and
+decoder from here as well, so this module only depends on the standard library.
+"""
+import sqlite3
+import zlib
+from typing import Any, Optional, Union
+
+CODEC_RAW = 0
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+
+_zstd_decompressor: Optional[Any] = None
+
+
+def archive_decode(codec: int, is_text: int, data: bytes) -> Union[str, bytes]:
+    """
+    SQL function turning a stored blob back into the original value (text or BLOB)
+    """
+    global _zstd_decompressor
+    if codec == CODEC_ZLIB:
+        data = zlib.decompress(data)
+    elif codec == CODEC_ZSTD:
+        if _zstd_decompressor is None:
+            import zstandard  # Only needed for archives written with zstandard installed
+            _zstd_decompressor = zstandard.ZstdDecompressor()
+        data = _zstd_decompressor.decompress(data)
+    return data.decode("utf-8", errors="replace") if is_text else data
+
+
+def register_archive_functions(conn: sqlite3.Connection) -> None:
+    """
+    Register the SQL functions the archive views need. Harmless on a plain state.vscdb.
+    """
+    conn.create_function("archive_decode", 3, archive_decode, deterministic=True)
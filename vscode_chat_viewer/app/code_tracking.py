@@ -0,0 +1,127 @@
+"""
+Index over the ItemTable 'aiCodeTrackingLines' entry, attributing AI-generated lines to conversations.
+
+The entry is a JSON array of {"hash", "metadata": {"source", "composerId"}}
+objects. It is parsed once per database version: composer ids are interned into
+integer codes, a dict maps each line hash to the code of the conversation that
+produced it, and per-conversation counts are precomputed, so both lookups are O(1).
+
+Usage (from the vscode_chat_viewer directory):
+    python -m app.code_tracking [composer_id]
+    python -m app.code_tracking --hash <line_hash>
+"""
+import json
+import os
+import sqlite3
+import sys
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+CODE_TRACKING_KEY = "aiCodeTrackingLines"
+
+
+def line_key(line_hash: Any) -> str:
+    """
+    Lookup key of a line hash, the same whether it was stored as a JSON number or a string.
+    """
+    return str(line_hash)
+
+
+class CodeTrackingIndex:
+    """
+    Tracked line hash -> producing conversation, and conversation -> tracked line count.
+    """
+
+    def __init__(self, entries: List[Any]):
+        composer_codes: Dict[str, int] = {}
+        # Keyed by the hash itself, so distinct hashes can never share an attribution
+        self._codes_by_hash: Dict[str, int] = {}
+        codes: List[int] = []
+        for entry in entries:
+            if not isinstance(entry, dict) or "hash" not in entry:
+                continue
+            metadata = entry.get("metadata")
+            composer_id = metadata.get("composerId") if isinstance(metadata, dict) else None
+            if not composer_id:
+                continue
+            code = composer_codes.setdefault(composer_id, len(composer_codes))
+            codes.append(code)
+            self._codes_by_hash.setdefault(line_key(entry["hash"]), code)  # First attribution of a hash wins
+
+        self.composer_ids: List[str] = list(composer_codes)
+        self._composer_codes = composer_codes
+        self.line_counts = np.bincount(np.array(codes, dtype=np.int64), minlength=len(composer_codes)).astype(np.int64)
+
+    def __len__(self) -> int:
+        return int(self.line_counts.sum())
+
+    def lines_for(self, composer_id: str) -> int:
+        code = self._composer_codes.get(composer_id)
+        return int(self.line_counts[code]) if code is not None else 0
+
+    def composer_for(self, line_hash: Any) -> Optional[str]:
+        code = self._codes_by_hash.get(line_key(line_hash))
+        return self.composer_ids[code] if code is not None else None
+
+    def counts(self) -> Dict[str, int]:
+        return {cid: int(count) for cid, count in zip(self.composer_ids, self.line_counts)}
+
+    @classmethod
+    def from_connection(cls, conn: sqlite3.Connection) -> "CodeTrackingIndex":
+        row = conn.execute("SELECT value FROM ItemTable WHERE key = ?", (CODE_TRACKING_KEY,)).fetchone()
+        entries: List[Any] = []
+        if row is not None:
+            try:
+                loaded = json.loads(row[0])
+                entries = loaded if isinstance(loaded, list) else []
+            except (json.JSONDecodeError, TypeError):
+                print(f"Could not decode {CODE_TRACKING_KEY}")
+        return cls(entries)
+
+
+_cached: Optional[Tuple[int, CodeTrackingIndex]] = None
+_cache_lock = threading.Lock()
+
+
+def load_code_tracking_index(conn: sqlite3.Connection, data_version: Optional[int]) -> CodeTrackingIndex:
+    """
+    Index for the database behind conn, rebuilt only when data_version changed.
+    """
+    global _cached
+    with _cache_lock:
+        if _cached is not None and data_version is not None and _cached[0] == data_version:
+            return _cached[1]
+        try:
+            index = CodeTrackingIndex.from_connection(conn)
+        except sqlite3.Error as e:
+            print(f"Database query error reading {CODE_TRACKING_KEY}: {e}")
+            index = CodeTrackingIndex([])
+        if data_version is not None:
+            _cached = (data_version, index)
+        return index
+
+
+if __name__ == "__main__":
+    # db_service imports this module, so it's only needed (and imported) for the CLI
+    from . import db_service
+
+    load_dotenv()
+    db_service.DATABASE_PATH = os.getenv("VSCODE_STATE_DB_PATH")
+    connection = db_service.get_db_connection()
+    if not connection:
+        sys.exit(1)
+    tracking = CodeTrackingIndex.from_connection(connection)
+    connection.close()
+
+    args = sys.argv[1:]
+    if len(args) >= 2 and args[0] == "--hash":
+        print(tracking.composer_for(args[1]) or "Not tracked")
+    elif args:
+        print(f"{args[0]}\t{tracking.lines_for(args[0])}")
+    else:
+        for cid, count in sorted(tracking.counts().items(), key=lambda item: -item[1]):
+            print(f"{cid}\t{count}")
+        print(f"{len(tracking)} tracked lines in {len(tracking.composer_ids)} conversations")
@@ -1,14 +1,33 @@
 import sqlite3
 import json
 import os
+import threading
+from collections import OrderedDict
 from typing import List, Dict, Any, Optional, Tuple
 from pathlib import Path
 
-from .models import Message, Attachment, CodeBlock, ToolOutput
+from .records import MessageRecord, AttachmentRecord, CodeBlockRecord, ToolOutputRecord, dumps, loads
+from .code_tracking import load_code_tracking_index
+from .archive import register_archive_functions
 
 DATABASE_PATH = os.getenv("VSCODE_STATE_DB_PATH")
 
-def get_db_connection() -> Optional[sqlite3.Connection]:
+# Tool outputs above this many bytes (0 = no limit) are replaced by a preview in conversation
+# responses; the full output is fetched separately with get_tool_output.
+TOOL_OUTPUT_INLINE_LIMIT = int(os.getenv("CHAT_VIEWER_TOOL_OUTPUT_INLINE_LIMIT", str(64 * 1024)))
+TOOL_OUTPUT_PREVIEW_CHARS = 2000
+
+# Parsed conversations kept in memory, bounded by the size of their stored JSON
+MESSAGE_CACHE_MAX_BYTES = int(os.getenv("CHAT_VIEWER_MESSAGE_CACHE_BYTES", str(128 * 1024 * 1024)))
+# Conversations larger than this are never cached, so one of them can't flush all the others
+MESSAGE_CACHE_MAX_ENTRY_BYTES = int(os.getenv("CHAT_VIEWER_MESSAGE_CACHE_ENTRY_BYTES", str(32 * 1024 * 1024)))
+
+# Long-lived connection used only to watch PRAGMA data_version, which changes
+# whenever another connection (e.g. the editor) commits to the database.
+_version_conn: Optional[sqlite3.Connection] = None
+_version_lock = threading.Lock()
+
+def get_db_connection(check_same_thread: bool = True) -> Optional[sqlite3.Connection]:
     if not DATABASE_PATH:
         print("Error: VSCODE_STATE_DB_PATH environment variable not set.")
         return None
@@ -19,13 +38,97 @@ def get_db_connection() -> Optional[sqlite3.Connection]:
         return None
         
     try:
-        conn = sqlite3.connect(f"file:{db_file}?mode=ro", uri=True) # Read-only mode
+        conn = sqlite3.connect(f"file:{db_file}?mode=ro", uri=True, check_same_thread=check_same_thread) # Read-only mode
         conn.row_factory = sqlite3.Row
+        # The database may also be a chat archive (chat_archive.py), whose tables are views over compressed values
+        register_archive_functions(conn)
         return conn
     except sqlite3.Error as e:
         print(f"Database connection error: {e}")
         return None
 
+def get_data_version() -> Optional[int]:
+    """
+    Returns a counter that changes whenever the database was modified since the previous call,
+    or None if the database is unavailable.
+    """
+    global _version_conn
+    with _version_lock:
+        if _version_conn is None:
+            # Only touched under _version_lock, so sharing it across threads is safe
+            _version_conn = get_db_connection(check_same_thread=False)
+            if not _version_conn:
+                return None
+        try:
+            row = _version_conn.execute("PRAGMA data_version").fetchone()
+            return int(row[0])
+        except sqlite3.Error as e:
+            print(f"Database error reading data_version: {e}")
+            _version_conn.close()
+            _version_conn = None
+            return None
+
+class MessageCache:
+    """
+    LRU of parsed message lists per (composer_id, inline_limit), bounded by the total bytes of the
+    JSON they were parsed from. Entries are only valid for the data_version they were loaded at.
+
+    Cached records are shared between callers and must not be modified.
+    """
+
+    def __init__(self, max_bytes: int = MESSAGE_CACHE_MAX_BYTES, max_entry_bytes: int = MESSAGE_CACHE_MAX_ENTRY_BYTES):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self._entries: "OrderedDict[Tuple[str, Optional[int]], Tuple[int, List[MessageRecord], int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Tuple[str, Optional[int]], data_version: Optional[int]) -> Optional[List[MessageRecord]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or data_version is None or entry[0] != data_version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Tuple[str, Optional[int]], data_version: Optional[int], messages: List[MessageRecord], size: int) -> None:
+        if data_version is None or size > min(self.max_entry_bytes, self.max_bytes):
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._entries[key] = (data_version, messages, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+message_cache = MessageCache()
+
 def get_composer_ids_with_details() -> List[Dict[str, Any]]:
     conn = get_db_connection()
     if not conn:
@@ -59,7 +162,7 @@ def get_composer_ids_with_details() -> List[Dict[str, Any]]:
             composer_data[composer_id]["message_count"] += 1
             
             try:
-                msg_json = json.loads(row["value"])
+                msg_json = loads(row["value"])
                 msg_text = msg_json.get("text", "")
                 # Try to get the first non-empty message text as title
                 if msg_text and message_id < composer_data[composer_id]["first_message_id"]:
@@ -68,7 +171,8 @@ def get_composer_ids_with_details() -> List[Dict[str, Any]]:
             except (json.JSONDecodeError, TypeError):
                 # If JSON is invalid or value is not bytes/str, skip this message for title
                 pass
-        
+
+        code_tracking = load_code_tracking_index(conn, get_data_version())
         conn.close()
 
         result_list = []
@@ -79,7 +183,8 @@ def get_composer_ids_with_details() -> List[Dict[str, Any]]:
             result_list.append({
                 "id": cid,
                 "title": title,
-                "message_count": data["message_count"]
+                "message_count": data["message_count"],
+                "tracked_lines": code_tracking.lines_for(cid)
             })        
         # Sort by ID (composer_id) for consistent listing
         return sorted(result_list, key=lambda x: x["id"])
@@ -92,16 +197,25 @@ def get_composer_ids_with_details() -> List[Dict[str, Any]]:
     return []
 
 
-def _parse_message_content(message_id: str, msg_json: Dict[str, Any]) -> Message:
+def _tool_output(tool_name: Optional[str], status: Optional[str], data: Any, inline_limit: Optional[int]) -> ToolOutputRecord:
+    if inline_limit and data is not None:
+        text = data if isinstance(data, str) else dumps(data, indent=True).decode("utf-8")
+        size = len(text.encode("utf-8"))
+        if size > inline_limit:
+            return ToolOutputRecord(tool_name=tool_name, status=status, data=None, truncated=True, size=size, preview=text[:TOOL_OUTPUT_PREVIEW_CHARS])
+    return ToolOutputRecord(tool_name=tool_name, status=status, data=data)
+
+
+def _parse_message_content(message_id: str, msg_json: Dict[str, Any], inline_limit: Optional[int] = None) -> MessageRecord:
     sender = "assistant"
     if msg_json.get("type") == 1: # Type 1 is typically user
         sender = "user"
     
     text = msg_json.get("text", "")
     
-    attachments: List[Attachment] = []
-    code_blocks: List[CodeBlock] = []
-    tool_outputs: List[ToolOutput] = []
+    attachments: List[AttachmentRecord] = []
+    code_blocks: List[CodeBlockRecord] = []
+    tool_outputs: List[ToolOutputRecord] = []
 
     # User message attachments
     if sender == "user":
@@ -112,7 +226,7 @@ def _parse_message_content(message_id: str, msg_json: Dict[str, Any]) -> Message
                 file_path = uri.get("fsPath") or uri.get("path")
                 if file_path:
                     name = Path(file_path).name
-                    attachments.append(Attachment(type="file_selection", name=name, path=file_path))
+                    attachments.append(AttachmentRecord(type="file_selection", name=name, path=file_path))
                     current_attachment_files.add(name)
         
         for chunk_uri_obj in msg_json.get("attachedFileCodeChunksUris", []):
@@ -120,7 +234,7 @@ def _parse_message_content(message_id: str, msg_json: Dict[str, Any]) -> Message
             if file_path:
                 name = Path(file_path).name
                 if name not in current_attachment_files: # Avoid duplicates if also in fileSelections
-                    attachments.append(Attachment(type="code_chunk_uri", name=name, path=file_path))
+                    attachments.append(AttachmentRecord(type="code_chunk_uri", name=name, path=file_path))
                     current_attachment_files.add(name)
 
     # Assistant message content
@@ -130,7 +244,7 @@ def _parse_message_content(message_id: str, msg_json: Dict[str, Any]) -> Message
             if "uri" in cb_data and isinstance(cb_data["uri"], dict):
                 uri_path = cb_data["uri"].get("path") or cb_data["uri"].get("_fsPath")
             
-            code_blocks.append(CodeBlock(
+            code_blocks.append(CodeBlockRecord(
                 language=cb_data.get("languageId"),
                 content=cb_data.get("content", ""),
                 uri_path=uri_path
@@ -141,9 +255,9 @@ def _parse_message_content(message_id: str, msg_json: Dict[str, Any]) -> Message
                 symbol_link = json.loads(sl_item) if isinstance(sl_item, str) else sl_item
                 name = symbol_link.get("symbolName", "N/A")
                 path = symbol_link.get("relativeWorkspacePath", "N/A")
-                attachments.append(Attachment(type="symbol_link", name=name, path=path))
+                attachments.append(AttachmentRecord(type="symbol_link", name=name, path=path))
             except (json.JSONDecodeError, TypeError):
-                attachments.append(Attachment(type="symbol_link_error", name=str(sl_item)))
+                attachments.append(AttachmentRecord(type="symbol_link_error", name=str(sl_item)))
 
     # Tool outputs (can be for user or assistant, check structure)
     if "toolFormerData" in msg_json:
@@ -153,13 +267,14 @@ def _parse_message_content(message_id: str, msg_json: Dict[str, Any]) -> Message
         raw_result = tfd.get("result")
         
         parsed_data: Any = raw_result
-        if isinstance(raw_result, str):
+        # Oversized results are only previewed, so don't pay for parsing them
+        if isinstance(raw_result, str) and not (inline_limit and len(raw_result) > inline_limit):
             try:
-                parsed_data = json.loads(raw_result)
+                parsed_data = loads(raw_result)
             except json.JSONDecodeError:
                 pass # Keep as string if not valid JSON
         
-        tool_outputs.append(ToolOutput(tool_name=str(tool_name) if tool_name else None, status=status, data=parsed_data))
+        tool_outputs.append(_tool_output(str(tool_name) if tool_name else None, status, parsed_data, inline_limit))
     
     # Sometimes tool results are directly in 'interpreterResults' or 'toolResults'
     for res_list_key in ["interpreterResults", "toolResults"]:
@@ -167,10 +282,11 @@ def _parse_message_content(message_id: str, msg_json: Dict[str, Any]) -> Message
             tool_name = tool_res.get("toolName") or tool_res.get("name")
             status = tool_res.get("status")
             result_data = tool_res.get("result") or tool_res.get("output") # Check common fields
-            tool_outputs.append(ToolOutput(tool_name=tool_name, status=status, data=result_data))
+            tool_outputs.append(_tool_output(tool_name, status, result_data, inline_limit))
 
 
-    return Message(
+    # No validation here: records are built from trusted fields and serialized as-is
+    return MessageRecord(
         id=message_id,
         sender=sender,
         text=text,
@@ -181,18 +297,44 @@ def _parse_message_content(message_id: str, msg_json: Dict[str, Any]) -> Message
     )
 
 
-def get_messages_for_composer(composer_id: str) -> List[Message]:
+def get_messages_for_composer(composer_id: str, inline_limit: Optional[int] = None, use_cache: bool = True) -> List[MessageRecord]:
+    """
+    All messages of a conversation in order. With inline_limit, larger tool outputs only carry a preview.
+    Served from message_cache while the database is unchanged; the returned records may be shared
+    with other callers, so copy them (dataclasses.replace) before changing them.
+    Bulk readers pass use_cache=False so they don't flush the conversations being viewed.
+    """
+    if not use_cache:
+        return _load_messages(composer_id, inline_limit)[0]
+
+    key = (composer_id, inline_limit)
+    data_version = get_data_version()
+    messages = message_cache.get(key, data_version)
+    if messages is None:
+        messages, payload_bytes = _load_messages(composer_id, inline_limit)
+        if messages and payload_bytes is not None:
+            message_cache.put(key, data_version, messages, payload_bytes)
+    return messages
+
+
+def _load_messages(composer_id: str, inline_limit: Optional[int]) -> Tuple[List[MessageRecord], Optional[int]]:
+    """
+    Messages of a conversation, and the total size of the JSON they were parsed from (None on errors).
+    """
     conn = get_db_connection()
     if not conn:
-        return []
+        return [], None
 
-    messages: List[Message] = []
+    messages: List[MessageRecord] = []
+    payload_bytes: Optional[int] = 0
     raw_message_data: List[Tuple[str, Dict[str, Any]]] = []
 
     try:
         cursor = conn.cursor()
-        query = f"SELECT key, value FROM cursorDiskKV WHERE key LIKE 'cursor_bubbleId:{composer_id}:%'"
-        cursor.execute(query)
+        # Key range instead of LIKE so SQLite can seek the key index (';' sorts right after ':')
+        # value_bytes: the payload size in bytes, length() of TEXT would count characters
+        query = "SELECT key, value, length(CAST(value AS BLOB)) AS value_bytes FROM cursorDiskKV WHERE key >= ? AND key < ?"
+        cursor.execute(query, (f"cursor_bubbleId:{composer_id}:", f"cursor_bubbleId:{composer_id};"))
         rows = cursor.fetchall()
 
         for row in rows:
@@ -201,9 +343,10 @@ def get_messages_for_composer(composer_id: str) -> List[Message]:
                 continue
             
             message_id_from_key = key_parts[2] # This is the part to sort by
+            payload_bytes += row["value_bytes"] or 0
             
             try:
-                msg_json = json.loads(row["value"])
+                msg_json = loads(row["value"])
                 raw_message_data.append((message_id_from_key, msg_json))
             except (json.JSONDecodeError, TypeError) as e:
                 print(f"Error decoding JSON for key {row['key']}: {e}")
@@ -214,11 +357,36 @@ def get_messages_for_composer(composer_id: str) -> List[Message]:
         raw_message_data.sort(key=lambda x: x[0])
 
         for msg_id, msg_data_json in raw_message_data:
-            messages.append(_parse_message_content(msg_id, msg_data_json))
+            messages.append(_parse_message_content(msg_id, msg_data_json, inline_limit))
             
     except sqlite3.Error as e:
         print(f"Database query error in get_messages_for_composer: {e}")
+        return messages, None  # Possibly incomplete, not cached
     finally:
         if conn:
             conn.close()
-    return messages
+    return messages, payload_bytes
+
+
+def get_tool_output(composer_id: str, message_id: str, index: int = 0) -> Optional[ToolOutputRecord]:
+    """
+    The complete index-th tool output of one message, None if there is no such output.
+    """
+    conn = get_db_connection()
+    if not conn:
+        return None
+    try:
+        row = conn.execute("SELECT value FROM cursorDiskKV WHERE key = ?", (f"cursor_bubbleId:{composer_id}:{message_id}",)).fetchone()
+    except sqlite3.Error as e:
+        print(f"Database query error in get_tool_output: {e}")
+        return None
+    finally:
+        conn.close()
+    if row is None:
+        return None
+    try:
+        tool_outputs = _parse_message_content(message_id, loads(row["value"])).tool_outputs
+    except (json.JSONDecodeError, TypeError) as e:
+        print(f"Error decoding JSON for message {message_id}: {e}")
+        return None
+    return tool_outputs[index] if 0 <= index < len(tool_outputs) else None
@@ -0,0 +1,158 @@
+"""
+Streaming bulk export of conversations as a zip or tar.gz archive.
+
+The archive is produced as a generator of byte chunks: each conversation is
+read from the database, converted and compressed only when the archive
+reaches it, and its bytes are handed out before the next one is read, so
+memory use doesn't grow with the number of exported conversations.
+"""
+import html
+import io
+import json
+import os
+import tarfile
+import time
+import zipfile
+from typing import Iterator, List, Optional, Tuple
+
+from . import db_service
+from .records import MessageRecord, dumps
+from .render_cache import RenderCache
+
+EXPORT_FORMATS = ["md", "html", "json"]
+ARCHIVE_TYPES = {"zip": "application/zip", "tar.gz": "application/gzip"}
+WEB_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "web")
+
+
+class _ChunkBuffer(io.RawIOBase):
+    """
+    Write-only, non-seekable stream collecting what the archive writer emits until taken.
+    """
+
+    def __init__(self) -> None:
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:  # type: ignore[override]
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def conversation_title(composer_id: str, messages: List[MessageRecord]) -> str:
+    first_text = next((m.text for m in messages if m.text), "")
+    title = " ".join(first_text.split()) or f"Conversation {composer_id}"
+    return title[:67] + "..." if len(title) > 70 else title
+
+
+def conversation_markdown(composer_id: str, messages: List[MessageRecord]) -> str:
+    """
+    Follows the layout of organize_chats' conversation.md.
+    """
+    parts = [f"# {conversation_title(composer_id, messages)}\n\nConversation `{composer_id}`\n\n"]
+    for message in messages:
+        parts.append("## 👤 User:\n\n" if message.sender == "user" else "## 🤖 Assistant:\n\n")
+        if message.text:
+            parts.append(f"{message.text}\n\n")
+        if message.attachments:
+            parts.append("### Attached:\n")
+            parts.extend(f"- {att.name}" + (f" ({att.path})" if att.path else "") + "\n" for att in message.attachments)
+            parts.append("\n")
+        for cb in message.code_blocks:
+            header = f"### Code Block{f' for: {cb.uri_path}' if cb.uri_path else ''}:\n\n"
+            parts.append(f"{header}```{cb.language or ''}\n{cb.content}\n```\n\n")
+        for to in message.tool_outputs:
+            data = to.data if isinstance(to.data, str) else json.dumps(to.data, indent=2)
+            parts.append(f"### Tool Output ({to.tool_name or 'Tool'}, {to.status or 'N/A'}):\n\n```\n{data}\n```\n\n")
+    return "".join(parts)
+
+
+def conversation_html(composer_id: str, messages: List[MessageRecord], render_cache: RenderCache) -> str:
+    messages = render_cache.render_all(messages)
+    title = html.escape(conversation_title(composer_id, messages))
+    body = "\n".join(f'<div class="message {html.escape(m.sender)}">{m.html}</div>' for m in messages)
+    return (
+        f'<!DOCTYPE html>\n<html lang="en">\n<head>\n<meta charset="UTF-8">\n<title>{title}</title>\n'
+        f'<link rel="stylesheet" href="style.css">\n</head>\n<body>\n<h1>{title}</h1>\n{body}\n</body>\n</html>\n'
+    )
+
+
+def _conversation_file(
+    composer_id: str, fmt: str, render_cache: Optional[RenderCache]
+) -> Optional[Tuple[str, bytes, str]]:
+    """
+    (archive member name, content, title) for one conversation, None if it has no messages.
+    """
+    messages = db_service.get_messages_for_composer(composer_id, use_cache=False)
+    if not messages:
+        return None
+    title = conversation_title(composer_id, messages)
+    if fmt == "json":
+        return f"conversations/{composer_id}.json", dumps({"id": composer_id, "messages": messages}, indent=True), title
+    if fmt == "html" and render_cache is not None:
+        content = conversation_html(composer_id, messages, render_cache)
+    else:
+        content = conversation_markdown(composer_id, messages)
+    return f"conversations/{composer_id}.{fmt}", content.encode("utf-8"), title
+
+
+def _index_file(fmt: str, entries: List[Tuple[str, str, str]], missing: List[str]) -> Tuple[str, bytes]:
+    if fmt == "json":
+        index = {"conversations": [{"id": cid, "title": title, "path": name} for cid, name, title in entries], "missing": missing}
+        return "index.json", json.dumps(index, indent=2).encode("utf-8")
+    if fmt == "html":
+        items = "".join(f'<li><a href="{html.escape(name)}">{html.escape(title)}</a></li>' for _, name, title in entries)
+        return "index.html", f'<!DOCTYPE html>\n<html lang="en">\n<head>\n<meta charset="UTF-8">\n<title>Exported Conversations</title>\n</head>\n<body>\n<h1>Exported Conversations</h1>\n<ul>{items}</ul>\n</body>\n</html>\n'.encode("utf-8")
+    lines = [f"- [{title}](./{name})\n" for _, name, title in entries]
+    if missing:
+        lines.append(f"\nNot found or empty: {', '.join(missing)}\n")
+    return "index.md", ("# Exported Conversations\n\n" + "".join(lines)).encode("utf-8")
+
+
+def _iter_members(composer_ids: List[str], fmt: str, render_cache: Optional[RenderCache]) -> Iterator[Tuple[str, bytes]]:
+    entries: List[Tuple[str, str, str]] = []
+    missing: List[str] = []
+    if fmt == "html":
+        # The message fragments use the viewer's classes
+        with open(os.path.join(WEB_DIR, "style.css"), "rb") as f:
+            yield "conversations/style.css", f.read()
+    for composer_id in composer_ids:
+        exported = _conversation_file(composer_id, fmt, render_cache)
+        if exported is None:
+            missing.append(composer_id)
+            continue
+        name, content, title = exported
+        entries.append((composer_id, name, title))
+        yield name, content
+    # The index comes last, once every title is known
+    yield _index_file(fmt, entries, missing)
+
+
+def stream_export(
+    composer_ids: List[str], fmt: str = "md", archive: str = "zip", render_cache: Optional[RenderCache] = None
+) -> Iterator[bytes]:
+    """
+    Yields the archive in chunks, roughly one per exported conversation.
+    """
+    buffer = _ChunkBuffer()
+    now = time.time()
+    if archive == "tar.gz":
+        with tarfile.open(fileobj=buffer, mode="w|gz") as tar:
+            for name, content in _iter_members(composer_ids, fmt, render_cache):
+                info = tarfile.TarInfo(name)
+                info.size = len(content)
+                info.mtime = int(now)
+                tar.addfile(info, io.BytesIO(content))
+                yield buffer.take()
+    else:
+        with zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_DEFLATED) as zf:
+            for name, content in _iter_members(composer_ids, fmt, render_cache):
+                zf.writestr(zipfile.ZipInfo(name, date_time=time.localtime(now)[:6]), content, compress_type=zipfile.ZIP_DEFLATED)
+                yield buffer.take()
+    yield buffer.take()  # Central directory / end of stream
@@ -0,0 +1,276 @@
+"""
+Persistent inverted index of the files referenced by conversations.
+
+Maps each referenced path to the (composer_id, message_id, ref_type) of the
+bubbles mentioning it, so "which chats touched src/foo.py?" is an index lookup
+instead of a parse of the whole database.
+
+Usage (from the vscode_chat_viewer directory):
+    python -m app.file_index update [--full]
+    python -m app.file_index query <path>
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from . import db_service
+
+FILE_INDEX_PATH = os.getenv("CHAT_VIEWER_FILE_INDEX", ".file_index.sqlite")
+# The editor writes the database constantly; catching up means hashing every bubble, so it
+# happens in the background and at most once per this many seconds
+FILE_INDEX_REFRESH_SECONDS = float(os.getenv("CHAT_VIEWER_FILE_INDEX_REFRESH_SECONDS", "30"))
+
+# Same key space as db_service: cursor_bubbleId:COMPOSER_ID:MESSAGE_ID
+BUBBLE_KEY_PREFIX = "cursor_bubbleId:"
+
+
+def _value_digest(value: Optional[bytes]) -> Optional[bytes]:
+    return None if value is None else hashlib.blake2b(value, digest_size=16).digest()
+
+
+def normalize_path(path: str) -> str:
+    return path.replace("\\", "/").rstrip("/")
+
+
+def path_suffixes(path: str) -> List[str]:
+    """
+    The path itself plus each run of its trailing components: "/a/b/c.py" -> ["/a/b/c.py", "a/b/c.py", "b/c.py", "c.py"].
+    """
+    parts = path.split("/")
+    suffixes = [path]
+    for i in range(len(parts)):
+        suffix = "/".join(parts[i:])
+        if suffix and suffix != path:
+            suffixes.append(suffix)
+    return suffixes
+
+
+def file_references(msg_json: Dict[str, Any]) -> Iterator[Tuple[str, str]]:
+    """
+    Yields (path, ref_type) for every file a bubble refers to, from the same fields
+    _parse_message_content reads attachments and code blocks from.
+    """
+    context = msg_json.get("context")
+    if isinstance(context, dict):
+        for selection in context.get("fileSelections", []):
+            uri = selection.get("uri", {}) if isinstance(selection, dict) else {}
+            file_path = uri.get("fsPath") or uri.get("path")
+            if file_path:
+                yield file_path, "file_selection"
+
+    for chunk_uri_obj in msg_json.get("attachedFileCodeChunksUris", []):
+        file_path = chunk_uri_obj.get("path") if isinstance(chunk_uri_obj, dict) else None
+        if file_path:
+            yield file_path, "code_chunk_uri"
+
+    for cb_data in msg_json.get("codeBlocks", []):
+        uri = cb_data.get("uri") if isinstance(cb_data, dict) else None
+        if isinstance(uri, dict):
+            file_path = uri.get("path") or uri.get("_fsPath")
+            if file_path:
+                yield file_path, "code_block"
+
+    for sl_item in msg_json.get("symbolLinks", []):
+        try:
+            symbol_link = json.loads(sl_item) if isinstance(sl_item, str) else sl_item
+            file_path = symbol_link.get("relativeWorkspacePath")
+        except (json.JSONDecodeError, TypeError, AttributeError):
+            continue
+        if file_path:
+            yield file_path, "symbol_link"
+
+
+class FileIndex:
+    """
+    path -> (composer_id, message_id, ref_type) rows, kept in sync with the bubbles
+    of the state database by key and a hash of the stored value.
+
+    Every trailing run of path components is indexed as well ("src/foo.py" for
+    "/work/repo/src/foo.py"), so relative file and directory queries are index
+    range scans just like absolute ones.
+    """
+
+    def __init__(self, path: str = FILE_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(docs)")}
+        if columns and "value_hash" not in columns:
+            # Index from before content hashes: rebuilt on the next update
+            self._conn.executescript("DROP TABLE docs; DROP TABLE IF EXISTS refs; DROP TABLE IF EXISTS path_suffixes;")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS docs (key TEXT PRIMARY KEY, value_hash BLOB);
+            CREATE TABLE IF NOT EXISTS refs (
+                ref_id INTEGER PRIMARY KEY,
+                path TEXT NOT NULL,
+                composer_id TEXT NOT NULL,
+                message_id TEXT NOT NULL,
+                ref_type TEXT NOT NULL,
+                key TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS refs_key ON refs (key);
+            CREATE TABLE IF NOT EXISTS path_suffixes (suffix TEXT NOT NULL, ref_id INTEGER NOT NULL);
+            CREATE INDEX IF NOT EXISTS path_suffixes_suffix ON path_suffixes (suffix);
+            CREATE INDEX IF NOT EXISTS path_suffixes_ref_id ON path_suffixes (ref_id);
+        """)
+        # Guards _data_version and _refreshed_at, held for a whole refresh so concurrent callers wait for it
+        self._refresh_lock = threading.Lock()
+        self._data_version: Optional[int] = None
+        self._refreshed_at: Optional[float] = None
+        self._refreshing: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def update(self, source: sqlite3.Connection, full: bool = False) -> Tuple[int, int]:
+        """
+        Brings the index up to date with the bubbles readable through source.
+        Only bubbles whose key is new or whose value changed are parsed; values are
+        hashed inside the query, so unchanged bubbles are never decoded.
+        Returns (indexed, removed).
+        """
+        with self._lock:
+            if full:
+                self._conn.execute("DELETE FROM docs")
+                self._conn.execute("DELETE FROM refs")
+                self._conn.execute("DELETE FROM path_suffixes")
+
+            key_range = (BUBBLE_KEY_PREFIX, BUBBLE_KEY_PREFIX[:-1] + ";")
+            source.create_function("value_digest", 1, _value_digest, deterministic=True)
+            current = dict(source.execute("SELECT key, value_digest(CAST(value AS BLOB)) FROM cursorDiskKV WHERE key >= ? AND key < ?", key_range))
+            indexed = dict(self._conn.execute("SELECT key, value_hash FROM docs"))
+
+            removed = [key for key, digest in indexed.items() if current.get(key) != digest]
+            changed = [key for key, digest in current.items() if indexed.get(key) != digest]
+
+            for start in range(0, len(removed), 500):
+                batch = [(key,) for key in removed[start:start + 500]]
+                self._conn.executemany("DELETE FROM path_suffixes WHERE ref_id IN (SELECT ref_id FROM refs WHERE key = ?)", batch)
+                self._conn.executemany("DELETE FROM refs WHERE key = ?", batch)
+                self._conn.executemany("DELETE FROM docs WHERE key = ?", batch)
+
+            for start in range(0, len(changed), 500):
+                batch = changed[start:start + 500]
+                placeholders = ",".join("?" for _ in batch)
+                for key, value in source.execute(f"SELECT key, value FROM cursorDiskKV WHERE key IN ({placeholders})", batch):
+                    key_parts = key.split(':')
+                    if len(key_parts) < 3:
+                        continue
+                    try:
+                        msg_json = json.loads(value)
+                        references = set(file_references(msg_json))
+                    except (json.JSONDecodeError, TypeError, AttributeError):
+                        references = set()
+                    for file_path, ref_type in references:
+                        file_path = normalize_path(file_path)
+                        cursor = self._conn.execute(
+                            "INSERT INTO refs (path, composer_id, message_id, ref_type, key) VALUES (?, ?, ?, ?, ?)",
+                            (file_path, key_parts[1], key_parts[2], ref_type, key),
+                        )
+                        self._conn.executemany(
+                            "INSERT INTO path_suffixes (suffix, ref_id) VALUES (?, ?)",
+                            [(suffix, cursor.lastrowid) for suffix in path_suffixes(file_path)],
+                        )
+                # Recorded even without references, so unchanged bubbles are not parsed again
+                self._conn.executemany("INSERT OR REPLACE INTO docs (key, value_hash) VALUES (?, ?)", [(key, current[key]) for key in batch])
+
+            self._conn.commit()
+            return len(changed), len(removed)
+
+    @property
+    def data_version(self) -> Optional[int]:
+        """
+        The database data_version the index was last brought up to date at (None before that).
+        """
+        with self._refresh_lock:
+            return self._data_version
+
+    def is_built(self) -> bool:
+        with self._lock:
+            return self._data_version is not None or self._conn.execute("SELECT 1 FROM docs LIMIT 1").fetchone() is not None
+
+    def refresh(self, min_interval: float = 0.0) -> None:
+        """
+        Updates the index from the configured state database if it changed since the last refresh,
+        unless that refresh was less than min_interval seconds ago.
+        """
+        with self._refresh_lock:
+            if self._refreshed_at is not None and time.monotonic() - self._refreshed_at < min_interval:
+                return
+            data_version = db_service.get_data_version()
+            if data_version is not None and data_version == self._data_version:
+                return
+            source = db_service.get_db_connection(check_same_thread=False)
+            if not source:
+                return
+            try:
+                self.update(source)
+            finally:
+                source.close()
+            self._data_version = data_version
+            self._refreshed_at = time.monotonic()
+
+    def refresh_in_background(self) -> None:
+        """
+        Starts a throttled refresh (FILE_INDEX_REFRESH_SECONDS) in a background thread unless one is still running.
+        Doesn't wait for it, so it can be called from the event loop.
+        """
+        with self._thread_lock:
+            if self._refreshing is not None and self._refreshing.is_alive():
+                return
+            self._refreshing = threading.Thread(target=self.refresh, args=(FILE_INDEX_REFRESH_SECONDS,), daemon=True)
+            self._refreshing.start()
+
+    def query(self, path: str, limit: Optional[int] = None) -> List[Dict[str, str]]:
+        """
+        References to path or to anything below it when it names a directory.
+        Absolute paths match from the root; relative paths match the trailing
+        components of stored paths (so "src/foo.py" finds "/work/repo/src/foo.py").
+        """
+        path = normalize_path(path)
+        if not path:
+            return []
+        # '0' sorts right after '/', so [p + '/', p + '0') is everything below p
+        params: List[Any] = [path, path + "/", path + "0"]
+        sql = (
+            "SELECT DISTINCT r.path, r.composer_id, r.message_id, r.ref_type FROM path_suffixes s JOIN refs r ON r.ref_id = s.ref_id"
+            " WHERE s.suffix = ? OR (s.suffix >= ? AND s.suffix < ?) ORDER BY r.path, r.composer_id, r.message_id, r.ref_type"
+        )
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [{"path": p, "composer_id": c, "message_id": m, "ref_type": t} for p, c, m, t in rows]
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    db_service.DATABASE_PATH = os.getenv("VSCODE_STATE_DB_PATH")
+
+    args = sys.argv[1:]
+    if not args or args[0] not in ("update", "query") or (args[0] == "query" and len(args) < 2):
+        print("Usage: python -m app.file_index update [--full]")
+        print("       python -m app.file_index query <path>")
+        sys.exit(1)
+
+    index = FileIndex()
+    if args[0] == "update":
+        source = db_service.get_db_connection()
+        if not source:
+            sys.exit(1)
+        indexed, removed = index.update(source, full="--full" in args)
+        source.close()
+        print(f"Indexed {indexed} new or changed bubbles, dropped {removed} stale entries ({index.path})")
+    else:
+        for ref in index.query(args[1]):
+            print(f"{ref['path']}\t{ref['composer_id']}\t{ref['message_id']}\t{ref['ref_type']}")
+    index.close()
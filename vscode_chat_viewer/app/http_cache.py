@@ -0,0 +1,173 @@
+import gzip
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+
+from .records import dumps
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+# Responses smaller than this are sent uncompressed
+MIN_COMPRESS_SIZE = 1024
+
+# Bounds of the in-memory response cache, counting bodies and their compressed variants
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("CHAT_VIEWER_RESPONSE_CACHE_BYTES", str(64 * 1024 * 1024)))
+# Larger responses are served without being cached
+RESPONSE_CACHE_MAX_ENTRY_BYTES = int(os.getenv("CHAT_VIEWER_RESPONSE_CACHE_ENTRY_BYTES", str(16 * 1024 * 1024)))
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse encoding with records.dumps (orjson when installed).
+    """
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+class ResponseCache:
+    """
+    Remembers serialized responses per (resource key, DB data_version).
+
+    While the database is unchanged, a request can be answered (or validated
+    with 304) without touching SQLite. Compressed variants are cached with the
+    body so each payload is compressed at most once per encoding.
+    An LRU bounded by the bytes of the bodies and variants it holds, like
+    db_service.MessageCache.
+    """
+
+    def __init__(self, max_bytes: int = RESPONSE_CACHE_MAX_BYTES, max_entry_bytes: int = RESPONSE_CACHE_MAX_ENTRY_BYTES):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self._entries: "OrderedDict[str, Tuple[Optional[int], str, bytes, Dict[str, bytes]]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _size(entry: Tuple[Optional[int], str, bytes, Dict[str, bytes]]) -> int:
+        return len(entry[2]) + sum(len(data) for data in entry[3].values())
+
+    def get(self, key: str, data_version: Optional[int]) -> Optional[Tuple[str, bytes, Dict[str, bytes]]]:
+        if data_version is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != data_version:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1], entry[2], dict(entry[3])
+
+    def put(self, key: str, data_version: Optional[int], etag: str, body: bytes) -> None:
+        if data_version is None or len(body) > min(self.max_entry_bytes, self.max_bytes):
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= self._size(old)
+            self._entries[key] = (data_version, etag, body, {})
+            self._bytes += len(body)
+            self._evict()
+
+    def put_encoded(self, key: str, data_version: Optional[int], etag: str, encoding: str, data: bytes) -> None:
+        """
+        Adds a compressed variant to the entry of key, if it still holds the body tagged etag.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != data_version or entry[1] != etag or encoding in entry[3]:
+                return
+            if self._size(entry) + len(data) > min(self.max_entry_bytes, self.max_bytes):
+                return
+            entry[3][encoding] = data
+            self._bytes += len(data)
+            self._evict()
+
+    def _evict(self) -> None:
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= self._size(evicted)
+
+
+def make_etag(body: bytes) -> str:
+    # Content hash, so a DB change elsewhere doesn't invalidate unchanged conversations
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+def _variant_etag(etag: str, encoding: Optional[str]) -> str:
+    # Each content encoding is a different representation, so it gets its own strong tag
+    return etag[:-1] + f'-{encoding}"' if encoding else etag
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    # If-None-Match uses weak comparison
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def _choose_encoding(accept_encoding: str) -> Optional[str]:
+    accepted = {part.split(";")[0].strip() for part in accept_encoding.lower().split(",")}
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br" and brotli is not None:
+        return bytes(brotli.compress(body, quality=5))
+    return gzip.compress(body, compresslevel=6)
+
+
+def cached_json_response(
+    request: Request,
+    cache: ResponseCache,
+    key: str,
+    data_version: Optional[int],
+    build_body: Callable[[], Optional[bytes]],
+) -> Optional[Response]:
+    """
+    Serve a JSON body with ETag validation and gzip/brotli compression.
+    build_body is only called when the cache has no entry for the current data_version;
+    returns None when build_body produced nothing (e.g. not found).
+    """
+    cached = cache.get(key, data_version)
+    if cached is None:
+        body = build_body()
+        if body is None:
+            return None
+        etag = make_etag(body)
+        encoded: Dict[str, bytes] = {}
+        cache.put(key, data_version, etag, body)
+    else:
+        etag, body, encoded = cached
+
+    encoding = _choose_encoding(request.headers.get("accept-encoding", "")) if len(body) >= MIN_COMPRESS_SIZE else None
+    variant_etag = _variant_etag(etag, encoding)
+    headers = {
+        "ETag": variant_etag,
+        # Always revalidate; a revalidation is a single cheap round-trip
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+    }
+    if _etag_matches(request.headers.get("if-none-match"), variant_etag):
+        return Response(status_code=304, headers=headers)
+
+    if encoding is None:
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    content = encoded.get(encoding)
+    if content is None:
+        content = _compress(body, encoding)
+        cache.put_encoded(key, data_version, etag, encoding, content)
+    headers["Content-Encoding"] = encoding
+    return Response(content=content, media_type="application/json", headers=headers)
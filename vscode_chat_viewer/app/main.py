@@ -1,13 +1,33 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from typing import List
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from typing import Any, Dict, List, Optional
 import os
 
 from . import db_service
-from .models import ConversationInfo, ConversationDetail
+from .http_cache import FastJSONResponse, ResponseCache, cached_json_response
+from .render_cache import RenderCache, server_rendering_available
+from .file_index import FileIndex
+from .stats import get_stats
+from .related import RelatedIndex
+from .export import ARCHIVE_TYPES, EXPORT_FORMATS, stream_export
+from .records import dumps
+from .models import ConversationInfo, ConversationDetail, FileReference, RelatedConversation, ToolOutput
 
-app = FastAPI(title="VSCode Chat Viewer API")
+# The Pydantic models in response_model document the API; bodies are serialized directly from the
+# db_service dicts and records without being validated against them again.
+app = FastAPI(title="VSCode Chat Viewer API", default_response_class=FastJSONResponse)
+
+# Serialized API responses, valid while the DB data_version is unchanged
+response_cache = ResponseCache()
+# Persistent cache of server-rendered message HTML, created on first use
+render_cache: Optional[RenderCache] = None
+# Persistent path -> message index, created and brought up to date on first use
+file_index: Optional[FileIndex] = None
+# Precomputed related conversations, built on first use if missing and rebuilt in the background
+# when the database changed (or rebuild with `python -m app.related build`)
+related_index: Optional[RelatedIndex] = None
 
 # Mount static files first, so API routes are checked later
 app.mount("/static", StaticFiles(directory="web"), name="static")
@@ -30,25 +50,155 @@ async def startup_event():
 
 
 @app.get("/api/conversations", response_model=List[ConversationInfo])
-async def list_conversations():
+async def list_conversations(request: Request):
     """
     Retrieves a list of all available conversations with basic information.
+    Supports ETag revalidation (If-None-Match) and gzip/brotli compression.
     """
-    conversations = db_service.get_composer_ids_with_details()
-    if not conversations:
+    def build_body() -> bytes:
+        conversations = db_service.get_composer_ids_with_details()
         # Return empty list if no conversations found, not necessarily an error
-        return []
-    return conversations
+        return dumps(conversations)
+
+    data_version = db_service.get_data_version()
+    return cached_json_response(request, response_cache, "conversations", data_version, build_body)
 
 @app.get("/api/conversations/{composer_id}", response_model=ConversationDetail)
-async def get_conversation_details(composer_id: str):
+async def get_conversation_details(composer_id: str, request: Request, render: Optional[str] = None):
     """
     Retrieves all messages for a specific conversation.
+    Tool outputs above CHAT_VIEWER_TOOL_OUTPUT_INLINE_LIMIT bytes only carry a preview and their size.
+    With ?render=html each message also carries its pre-rendered HTML fragment
+    (when the server has the markdown package), so clients do no markdown work.
+    Supports ETag revalidation (If-None-Match) and gzip/brotli compression.
     """
-    messages = db_service.get_messages_for_composer(composer_id)
-    if not messages:
+    render_html = render == "html" and server_rendering_available()
+
+    def build_body() -> Optional[bytes]:
+        global render_cache
+        messages = db_service.get_messages_for_composer(composer_id, db_service.TOOL_OUTPUT_INLINE_LIMIT)
+        if not messages:
+            return None
+        if render_html:
+            if render_cache is None:
+                render_cache = RenderCache()
+            # Collapsed code blocks and tool outputs are built by script.js when opened
+            messages = render_cache.render_all(messages, lazy_bodies=True)
+        return dumps({"id": composer_id, "messages": messages})
+
+    data_version = db_service.get_data_version()
+    cache_key = f"conversation:{composer_id}:{'html' if render_html else 'raw'}"
+    response = cached_json_response(request, response_cache, cache_key, data_version, build_body)
+    if response is None:
         raise HTTPException(status_code=404, detail=f"Conversation with composer_id '{composer_id}' not found or has no messages.")
-    return ConversationDetail(id=composer_id, messages=messages)
+    return response
+
+@app.get("/api/conversations/{composer_id}/messages/{message_id}/tool-output", response_model=ToolOutput)
+async def get_tool_output(composer_id: str, message_id: str, request: Request, index: int = 0):
+    """
+    The complete index-th tool output of a message, for outputs truncated in the conversation response.
+    """
+    def build_body() -> Optional[bytes]:
+        tool_output = db_service.get_tool_output(composer_id, message_id, index)
+        return dumps(tool_output) if tool_output is not None else None
+
+    # Not kept in the response cache: these are the payloads too large to keep around.
+    # The ETag still spares re-sending an unchanged output.
+    response = cached_json_response(request, response_cache, f"tool-output:{composer_id}:{message_id}:{index}", None, build_body)
+    if response is None:
+        raise HTTPException(status_code=404, detail=f"Tool output {index} of message '{message_id}' not found.")
+    return response
+
+@app.get("/api/conversations/{composer_id}/related", response_model=List[RelatedConversation])
+async def get_related_conversations(composer_id: str, limit: Optional[int] = None):
+    """
+    Conversations with the most similar text, read from the precomputed neighbour table.
+    """
+    global related_index
+    if related_index is None:
+        related_index = RelatedIndex()
+    if not related_index.is_built():
+        await run_in_threadpool(related_index.refresh)
+    elif not related_index.is_current():
+        # Served from the previous build until the new one is in
+        related_index.refresh_in_background()
+    return related_index.related(composer_id, limit)
+
+@app.get("/api/export")
+async def export_conversations(ids: Optional[str] = None, format: str = "md", archive: str = "zip"):
+    """
+    Streams an archive (zip or tar.gz) of the given conversations (comma-separated ids, all if omitted)
+    as Markdown, HTML or JSON. Conversations are read and converted one at a time while the archive
+    is sent, so neither side has to hold the whole archive.
+    """
+    global render_cache
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    if archive not in ARCHIVE_TYPES:
+        raise HTTPException(status_code=400, detail=f"archive must be one of: {', '.join(ARCHIVE_TYPES)}")
+    if format == "html":
+        if not server_rendering_available():
+            raise HTTPException(status_code=400, detail="HTML export requires the 'markdown' package on the server.")
+        if render_cache is None:
+            render_cache = RenderCache()
+
+    if ids:
+        composer_ids = list(dict.fromkeys(cid.strip() for cid in ids.split(",") if cid.strip()))
+    else:
+        composer_ids = [c["id"] for c in db_service.get_composer_ids_with_details()]
+
+    filename = f"conversations.{archive}"
+    return StreamingResponse(
+        stream_export(composer_ids, format, archive, render_cache if format == "html" else None),
+        media_type=ARCHIVE_TYPES[archive],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@app.get("/api/files", response_model=List[FileReference])
+async def find_file_references(path: str, request: Request, limit: Optional[int] = None):
+    """
+    Lists the messages referencing a file, or any file below a directory.
+    Relative paths (e.g. "src/foo.py" or "src/") match the trailing components of referenced paths.
+    """
+    global file_index
+    if file_index is None:
+        file_index = FileIndex()
+    # Building or catching up the index parses bubbles, which must not stall the event loop.
+    # Only the first build is waited for; later changes are picked up in the background.
+    if not file_index.is_built():
+        await run_in_threadpool(file_index.refresh)
+    else:
+        file_index.refresh_in_background()
+    index = file_index
+
+    def build_body() -> bytes:
+        return dumps(index.query(path, limit))
+
+    # Keyed by the version the index is at, not the database's, since the index may lag behind
+    return cached_json_response(request, response_cache, f"files:{path}:{limit}", index.data_version, build_body)
+
+@app.get("/api/stats", response_model=Dict[str, Any])
+async def usage_stats(request: Request, top: int = 10, per_conversation: bool = False):
+    """
+    Token usage and activity aggregates: totals, percentiles, the heaviest conversations,
+    and sums per workspace and per day (plus per conversation with ?per_conversation=true).
+    """
+    def build_body() -> Optional[bytes]:
+        stats = get_stats(top, per_conversation)
+        return dumps(stats) if stats is not None else None
+
+    data_version = db_service.get_data_version()
+    response = cached_json_response(request, response_cache, f"stats:{top}:{per_conversation}", data_version, build_body)
+    if response is None:
+        raise HTTPException(status_code=503, detail="Database unavailable.")
+    return response
+
+@app.get("/api/cache-stats", response_model=Dict[str, int])
+async def cache_stats():
+    """
+    Size and hit/miss/eviction counters of the in-memory cache of parsed conversations.
+    """
+    return db_service.message_cache.stats()
 
 @app.get("/")
 async def read_index():
@@ -16,6 +16,9 @@ class ToolOutput(BaseModel):
     tool_name: Optional[str] = None # e.g., from toolFormerData.tool
     status: Optional[str] = None # e.g., from toolFormerData.status
     data: Any  # Could be string or parsed JSON from toolFormerData.result
+    truncated: bool = False  # data left out for size, fetch it from .../messages/{id}/tool-output?index=N
+    size: Optional[int] = None  # byte length of the full output, when truncated
+    preview: Optional[str] = None  # start of the output, when truncated
 
 class Message(BaseModel):
     id: str  # message_id (the part after the second colon in the key)
@@ -24,14 +27,27 @@ class Message(BaseModel):
     attachments: List[Attachment] = Field(default_factory=list)
     code_blocks: List[CodeBlock] = Field(default_factory=list)
     tool_outputs: List[ToolOutput] = Field(default_factory=list)
+    html: Optional[str] = None  # Pre-rendered fragment, only set when requested with ?render=html
     # raw_json_data: Dict[str, Any] # For debugging or if more fields are needed later
 
 class ConversationInfo(BaseModel):
     id: str  # composer_id
     title: str
     message_count: int
+    tracked_lines: int = 0  # AI-generated lines attributed to it in aiCodeTrackingLines
     # last_updated: Optional[str] = None # Could be ISO format string
 
 class ConversationDetail(BaseModel):
     id: str  # composer_id
     messages: List[Message]
+
+class FileReference(BaseModel):
+    path: str  # as referenced by the message (absolute, or workspace-relative for symbol links)
+    composer_id: str
+    message_id: str
+    ref_type: str  # "file_selection", "code_chunk_uri", "code_block" or "symbol_link"
+
+class RelatedConversation(BaseModel):
+    id: str  # composer_id
+    title: str
+    score: float  # cosine similarity of the conversations' TF-IDF vectors
@@ -0,0 +1,85 @@
+"""
+Lightweight message records and the JSON codec used for API responses.
+
+Messages are read from the database into these slotted dataclasses, without
+any per-field validation, and serialized in one pass by orjson (when installed,
+the stdlib json module otherwise). They serialize to exactly the shape of the
+Pydantic models in models.py, which remain the documented response schema.
+"""
+import json
+from dataclasses import dataclass, field
+from typing import Any, List, Optional
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, responses are encoded with json otherwise
+    orjson = None
+
+
+@dataclass(slots=True)
+class AttachmentRecord:
+    type: str
+    name: str
+    path: Optional[str] = None
+    content: Optional[str] = None
+
+
+@dataclass(slots=True)
+class CodeBlockRecord:
+    language: Optional[str]
+    content: str
+    uri_path: Optional[str] = None
+
+
+@dataclass(slots=True)
+class ToolOutputRecord:
+    tool_name: Optional[str]
+    status: Optional[str]
+    data: Any
+    truncated: bool = False
+    size: Optional[int] = None
+    preview: Optional[str] = None
+
+
+@dataclass(slots=True)
+class MessageRecord:
+    id: str
+    sender: str
+    text: str
+    attachments: List[AttachmentRecord] = field(default_factory=list)
+    code_blocks: List[CodeBlockRecord] = field(default_factory=list)
+    tool_outputs: List[ToolOutputRecord] = field(default_factory=list)
+    html: Optional[str] = None
+
+
+def _record_fields(obj: Any) -> Any:
+    slots = getattr(type(obj), "__slots__", None)
+    if slots is None:
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+    return {name: getattr(obj, name) for name in slots}
+
+
+def loads(data: Any) -> Any:
+    """
+    json.loads, through orjson when available. Raises json.JSONDecodeError / TypeError like json.loads.
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass  # Let json decide, it accepts NaN/Infinity and reports the error as usual
+    return json.loads(data)
+
+
+def dumps(obj: Any, indent: bool = False) -> bytes:
+    """
+    UTF-8 JSON for obj, which may contain records. Compact unless indent is set.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+        except orjson.JSONEncodeError:
+            pass  # e.g. integers beyond 64 bits, which json handles
+    if indent:
+        return json.dumps(obj, default=_record_fields, ensure_ascii=False, indent=2).encode("utf-8")
+    return json.dumps(obj, default=_record_fields, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
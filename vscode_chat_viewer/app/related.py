@@ -0,0 +1,306 @@
+"""
+"Related conversations" from a sparse TF-IDF term matrix over all conversations.
+
+Each conversation's message text becomes an L2-normalized TF-IDF row (sublinear
+tf, smoothed idf, pruned to its strongest terms). Cosine similarities are computed
+for batches of rows at once with a sparse-times-sparse product over the
+term -> conversations postings, and each conversation's top-k neighbours are
+persisted, so a lookup is a single indexed read whatever the corpus size.
+
+Usage (from the vscode_chat_viewer directory):
+    python -m app.related build [--top N]
+    python -m app.related show <composer_id>
+"""
+import math
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+from . import db_service
+
+RELATED_INDEX_PATH = os.getenv("CHAT_VIEWER_RELATED_INDEX", ".related_index.sqlite")
+DEFAULT_TOP_K = 10
+# Strongest terms kept per conversation, bounds the cost of the similarity product
+MAX_TERMS_PER_DOC = 200
+# Terms in more than this share of conversations carry almost no signal and are dropped
+MAX_DOC_FREQUENCY = 0.5
+# Upper bound on the dense (batch x conversations) score block, in cells
+MAX_BATCH_CELLS = 4_000_000
+# Upper bound on the (row, term) entries of a batch expanded over their posting lists,
+# each of which takes about 40 bytes of temporary arrays
+MAX_BATCH_ENTRIES = 2_000_000
+
+_TOKEN = re.compile(r"[a-z][a-z0-9_]{2,}")
+
+# Message text of every bubble, extracted by SQLite so Python never decodes the full JSON
+TEXT_QUERY = """
+    SELECT key, json_extract(v, '$.text')
+    FROM (SELECT key, CAST(value AS TEXT) AS v FROM cursorDiskKV WHERE key >= ? AND key < ?)
+    WHERE json_valid(v)
+"""
+
+
+class TermMatrix:
+    """
+    CSR rows (one per conversation) of L2-normalized TF-IDF weights, plus the same
+    matrix in CSC layout for the term -> conversations direction.
+    """
+
+    def __init__(self, doc_ids: List[str], term_counts: List[Counter]):
+        self.doc_ids = doc_ids
+        n_docs = len(doc_ids)
+
+        doc_frequency: Counter = Counter()
+        for counts in term_counts:
+            doc_frequency.update(counts.keys())
+        max_df = max(2, int(n_docs * MAX_DOC_FREQUENCY))
+        vocabulary = {term: i for i, term in enumerate(t for t, df in doc_frequency.items() if df <= max_df)}
+        idf = {term: math.log((1 + n_docs) / (1 + doc_frequency[term])) + 1 for term in vocabulary}
+
+        indptr = [0]
+        indices: List[int] = []
+        data: List[float] = []
+        for counts in term_counts:
+            weights = [(vocabulary[t], (1 + math.log(c)) * idf[t]) for t, c in counts.items() if t in vocabulary]
+            if len(weights) > MAX_TERMS_PER_DOC:
+                weights = sorted(weights, key=lambda item: -item[1])[:MAX_TERMS_PER_DOC]
+            norm = math.sqrt(sum(w * w for _, w in weights)) or 1.0
+            weights.sort()
+            indices.extend(t for t, _ in weights)
+            data.extend(w / norm for _, w in weights)
+            indptr.append(len(indices))
+
+        self.indptr = np.array(indptr, dtype=np.int64)
+        self.indices = np.array(indices, dtype=np.int64)
+        self.data = np.array(data, dtype=np.float32)
+        self.row_of_entry = np.repeat(np.arange(n_docs, dtype=np.int64), np.diff(self.indptr))
+
+        # CSC: entries ordered by term
+        order = np.argsort(self.indices, kind="stable")
+        self.col_rows = self.row_of_entry[order]
+        self.col_data = self.data[order]
+        self.col_indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.indices, minlength=len(vocabulary)), out=self.col_indptr[1:])
+        # Expanded entries of rows [0, i), the cost of similarities() for a range of rows
+        expanded = self.col_indptr[self.indices + 1] - self.col_indptr[self.indices]
+        self.expanded_before = np.concatenate(([0], np.cumsum(expanded)))[self.indptr]
+
+    def batches(self) -> Iterator[Tuple[int, int]]:
+        """
+        Row ranges whose score block stays within MAX_BATCH_CELLS and whose expansion
+        stays within MAX_BATCH_ENTRIES (a single row may exceed the latter on its own).
+        """
+        n_docs = len(self.doc_ids)
+        max_rows = max(1, MAX_BATCH_CELLS // max(1, n_docs))
+        start = 0
+        while start < n_docs:
+            limit = int(np.searchsorted(self.expanded_before, self.expanded_before[start] + MAX_BATCH_ENTRIES, side="right")) - 1
+            stop = min(n_docs, start + max_rows, max(start + 1, limit))
+            yield start, stop
+            start = stop
+
+    def similarities(self, start: int, stop: int) -> np.ndarray:
+        """
+        Dense (stop - start) x n_docs block of cosine similarities for rows [start, stop).
+        """
+        n_docs = len(self.doc_ids)
+        entry_start, entry_stop = self.indptr[start], self.indptr[stop]
+        terms = self.indices[entry_start:entry_stop]
+        weights = self.data[entry_start:entry_stop]
+        rows = self.row_of_entry[entry_start:entry_stop] - start
+
+        # Expand every (row, term) entry over the term's posting list
+        posting_starts = self.col_indptr[terms]
+        posting_lengths = self.col_indptr[terms + 1] - posting_starts
+        total = int(posting_lengths.sum())
+        block = np.zeros((stop - start) * n_docs, dtype=np.float32)
+        if total:
+            first = np.repeat(np.cumsum(posting_lengths) - posting_lengths, posting_lengths)
+            positions = np.repeat(posting_starts, posting_lengths) + (np.arange(total) - first)
+            cells = np.repeat(rows, posting_lengths) * n_docs + self.col_rows[positions]
+            block += np.bincount(cells, weights=np.repeat(weights, posting_lengths) * self.col_data[positions], minlength=block.size).astype(np.float32)
+        return block.reshape(stop - start, n_docs)
+
+    def top_k(self, k: int) -> List[List[Tuple[int, float]]]:
+        """
+        For every row, up to k (row, similarity) neighbours with positive similarity, best first.
+        """
+        n_docs = len(self.doc_ids)
+        k = min(k, n_docs - 1)
+        result: List[List[Tuple[int, float]]] = []
+        if k <= 0:
+            return [[] for _ in range(n_docs)]
+        for start, stop in self.batches():
+            scores = self.similarities(start, stop)
+            scores[np.arange(stop - start), np.arange(start, stop)] = -1.0  # Not related to itself
+            best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            best_scores = np.take_along_axis(scores, best, axis=1)
+            order = np.argsort(-best_scores, axis=1, kind="stable")
+            best = np.take_along_axis(best, order, axis=1)
+            best_scores = np.take_along_axis(best_scores, order, axis=1)
+            for row_best, row_scores in zip(best, best_scores):
+                result.append([(int(j), float(s)) for j, s in zip(row_best, row_scores) if s > 0])
+        return result
+
+
+def source_version(db_path: Optional[str]) -> Optional[str]:
+    """
+    Modification time and size of the state database and its WAL. PRAGMA data_version is
+    only comparable within one connection, so this is what a persisted index is checked against.
+    """
+    if not db_path or not os.path.exists(db_path):
+        return None
+    parts = []
+    for path in (db_path, db_path + "-wal"):
+        if os.path.exists(path):
+            info = os.stat(path)
+            parts.append(f"{info.st_mtime_ns}:{info.st_size}")
+    return "/".join(parts)
+
+
+def load_term_counts(conn: sqlite3.Connection) -> Tuple[List[str], List[Counter]]:
+    counts: Dict[str, Counter] = {}
+    for key, text in conn.execute(TEXT_QUERY, ("cursor_bubbleId:", "cursor_bubbleId;")):
+        key_parts = key.split(':')
+        if len(key_parts) < 3:
+            continue
+        doc = counts.setdefault(key_parts[1], Counter())
+        if isinstance(text, str) and text:
+            doc.update(_TOKEN.findall(text.lower()))
+    doc_ids = sorted(counts)
+    return doc_ids, [counts[doc_id] for doc_id in doc_ids]
+
+
+class RelatedIndex:
+    """
+    Persisted top-k neighbours per conversation, together with the database path and
+    source_version they were computed from.
+    """
+
+    def __init__(self, path: str = RELATED_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._building: Optional[threading.Thread] = None
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS related (
+                composer_id TEXT NOT NULL,
+                rank INTEGER NOT NULL,
+                related_id TEXT NOT NULL,
+                score REAL NOT NULL,
+                PRIMARY KEY (composer_id, rank)
+            );
+            CREATE TABLE IF NOT EXISTS titles (composer_id TEXT PRIMARY KEY, title TEXT);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        """)
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def is_built(self) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM meta WHERE key = 'built_at'").fetchone() is not None
+
+    def is_current(self) -> bool:
+        """
+        Whether the index was built from the configured database as it is now.
+        """
+        with self._lock:
+            meta = dict(self._conn.execute("SELECT key, value FROM meta WHERE key IN ('db_path', 'source_version')"))
+        db_path = os.path.abspath(db_service.DATABASE_PATH) if db_service.DATABASE_PATH else None
+        return meta.get("db_path") == db_path and meta.get("source_version") == source_version(db_path)
+
+    def refresh(self, top_k: int = DEFAULT_TOP_K) -> None:
+        """
+        Rebuilds the index if it is missing or stale; concurrent callers wait for one build.
+        """
+        with self._build_lock:
+            if not self.is_built() or not self.is_current():
+                self.build(top_k)
+
+    def refresh_in_background(self, top_k: int = DEFAULT_TOP_K) -> None:
+        """
+        Starts refresh() in a background thread unless one is still running.
+        Doesn't wait for a running build, so it can be called from the event loop.
+        """
+        with self._lock:
+            if self._building is not None and self._building.is_alive():
+                return
+            self._building = threading.Thread(target=self.refresh, args=(top_k,), daemon=True)
+            self._building.start()
+
+    def build(self, top_k: int = DEFAULT_TOP_K) -> int:
+        """
+        Recomputes all neighbours from the configured state database. Returns the number of conversations.
+        """
+        db_path = os.path.abspath(db_service.DATABASE_PATH) if db_service.DATABASE_PATH else None
+        # Taken before reading, so writes made during the build leave the index stale
+        version = source_version(db_path)
+        conn = db_service.get_db_connection()
+        if not conn:
+            return 0
+        try:
+            doc_ids, term_counts = load_term_counts(conn)
+        finally:
+            conn.close()
+        neighbours = TermMatrix(doc_ids, term_counts).top_k(top_k)
+        titles = [(c["id"], c["title"]) for c in db_service.get_composer_ids_with_details()]
+
+        with self._lock:
+            self._conn.execute("DELETE FROM related")
+            self._conn.execute("DELETE FROM titles")
+            self._conn.executemany(
+                "INSERT INTO related (composer_id, rank, related_id, score) VALUES (?, ?, ?, ?)",
+                ((doc_ids[i], rank, doc_ids[j], score) for i, row in enumerate(neighbours) for rank, (j, score) in enumerate(row)),
+            )
+            self._conn.executemany("INSERT INTO titles (composer_id, title) VALUES (?, ?)", titles)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                [("built_at", str(int(time.time()))), ("db_path", db_path), ("source_version", version)],
+            )
+            self._conn.commit()
+        return len(doc_ids)
+
+    def related(self, composer_id: str, limit: Optional[int] = None) -> List[Dict[str, object]]:
+        sql = (
+            "SELECT r.related_id, t.title, r.score FROM related r LEFT JOIN titles t ON t.composer_id = r.related_id"
+            " WHERE r.composer_id = ? ORDER BY r.rank"
+        )
+        params: List[object] = [composer_id]
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [{"id": rid, "title": title or f"Conversation {rid}", "score": round(score, 4)} for rid, title, score in rows]
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    db_service.DATABASE_PATH = os.getenv("VSCODE_STATE_DB_PATH")
+
+    args = sys.argv[1:]
+    if not args or args[0] not in ("build", "show") or (args[0] == "show" and len(args) < 2):
+        print("Usage: python -m app.related build [--top N]")
+        print("       python -m app.related show <composer_id>")
+        sys.exit(1)
+
+    index = RelatedIndex()
+    if args[0] == "build":
+        top_k = int(args[args.index("--top") + 1]) if "--top" in args else DEFAULT_TOP_K
+        started = time.time()
+        count = index.build(top_k)
+        print(f"Computed related conversations for {count} conversations in {time.time() - started:.1f}s ({index.path})")
+    else:
+        for item in index.related(args[1]):
+            print(f"{item['score']:.3f}\t{item['id']}\t{item['title']}")
+    index.close()
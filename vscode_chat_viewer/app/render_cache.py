@@ -0,0 +1,194 @@
+import hashlib
+import html
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import replace
+from typing import Dict, List, Optional
+
+from .records import MessageRecord, dumps
+
+try:
+    import markdown
+except ImportError:  # Server-side rendering is optional, clients fall back to marked
+    markdown = None
+
+# Bump whenever MessageRenderer output changes, so stale cached fragments are ignored
+RENDERER_VERSION = "3"
+
+RENDER_CACHE_PATH = os.getenv("CHAT_VIEWER_RENDER_CACHE", ".render_cache.sqlite")
+# Total size of the cached fragments; the least recently used ones are pruned beyond it
+RENDER_CACHE_MAX_BYTES = int(os.getenv("CHAT_VIEWER_RENDER_CACHE_BYTES", str(256 * 1024 * 1024)))
+# Pruning goes this far below the limit, so it doesn't run again on the next few inserts
+RENDER_CACHE_PRUNE_TO = 0.9
+
+
+def _escape_pre(text: str) -> str:
+    return f"<pre><code>{html.escape(text, quote=False)}</code></pre>"
+
+
+def _load_full_output_button(message_id: str, index: int, size: Optional[int]) -> str:
+    # Handled by script.js, which fetches the output from the tool-output endpoint
+    return (
+        f'<button class="load-tool-output" data-message-id="{html.escape(message_id)}" data-index="{index}">'
+        f"Load full output ({size or 0:,} bytes)</button>"
+    )
+
+
+class MessageRenderer:
+    """
+    Renders a MessageRecord into the same HTML fragment the frontend builds with marked.
+
+    With lazy_bodies the collapsed code blocks and tool outputs only carry their summary and
+    the index of the record they show (data-code-block / data-tool-output); script.js builds
+    the body from the message's own code_blocks / tool_outputs the first time one is opened.
+    """
+
+    def __init__(self) -> None:
+        if markdown is None:
+            raise RuntimeError("The 'markdown' package is required for server-side rendering")
+        # Mirrors the marked options in script.js (gfm + breaks)
+        self._md = markdown.Markdown(extensions=["fenced_code", "tables", "nl2br", "sane_lists"])
+
+    def render(self, message: MessageRecord, lazy_bodies: bool = False) -> str:
+        self._md.reset()
+        rendered_text = self._md.convert(message.text) if message.text else ""
+
+        attachments_html = ""
+        if message.attachments:
+            items = []
+            for att in message.attachments:
+                name = html.escape(att.name)
+                if att.path:
+                    items.append(f'<li>{name} <span class="attachment-path">({html.escape(att.type)}: {html.escape(att.path)})</span></li>')
+                else:
+                    items.append(f"<li>{name} ({html.escape(att.type)})</li>")
+            attachments_html = '<div class="attachments"><h4>Attachments:</h4><ul>' + "".join(items) + "</ul></div>"
+
+        # Code blocks and tool outputs start collapsed, like in the client-side renderer
+        code_blocks_html = ""
+        for index, cb in enumerate(message.code_blocks):
+            lang_class = f"language-{html.escape(cb.language)}" if cb.language else ""
+            summary = f"Code ({html.escape(cb.language)})" if cb.language else "Code"
+            summary += f", {cb.content.count(chr(10)) + 1} lines"
+            if cb.uri_path:
+                summary += f' <span class="attachment-path">{html.escape(cb.uri_path)}</span>'
+            if lazy_bodies:
+                code_blocks_html += f'<details data-code-block="{index}"><summary>{summary}</summary></details>'
+            else:
+                code_blocks_html += f'<details><summary>{summary}</summary><pre><code class="{lang_class}">{html.escape(cb.content, quote=False)}</code></pre></details>'
+
+        tool_outputs_html = ""
+        if message.tool_outputs:
+            items = []
+            for index, to in enumerate(message.tool_outputs):
+                label = f"{html.escape(to.tool_name or 'Tool')} (Status: {html.escape(to.status or 'N/A')})"
+                if lazy_bodies:
+                    items.append(f'<details data-tool-output="{index}"><summary><span class="tool-output-name">{label}</span></summary></details>')
+                    continue
+                if to.truncated:
+                    data_display = _escape_pre(to.preview or "") + _load_full_output_button(message.id, index, to.size)
+                elif isinstance(to.data, (dict, list)):
+                    data_display = _escape_pre(json.dumps(to.data, indent=2))
+                elif to.data is not None:
+                    data_display = _escape_pre(str(to.data))
+                else:
+                    data_display = ""
+                items.append(f'<details><summary><span class="tool-output-name">{label}</span></summary>{data_display}</details>')
+            tool_outputs_html = '<div class="tool-outputs"><h4>Tool Outputs:</h4>' + "".join(items) + "</div>"
+
+        sender = message.sender[:1].upper() + message.sender[1:]
+        return (
+            f'<div class="sender">{html.escape(sender)} (ID: {html.escape(message.id)})</div>'
+            f'<div class="content">{rendered_text}</div>'
+            f"{attachments_html}{code_blocks_html}{tool_outputs_html}"
+        )
+
+
+class RenderCache:
+    """
+    Persistent cache of rendered message fragments keyed by (message content hash, renderer version),
+    bounded by max_bytes of HTML with least recently used eviction.
+    Fragments of other renderer versions can never be hit again and are dropped on open.
+    """
+
+    def __init__(self, path: str = RENDER_CACHE_PATH, max_bytes: int = RENDER_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(fragments)")}
+        if columns and "last_used" not in columns:  # Written before there was a size limit
+            self._conn.execute("DROP TABLE fragments")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS fragments (key TEXT PRIMARY KEY, html TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS fragments_last_used ON fragments (last_used)")
+        self._conn.execute("DELETE FROM fragments WHERE substr(key, 1, ?) != ?", (len(RENDERER_VERSION) + 1, f"{RENDERER_VERSION}:"))
+        self._conn.commit()
+        self._bytes: int = self._conn.execute("SELECT coalesce(sum(size), 0) FROM fragments").fetchone()[0]
+        self._renderer: Optional[MessageRenderer] = None
+
+    @staticmethod
+    def message_key(message: MessageRecord, lazy_bodies: bool = False) -> str:
+        content = (message.id, message.sender, message.text, message.attachments, message.code_blocks, message.tool_outputs)
+        digest = hashlib.sha1(dumps(content)).hexdigest()
+        return f"{RENDERER_VERSION}:lazy:{digest}" if lazy_bodies else f"{RENDERER_VERSION}:{digest}"
+
+    def render_all(self, messages: List[MessageRecord], lazy_bodies: bool = False) -> List[MessageRecord]:
+        """
+        Copies of the messages with html filled in, rendering only those not cached yet.
+        The messages themselves are left alone, they may be shared through db_service.message_cache.
+        lazy_bodies is for the viewer, which builds collapsed bodies itself (see MessageRenderer);
+        exports, which have no script, get the full bodies.
+        """
+        keys = [self.message_key(message, lazy_bodies) for message in messages]
+        with self._lock:
+            cached: Dict[str, str] = {}
+            unique_keys = list(dict.fromkeys(keys))
+            for start in range(0, len(unique_keys), 500):
+                batch = unique_keys[start:start + 500]
+                placeholders = ",".join("?" for _ in batch)
+                cached.update(self._conn.execute(f"SELECT key, html FROM fragments WHERE key IN ({placeholders})", batch).fetchall())
+
+            new_fragments: Dict[str, str] = {}
+            rendered: List[MessageRecord] = []
+            for key, message in zip(keys, messages):
+                if key not in cached and key not in new_fragments:
+                    if self._renderer is None:
+                        self._renderer = MessageRenderer()
+                    new_fragments[key] = self._renderer.render(message, lazy_bodies)
+                rendered.append(replace(message, html=cached.get(key) or new_fragments[key]))
+
+            now = time.time()
+            if cached:
+                self._conn.executemany("UPDATE fragments SET last_used = ? WHERE key = ?", ((now, key) for key in cached))
+            if new_fragments:
+                rows = [(key, fragment, len(fragment.encode("utf-8")), now) for key, fragment in new_fragments.items()]
+                self._conn.executemany("INSERT OR REPLACE INTO fragments (key, html, size, last_used) VALUES (?, ?, ?, ?)", rows)
+                self._bytes += sum(row[2] for row in rows)
+                if self._bytes > self.max_bytes:
+                    self._prune()
+            self._conn.commit()
+        return rendered
+
+    def _prune(self) -> None:
+        """
+        Deletes the least recently used fragments until the cache is RENDER_CACHE_PRUNE_TO of max_bytes.
+        """
+        excess = self._bytes - int(self.max_bytes * RENDER_CACHE_PRUNE_TO)
+        evicted: List[str] = []
+        for key, size in self._conn.execute("SELECT key, size FROM fragments ORDER BY last_used"):
+            if excess <= 0:
+                break
+            evicted.append(key)
+            excess -= size
+            self._bytes -= size
+        self._conn.executemany("DELETE FROM fragments WHERE key = ?", ((key,) for key in evicted))
+
+
+def server_rendering_available() -> bool:
+    return markdown is not None
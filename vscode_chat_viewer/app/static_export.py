@@ -0,0 +1,114 @@
+"""
+Export the viewer as a static site: precomputed API payloads plus the web frontend.
+
+Usage (from the vscode_chat_viewer directory):
+    python -m app.static_export <output_dir> [--page-size N] [--gzip]
+
+Layout:
+    index.html, *.js, style.css, lib/           frontend, reading from api/
+    api/conversations.json                      List[ConversationInfo]
+    api/conversations/<id[:2]>/<id>/meta.json   {"id", "message_count", "page_size", "pages"}
+    api/conversations/<id[:2]>/<id>/page-0001.json ...  ConversationDetail holding one page of messages
+"""
+import gzip
+import json
+import os
+import shutil
+import sys
+from typing import Any, Dict, List
+
+from dotenv import load_dotenv
+
+from . import db_service
+from .models import ConversationInfo
+from .records import dumps
+
+DEFAULT_PAGE_SIZE = 200
+WEB_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "web")
+STATIC_BASE_META = '<meta name="chat-viewer-static-base" content="api">'
+
+
+def conversation_dir(composer_id: str) -> str:
+    """
+    Relative directory of a conversation's payloads, sharded by id prefix to keep directories small.
+    """
+    return f"conversations/{composer_id[:2]}/{composer_id}"
+
+
+def _write_payload(path: str, body: bytes, precompress: bool) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(body)
+    if precompress:
+        # Served as-is by hosts that support precompressed files (e.g. nginx gzip_static)
+        with open(f"{path}.gz", "wb") as f:
+            f.write(gzip.compress(body, compresslevel=9))
+
+
+def _export_frontend(output_dir: str) -> None:
+    with open(os.path.join(WEB_DIR, "index.html"), "r", encoding="utf-8") as f:
+        index_html = f.read()
+    # Relative asset paths and the static API base so the page works from any directory or host
+    index_html = index_html.replace('href="/static/', 'href="').replace('src="/static/', 'src="').replace('src="/lib/', 'src="lib/')
+    index_html = index_html.replace("<head>", f"<head>\n    {STATIC_BASE_META}", 1)
+    with open(os.path.join(output_dir, "index.html"), "w", encoding="utf-8") as f:
+        f.write(index_html)
+
+    for name in ["script.js", "render_worker.js", "style.css"]:
+        shutil.copy2(os.path.join(WEB_DIR, name), os.path.join(output_dir, name))
+    lib_dir = os.path.join(WEB_DIR, "lib")
+    if os.path.isdir(lib_dir):
+        shutil.copytree(lib_dir, os.path.join(output_dir, "lib"), dirs_exist_ok=True)
+
+
+def export_static_site(output_dir: str, page_size: int = DEFAULT_PAGE_SIZE, precompress: bool = False) -> int:
+    """
+    Writes the static site and returns the number of exported conversations.
+    """
+    api_dir = os.path.join(output_dir, "api")
+    os.makedirs(api_dir, exist_ok=True)
+
+    conversations: List[Dict[str, Any]] = db_service.get_composer_ids_with_details()
+    # Validate once here so the static list is exactly what /api/conversations returns
+    conversation_infos = [ConversationInfo(**c).model_dump() for c in conversations]
+    _write_payload(os.path.join(api_dir, "conversations.json"), json.dumps(conversation_infos).encode("utf-8"), precompress)
+
+    for i, conversation in enumerate(conversation_infos):
+        composer_id = conversation["id"]
+        messages = db_service.get_messages_for_composer(composer_id, use_cache=False)
+        pages = [messages[start:start + page_size] for start in range(0, len(messages), page_size)]
+        target_dir = os.path.join(api_dir, conversation_dir(composer_id))
+
+        meta = {"id": composer_id, "message_count": len(messages), "page_size": page_size, "pages": len(pages)}
+        _write_payload(os.path.join(target_dir, "meta.json"), json.dumps(meta).encode("utf-8"), precompress)
+        for page_number, page in enumerate(pages, start=1):
+            body = dumps({"id": composer_id, "messages": page})
+            _write_payload(os.path.join(target_dir, f"page-{page_number:04d}.json"), body, precompress)
+
+        if (i + 1) % 100 == 0:
+            print(f"Exported {i + 1}/{len(conversation_infos)} conversations")
+
+    _export_frontend(output_dir)
+    return len(conversation_infos)
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    db_service.DATABASE_PATH = os.getenv("VSCODE_STATE_DB_PATH")
+
+    args = sys.argv[1:]
+    precompress = "--gzip" in args
+    if precompress:
+        args.remove("--gzip")
+    page_size = DEFAULT_PAGE_SIZE
+    if "--page-size" in args:
+        idx = args.index("--page-size")
+        page_size = int(args[idx + 1])
+        del args[idx:idx + 2]
+    if len(args) < 1 or page_size < 1:
+        print("Usage: python -m app.static_export <output_dir> [--page-size N] [--gzip]")
+        sys.exit(1)
+
+    count = export_static_site(args[0], page_size, precompress)
+    print(f"Exported {count} conversations to {args[0]}. Serve it with any static file server, e.g.:")
+    print(f"  python -m http.server --directory {args[0]}")
@@ -0,0 +1,255 @@
+"""
+Token usage and activity analytics over all bubbles.
+
+The per-bubble fields are extracted by SQLite's JSON functions in a single
+scan and loaded once into NumPy column arrays; every aggregate (per
+conversation, per workspace, per day, percentiles, top-N) is then a
+vectorized group-by over those columns.
+
+Usage (from the vscode_chat_viewer directory):
+    python -m app.stats [--top N] [--per-conversation] [--json]
+"""
+import json
+import os
+import sqlite3
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from urllib.parse import unquote, urlparse
+
+import numpy as np
+from dotenv import load_dotenv
+
+from . import db_service
+
+UNKNOWN_WORKSPACE = "(unknown)"
+PERCENTILES = [50, 90, 99]
+
+# One row per valid bubble; the JSON is parsed by SQLite, Python only sees scalars.
+# Token counts live under tokenCount in current versions and at the top level in older ones.
+BUBBLE_COLUMNS_QUERY = """
+    SELECT
+        key,
+        COALESCE(json_extract(v, '$.tokenCount.inputTokens'), json_extract(v, '$.inputTokens'), 0),
+        COALESCE(json_extract(v, '$.tokenCount.outputTokens'), json_extract(v, '$.outputTokens'), 0),
+        COALESCE(json_extract(v, '$.isAgentic'), 0),
+        (json_type(v, '$.toolFormerData') IS NOT NULL)
+            + COALESCE(json_array_length(v, '$.toolResults'), 0)
+            + COALESCE(json_array_length(v, '$.interpreterResults'), 0),
+        CASE typeof(json_extract(v, '$.createdAt'))
+            WHEN 'text' THEN CAST(strftime('%s', json_extract(v, '$.createdAt')) AS INTEGER)
+            WHEN 'integer' THEN json_extract(v, '$.createdAt') / 1000
+            WHEN 'real' THEN CAST(json_extract(v, '$.createdAt') / 1000 AS INTEGER)
+        END
+    FROM (SELECT key, CAST(value AS TEXT) AS v FROM cursorDiskKV WHERE key >= ? AND key < ?)
+    WHERE json_valid(v)
+"""
+
+
+class BubbleColumns:
+    """
+    Column arrays with one entry per bubble; composer ids are interned into integer codes.
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        composer_codes: Dict[str, int] = {}
+        codes: List[int] = []
+        input_tokens: List[int] = []
+        output_tokens: List[int] = []
+        agentic: List[int] = []
+        tool_calls: List[int] = []
+        created: List[int] = []
+
+        cursor = conn.execute(BUBBLE_COLUMNS_QUERY, ("cursor_bubbleId:", "cursor_bubbleId;"))
+        for key, inp, out, is_agentic, tools, created_at in cursor:
+            key_parts = key.split(':')
+            if len(key_parts) < 3:
+                continue
+            codes.append(composer_codes.setdefault(key_parts[1], len(composer_codes)))
+            input_tokens.append(inp if isinstance(inp, (int, float)) else 0)
+            output_tokens.append(out if isinstance(out, (int, float)) else 0)
+            agentic.append(1 if is_agentic else 0)
+            tool_calls.append(tools or 0)
+            created.append(created_at if isinstance(created_at, int) else -1)
+
+        self.composer_ids: List[str] = list(composer_codes)
+        self.composer = np.array(codes, dtype=np.int32)
+        self.input_tokens = np.array(input_tokens, dtype=np.int64)
+        self.output_tokens = np.array(output_tokens, dtype=np.int64)
+        self.is_agentic = np.array(agentic, dtype=bool)
+        self.tool_calls = np.array(tool_calls, dtype=np.int64)
+        # Days since the epoch, -1 when the bubble has no timestamp
+        created_arr = np.array(created, dtype=np.int64)
+        self.day = np.where(created_arr >= 0, created_arr // 86400, -1)
+
+    def __len__(self) -> int:
+        return len(self.composer)
+
+
+def workspace_for_composers(db_path: str) -> Dict[str, str]:
+    """
+    composer_id -> workspace folder, read from the per-workspace state databases
+    next to the global one (User/workspaceStorage/<hash>/state.vscdb).
+    """
+    mapping: Dict[str, str] = {}
+    storage_dir = Path(db_path).resolve().parent.parent / "workspaceStorage"
+    if not storage_dir.is_dir():
+        return mapping
+
+    for workspace_dir in storage_dir.iterdir():
+        workspace_db = workspace_dir / "state.vscdb"
+        if not workspace_db.is_file():
+            continue
+        folder = workspace_dir.name
+        try:
+            with open(workspace_dir / "workspace.json", "r", encoding="utf-8") as f:
+                workspace_json = json.load(f)
+            location = workspace_json.get("folder") or workspace_json.get("workspace")
+            if location:
+                folder = unquote(urlparse(location).path) or location
+        except (OSError, json.JSONDecodeError, AttributeError):
+            pass
+
+        try:
+            conn = sqlite3.connect(f"file:{workspace_db}?mode=ro", uri=True)
+            try:
+                row = conn.execute("SELECT value FROM ItemTable WHERE key = 'composer.composerData'").fetchone()
+            finally:
+                conn.close()
+            composers = json.loads(row[0]).get("allComposers", []) if row else []
+        except (sqlite3.Error, json.JSONDecodeError, TypeError, AttributeError):
+            continue
+        for composer in composers:
+            if isinstance(composer, dict) and composer.get("composerId"):
+                mapping[composer["composerId"]] = folder
+    return mapping
+
+
+def _percentiles(values: np.ndarray) -> Dict[str, float]:
+    if len(values) == 0:
+        return {f"p{p}": 0.0 for p in PERCENTILES}
+    return {f"p{p}": float(v) for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))}
+
+
+def _grouped(codes: np.ndarray, groups: int, columns: BubbleColumns) -> Dict[str, np.ndarray]:
+    return {
+        "bubbles": np.bincount(codes, minlength=groups),
+        "input_tokens": np.bincount(codes, weights=columns.input_tokens, minlength=groups).astype(np.int64),
+        "output_tokens": np.bincount(codes, weights=columns.output_tokens, minlength=groups).astype(np.int64),
+        "agentic_bubbles": np.bincount(codes, weights=columns.is_agentic, minlength=groups).astype(np.int64),
+        "tool_calls": np.bincount(codes, weights=columns.tool_calls, minlength=groups).astype(np.int64),
+    }
+
+
+def _rows(labels: List[str], label_name: str, sums: Dict[str, np.ndarray], order: np.ndarray) -> List[Dict[str, Any]]:
+    return [{label_name: labels[i], **{name: int(values[i]) for name, values in sums.items()}} for i in order]
+
+
+def compute_stats(
+    columns: BubbleColumns,
+    workspaces: Optional[Dict[str, str]] = None,
+    top: int = 10,
+    per_conversation: bool = False,
+) -> Dict[str, Any]:
+    conversation_count = len(columns.composer_ids)
+    per_composer = _grouped(columns.composer, conversation_count, columns)
+    conversation_tokens = per_composer["input_tokens"] + per_composer["output_tokens"]
+
+    top = min(top, conversation_count)
+    heaviest = np.argpartition(-conversation_tokens, top - 1)[:top] if top > 0 else np.array([], dtype=np.int64)
+    heaviest = heaviest[np.argsort(-conversation_tokens[heaviest], kind="stable")]
+
+    # Per day: group by the distinct days present, unknown timestamps are reported as null
+    days, day_codes = np.unique(columns.day, return_inverse=True)
+    per_day = _grouped(day_codes, len(days), columns)
+    day_labels = [str(np.datetime64(int(d), "D")) if d >= 0 else None for d in days]
+
+    # Per workspace: map composer codes to workspace codes, then group bubbles through them
+    workspaces = workspaces or {}
+    workspace_names = sorted({workspaces.get(cid, UNKNOWN_WORKSPACE) for cid in columns.composer_ids})
+    workspace_codes = {name: i for i, name in enumerate(workspace_names)}
+    composer_workspace = np.array([workspace_codes[workspaces.get(cid, UNKNOWN_WORKSPACE)] for cid in columns.composer_ids], dtype=np.int32)
+    bubble_workspace = composer_workspace[columns.composer] if len(columns) else np.array([], dtype=np.int32)
+    per_workspace = _grouped(bubble_workspace, len(workspace_names), columns)
+    per_workspace["conversations"] = np.bincount(composer_workspace, minlength=len(workspace_names))
+
+    bubble_tokens = columns.input_tokens + columns.output_tokens
+    stats: Dict[str, Any] = {
+        "totals": {
+            "conversations": conversation_count,
+            "bubbles": len(columns),
+            "input_tokens": int(columns.input_tokens.sum()),
+            "output_tokens": int(columns.output_tokens.sum()),
+            "agentic_bubbles": int(columns.is_agentic.sum()),
+            "tool_calls": int(columns.tool_calls.sum()),
+        },
+        "percentiles": {
+            "conversation_tokens": _percentiles(conversation_tokens),
+            "bubble_tokens": _percentiles(bubble_tokens),
+            "conversation_bubbles": _percentiles(per_composer["bubbles"]),
+        },
+        "top_conversations": [
+            {**row, "total_tokens": row["input_tokens"] + row["output_tokens"]}
+            for row in _rows(columns.composer_ids, "id", per_composer, heaviest)
+        ],
+        "per_day": _rows(day_labels, "day", per_day, np.arange(len(days))),
+        "per_workspace": _rows(workspace_names, "workspace", per_workspace, np.argsort(-per_workspace["input_tokens"] - per_workspace["output_tokens"], kind="stable")),
+    }
+    if per_conversation:
+        stats["per_conversation"] = _rows(columns.composer_ids, "id", per_composer, np.argsort(columns.composer_ids))
+    return stats
+
+
+def get_stats(top: int = 10, per_conversation: bool = False) -> Optional[Dict[str, Any]]:
+    conn = db_service.get_db_connection()
+    if not conn:
+        return None
+    try:
+        columns = BubbleColumns(conn)
+    except sqlite3.Error as e:
+        print(f"Database query error in get_stats: {e}")
+        return None
+    finally:
+        conn.close()
+    workspaces = workspace_for_composers(db_service.DATABASE_PATH) if db_service.DATABASE_PATH else {}
+    return compute_stats(columns, workspaces, top, per_conversation)
+
+
+def _print_table(title: str, rows: List[Dict[str, Any]]) -> None:
+    print(f"\n{title}")
+    if not rows:
+        print("  (none)")
+        return
+    names = list(rows[0])
+    widths = [max(len(name), *(len(str(row[name])) for row in rows)) for name in names]
+    print("  " + "  ".join(name.ljust(width) for name, width in zip(names, widths)))
+    for row in rows:
+        print("  " + "  ".join(str(row[name]).ljust(width) for name, width in zip(names, widths)))
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    db_service.DATABASE_PATH = os.getenv("VSCODE_STATE_DB_PATH")
+
+    args = sys.argv[1:]
+    top = 10
+    if "--top" in args:
+        idx = args.index("--top")
+        top = int(args[idx + 1])
+        del args[idx:idx + 2]
+    stats = get_stats(top, per_conversation="--per-conversation" in args)
+    if stats is None:
+        sys.exit(1)
+
+    if "--json" in args:
+        print(json.dumps(stats, indent=2))
+        sys.exit(0)
+
+    print("Totals: " + ", ".join(f"{name}={value}" for name, value in stats["totals"].items()))
+    for name, values in stats["percentiles"].items():
+        print(f"{name}: " + ", ".join(f"{p}={v:.0f}" for p, v in values.items()))
+    _print_table("Top conversations by tokens", stats["top_conversations"])
+    _print_table("Per workspace", stats["per_workspace"])
+    _print_table("Per day", stats["per_day"])
+    if "per_conversation" in stats:
+        _print_table("Per conversation", stats["per_conversation"])
@@ -0,0 +1,19 @@
+// Parses message markdown off the main thread. The page sends the URL of
+// marked.min.js first ('init'), then one 'parse' request per message.
+self.onmessage = (event) => {
+    const data = event.data;
+    if (data.type === 'init') {
+        if (data.markedUrl) {
+            importScripts(data.markedUrl);
+            // Same options as the main thread (script.js)
+            marked.setOptions({ breaks: true, gfm: true, sanitize: false, smartypants: true });
+        }
+        return;
+    }
+    if (data.type === 'parse') {
+        const html = typeof marked !== 'undefined'
+            ? marked.parse(data.text)
+            : String(data.text).replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;');
+        self.postMessage({ id: data.id, html });
+    }
+};
@@ -1,16 +1,55 @@
+// Resolved while the script is executing; document.currentScript is null inside event handlers
+const scriptUrl = document.currentScript ? document.currentScript.src : window.location.href;
+
 document.addEventListener('DOMContentLoaded', () => {
     const conversationListEl = document.getElementById('conversation-list');
     const messageListEl = document.getElementById('message-list');
     const currentConversationTitleEl = document.getElementById('current-conversation-title');
+    const relatedConversationsEl = document.getElementById('related-conversations');
     let currentComposerId = null;
+    // Set by the static export (app/static_export.py): read precomputed JSON files instead of the live API
+    const staticBaseMeta = document.querySelector('meta[name="chat-viewer-static-base"]');
+    const staticBase = staticBaseMeta ? staticBaseMeta.content : null;
+
+    function conversationsUrl() {
+        return staticBase ? `${staticBase}/conversations.json` : '/api/conversations';
+    }
+
+    function staticConversationDir(composerId) {
+        return `${staticBase}/conversations/${composerId.slice(0, 2)}/${composerId}`;
+    }
+
+    async function fetchJson(url) {
+        const response = await fetch(url);
+        if (!response.ok) {
+            if (response.status === 404) {
+                throw new Error(`Conversation not found or has no messages.`);
+            }
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        return response.json();
+    }
+
+    async function fetchConversationMessages(composerId) {
+        if (!staticBase) {
+            // Ask for server-rendered HTML; servers without it just omit msg.html
+            const conversationDetail = await fetchJson(`/api/conversations/${composerId}?render=html`);
+            return conversationDetail.messages;
+        }
+        // Static export: messages are split into pages listed in meta.json
+        const dir = staticConversationDir(composerId);
+        const meta = await fetchJson(`${dir}/meta.json`);
+        const pageUrls = [];
+        for (let page = 1; page <= meta.pages; page++) {
+            pageUrls.push(`${dir}/page-${String(page).padStart(4, '0')}.json`);
+        }
+        const pages = await Promise.all(pageUrls.map(fetchJson));
+        return pages.flatMap(page => page.messages);
+    }
 
     async function fetchConversations() {
         try {
-            const response = await fetch('/api/conversations');
-            if (!response.ok) {
-                throw new Error(`HTTP error! status: ${response.status}`);
-            }
-            const conversations = await response.json();
+            const conversations = await fetchJson(conversationsUrl());
             renderConversationList(conversations);
         } catch (error) {
             conversationListEl.innerHTML = `<p>Error loading conversations: ${error.message}</p>`;
@@ -29,7 +68,7 @@ document.addEventListener('DOMContentLoaded', () => {
             li.dataset.composerId = convo.id;
             li.innerHTML = `
                 <span class="title">${convo.title}</span>
-                <span class="count">${convo.message_count} messages</span>
+                <span class="count">${convo.message_count} messages${convo.tracked_lines ? ` · ${convo.tracked_lines} tracked lines` : ''}</span>
             `;
             li.addEventListener('click', () => {
                 loadConversation(convo.id, convo.title);
@@ -51,87 +90,369 @@ document.addEventListener('DOMContentLoaded', () => {
         currentComposerId = composerId;
         currentConversationTitleEl.textContent = title || `Conversation ${composerId}`;
         messageListEl.innerHTML = '<p class="placeholder">Loading messages...</p>';
+        loadRelatedConversations(composerId);
 
         try {
-            const response = await fetch(`/api/conversations/${composerId}`);
-            if (!response.ok) {
-                 if (response.status === 404) {
-                    throw new Error(`Conversation not found or has no messages.`);
-                }
-                throw new Error(`HTTP error! status: ${response.status}`);
-            }
-            const conversationDetail = await response.json();
-            renderMessages(conversationDetail.messages);
+            const messages = await fetchConversationMessages(composerId);
+            renderMessages(messages);
         } catch (error) {
             messageListEl.innerHTML = `<p class="placeholder">Error loading messages: ${error.message}</p>`;
             console.error(`Error fetching messages for ${composerId}:`, error);
         }
     }
 
-    function renderMessages(messages) {
-        if (!messages || messages.length === 0) {
-            messageListEl.innerHTML = '<p class="placeholder">No messages in this conversation.</p>';
+    async function loadRelatedConversations(composerId) {
+        relatedConversationsEl.innerHTML = '';
+        if (staticBase) return; // Not part of the static export
+        try {
+            const related = await fetchJson(`/api/conversations/${composerId}/related?limit=5`);
+            if (currentComposerId !== composerId || related.length === 0) return;
+            relatedConversationsEl.appendChild(document.createTextNode('Related: '));
+            related.forEach((convo, i) => {
+                const link = document.createElement('a');
+                link.href = '#';
+                link.textContent = convo.title;
+                link.title = `Similarity ${convo.score.toFixed(2)}`;
+                link.addEventListener('click', (event) => {
+                    event.preventDefault();
+                    // Go through the list entry so it gets highlighted as well
+                    const li = conversationListEl.querySelector(`li[data-composer-id="${CSS.escape(convo.id)}"]`);
+                    if (li) li.click(); else loadConversation(convo.id, convo.title);
+                });
+                if (i > 0) relatedConversationsEl.appendChild(document.createTextNode(' · '));
+                relatedConversationsEl.appendChild(link);
+            });
+        } catch (error) {
+            console.error(`Error fetching related conversations for ${composerId}:`, error);
+        }
+    }
+
+    // --- Markdown rendering in a Web Worker (falls back to marked on the main thread) ---
+    const markdownCache = new Map(); // message id -> rendered HTML
+    const markdownCallbacks = new Map(); // message id -> callbacks waiting for the worker
+    let markdownWorker = null;
+    try {
+        const markedScript = document.querySelector('script[src*="marked"]');
+        const workerUrl = new URL('render_worker.js', scriptUrl).href;
+        markdownWorker = new Worker(workerUrl);
+        markdownWorker.postMessage({ type: 'init', markedUrl: markedScript ? markedScript.src : null });
+        markdownWorker.onmessage = (event) => {
+            const { id, html } = event.data;
+            markdownCache.set(id, html);
+            (markdownCallbacks.get(id) || []).forEach(callback => callback(html));
+            markdownCallbacks.delete(id);
+        };
+        markdownWorker.onerror = () => {
+            // Worker unusable (e.g. marked failed to load there): finish pending work on the main thread
+            markdownWorker = null;
+            const pending = [...markdownCallbacks.entries()];
+            markdownCallbacks.clear();
+            pending.forEach(([id, callbacks]) => {
+                const msg = virtualList.messages.find(m => m.id === id);
+                if (msg) callbacks.forEach(callback => renderMarkdown(msg, callback));
+            });
+        };
+    } catch (error) {
+        markdownWorker = null; // e.g. opened from file://, render synchronously instead
+    }
+
+    function renderMarkdown(msg, callback) {
+        if (markdownCache.has(msg.id)) {
+            callback(markdownCache.get(msg.id));
             return;
         }
-        messageListEl.innerHTML = ''; // Clear "Loading..." or previous messages
-        messages.forEach(msg => {
-            const msgDiv = document.createElement('div');
-            msgDiv.classList.add('message', msg.sender);
-            
-            // Sanitize HTML in text before passing to marked. Use DOMPurify if more complex HTML is allowed from source.
-            // For now, assuming marked handles basic XSS from Markdown.
-            const renderedText = msg.text ? marked.parse(msg.text) : '';
-
-            let attachmentsHtml = '';
-            if (msg.attachments && msg.attachments.length > 0) {
-                attachmentsHtml = '<div class="attachments"><h4>Attachments:</h4><ul>';
-                msg.attachments.forEach(att => {
-                    attachmentsHtml += `<li>${att.name} ${att.path ? `<span class="attachment-path">(${att.type}: ${att.path})</span>` : `(${att.type})`}</li>`;
-                });
-                attachmentsHtml += '</ul></div>';
+        if (!markdownWorker) {
+            const html = typeof marked !== 'undefined' ? marked.parse(msg.text) : escapeHtml(msg.text);
+            markdownCache.set(msg.id, html);
+            callback(html);
+            return;
+        }
+        if (!markdownCallbacks.has(msg.id)) {
+            markdownCallbacks.set(msg.id, []);
+            markdownWorker.postMessage({ type: 'parse', id: msg.id, text: msg.text });
+        }
+        markdownCallbacks.get(msg.id).push(callback);
+    }
+
+    function escapeHtml(text) {
+        return String(text).replace(/&/g, "&amp;").replace(/</g, "&lt;").replace(/>/g, "&gt;");
+    }
+
+    // Builds the body of a collapsed <details> the first time it is opened
+    function lazyBody(details, buildBody) {
+        details.addEventListener('toggle', () => {
+            if (details.open && !details.dataset.loaded) {
+                details.dataset.loaded = '1';
+                details.insertAdjacentHTML('beforeend', buildBody());
             }
+        });
+        return details;
+    }
 
-            let codeBlocksHtml = '';
-            if (msg.code_blocks && msg.code_blocks.length > 0) {
-                msg.code_blocks.forEach(cb => {
-                    // Basic escaping for content inside <pre><code>
-                    const escapedCode = cb.content.replace(/</g, "&lt;").replace(/>/g, "&gt;");
-                    const langClass = cb.language ? `language-${cb.language}` : '';
-                    codeBlocksHtml += `<pre><code class="${langClass}">${escapedCode}</code></pre>`;
-                    if (cb.uri_path) {
-                         codeBlocksHtml += `<div class="attachment-path">Source: ${cb.uri_path}</div>`;
-                    }
-                });
+    function lazyDetails(summaryHtml, buildBody) {
+        const details = document.createElement('details');
+        details.innerHTML = `<summary>${summaryHtml}</summary>`;
+        return lazyBody(details, buildBody);
+    }
+
+    function codeBlockBody(cb) {
+        const langClass = cb.language ? `language-${cb.language}` : '';
+        return `<pre><code class="${langClass}">${escapeHtml(cb.content)}</code></pre>`;
+    }
+
+    function toolOutputBody(msg, to, index) {
+        if (to.truncated) {
+            // Only a preview was sent, the button fetches the rest
+            return `<pre><code>${escapeHtml(to.preview || '')}</code></pre>` +
+                `<button class="load-tool-output" data-message-id="${escapeHtml(msg.id)}" data-index="${index}">` +
+                `Load full output (${(to.size || 0).toLocaleString('en-US')} bytes)</button>`;
+        }
+        if (typeof to.data === 'object' && to.data !== null) {
+            return `<pre><code>${escapeHtml(JSON.stringify(to.data, null, 2))}</code></pre>`;
+        } else if (to.data !== undefined && to.data !== null) {
+            return `<pre><code>${escapeHtml(to.data)}</code></pre>`;
+        }
+        return '';
+    }
+
+    function buildMessageNode(msg) {
+        const msgDiv = document.createElement('div');
+        msgDiv.classList.add('message', msg.sender);
+        if (msg.html) {
+            // Pre-rendered by the server, no markdown work needed. Collapsed code blocks and
+            // tool outputs only come with their summary; their bodies are built when opened.
+            msgDiv.innerHTML = msg.html;
+            msgDiv.querySelectorAll('details[data-code-block]').forEach(details => {
+                const cb = (msg.code_blocks || [])[Number(details.dataset.codeBlock)];
+                if (cb) lazyBody(details, () => codeBlockBody(cb));
+            });
+            msgDiv.querySelectorAll('details[data-tool-output]').forEach(details => {
+                const index = Number(details.dataset.toolOutput);
+                const to = (msg.tool_outputs || [])[index];
+                if (to) lazyBody(details, () => toolOutputBody(msg, to, index));
+            });
+            return msgDiv;
+        }
+
+        msgDiv.innerHTML = `
+            <div class="sender">${msg.sender.charAt(0).toUpperCase() + msg.sender.slice(1)} (ID: ${msg.id})</div>
+            <div class="content"></div>
+        `;
+        const contentEl = msgDiv.querySelector('.content');
+        if (msg.text) {
+            // Show plain text until the worker has rendered the markdown
+            contentEl.textContent = msg.text;
+            renderMarkdown(msg, (html) => {
+                contentEl.innerHTML = html;
+                virtualList.remeasure();
+            });
+        }
+
+        if (msg.attachments && msg.attachments.length > 0) {
+            let attachmentsHtml = '<div class="attachments"><h4>Attachments:</h4><ul>';
+            msg.attachments.forEach(att => {
+                attachmentsHtml += `<li>${att.name} ${att.path ? `<span class="attachment-path">(${att.type}: ${att.path})</span>` : `(${att.type})`}</li>`;
+            });
+            attachmentsHtml += '</ul></div>';
+            msgDiv.insertAdjacentHTML('beforeend', attachmentsHtml);
+        }
+
+        (msg.code_blocks || []).forEach(cb => {
+            const lineCount = cb.content.split('\n').length;
+            const summary = `Code${cb.language ? ` (${escapeHtml(cb.language)})` : ''}, ${lineCount} lines${cb.uri_path ? ` <span class="attachment-path">${escapeHtml(cb.uri_path)}</span>` : ''}`;
+            msgDiv.appendChild(lazyDetails(summary, () => codeBlockBody(cb)));
+        });
+
+        if (msg.tool_outputs && msg.tool_outputs.length > 0) {
+            const toolOutputsDiv = document.createElement('div');
+            toolOutputsDiv.classList.add('tool-outputs');
+            toolOutputsDiv.innerHTML = '<h4>Tool Outputs:</h4>';
+            msg.tool_outputs.forEach((to, index) => {
+                const summary = `<span class="tool-output-name">${to.tool_name || 'Tool'} (Status: ${to.status || 'N/A'})</span>`;
+                toolOutputsDiv.appendChild(lazyDetails(summary, () => toolOutputBody(msg, to, index)));
+            });
+            msgDiv.appendChild(toolOutputsDiv);
+        }
+        return msgDiv;
+    }
+
+    // --- Windowed message list: only messages near the viewport exist in the DOM ---
+    const virtualList = {
+        ESTIMATED_HEIGHT: 120,
+        OVERSCAN_PX: 800,
+        messages: [],
+        heights: [],
+        // Fenwick tree over heights: prefix sums (row offsets) and lookups by offset in O(log n)
+        tree: new Float64Array(1),
+        mounted: new Map(), // index -> row element
+        topSpacer: null,
+        itemsEl: null,
+        bottomSpacer: null,
+        frameRequested: false,
+
+        reset(messages) {
+            this.messages = messages;
+            // Rendered markdown is only kept for the conversation on screen
+            markdownCache.clear();
+            markdownCallbacks.clear();
+            this.heights = new Array(messages.length).fill(this.ESTIMATED_HEIGHT);
+            this.buildTree();
+            this.mounted = new Map();
+            messageListEl.innerHTML = '';
+            this.topSpacer = document.createElement('div');
+            this.itemsEl = document.createElement('div');
+            this.bottomSpacer = document.createElement('div');
+            messageListEl.append(this.topSpacer, this.itemsEl, this.bottomSpacer);
+        },
+
+        buildTree() {
+            const n = this.heights.length;
+            this.tree = new Float64Array(n + 1);
+            for (let i = 1; i <= n; i++) {
+                this.tree[i] += this.heights[i - 1];
+                const parent = i + (i & -i);
+                if (parent <= n) this.tree[parent] += this.tree[i];
+            }
+        },
+
+        setHeight(index, height) {
+            const delta = height - this.heights[index];
+            this.heights[index] = height;
+            for (let i = index + 1; i < this.tree.length; i += i & -i) this.tree[i] += delta;
+        },
+
+        offsetOf(index) {
+            let offset = 0;
+            for (let i = index; i > 0; i -= i & -i) offset += this.tree[i];
+            return offset;
+        },
+
+        totalHeight() {
+            return this.offsetOf(this.heights.length);
+        },
+
+        // Number of rows that end above offset, found by descending the tree
+        rowsEndingBefore(offset) {
+            const n = this.heights.length;
+            let count = 0;
+            let step = 1;
+            while (step * 2 <= n) step *= 2;
+            for (; step > 0; step >>= 1) {
+                if (count + step <= n && this.tree[count + step] < offset) {
+                    count += step;
+                    offset -= this.tree[count];
+                }
             }
-            
-            let toolOutputsHtml = '';
-            if (msg.tool_outputs && msg.tool_outputs.length > 0) {
-                toolOutputsHtml = '<div class="tool-outputs"><h4>Tool Outputs:</h4><ul>';
-                msg.tool_outputs.forEach(to => {
-                    let dataDisplay = '';
-                    if (typeof to.data === 'object' && to.data !== null) {
-                        dataDisplay = `<pre><code>${JSON.stringify(to.data, null, 2).replace(/</g, "&lt;").replace(/>/g, "&gt;")}</code></pre>`;
-                    } else if (to.data !== undefined && to.data !== null) {
-                        dataDisplay = `<pre><code>${String(to.data).replace(/</g, "&lt;").replace(/>/g, "&gt;")}</code></pre>`;
+            return count;
+        },
+
+        visibleRange() {
+            const top = messageListEl.scrollTop - this.OVERSCAN_PX;
+            const bottom = messageListEl.scrollTop + messageListEl.clientHeight + this.OVERSCAN_PX;
+            const lastIndex = this.heights.length - 1;
+            const first = Math.min(this.rowsEndingBefore(top), lastIndex);
+            const last = Math.max(first, Math.min(this.rowsEndingBefore(bottom), lastIndex));
+            return [first, last];
+        },
+
+        render() {
+            if (!this.itemsEl) return;
+            const [first, last] = this.visibleRange();
+            for (const [index, row] of this.mounted) {
+                if (index < first || index > last) {
+                    row.remove();
+                    this.mounted.delete(index);
+                }
+            }
+            for (let i = first; i <= last; i++) {
+                if (this.mounted.has(i)) continue;
+                const row = document.createElement('div');
+                row.className = 'message-row';
+                row.appendChild(buildMessageNode(this.messages[i]));
+                // Keep rows in index order
+                const next = [...this.mounted.keys()].filter(index => index > i).sort((a, b) => a - b)[0];
+                this.itemsEl.insertBefore(row, next !== undefined ? this.mounted.get(next) : null);
+                this.mounted.set(i, row);
+            }
+            this.measure(first);
+        },
+
+        measure(first) {
+            let anchorShift = 0;
+            for (const [index, row] of this.mounted) {
+                const height = row.getBoundingClientRect().height;
+                if (height && height !== this.heights[index]) {
+                    // Keep the view steady when rows above the viewport change size
+                    if (this.offsetOf(index) + this.heights[index] <= messageListEl.scrollTop) {
+                        anchorShift += height - this.heights[index];
                     }
-                    toolOutputsHtml += `<li>
-                        <span class="tool-output-name">${to.tool_name || 'Tool'} (Status: ${to.status || 'N/A'})</span>
-                        ${dataDisplay}
-                    </li>`;
-                });
-                toolOutputsHtml += '</ul></div>';
+                    this.setHeight(index, height);
+                }
             }
+            const firstMounted = this.mounted.size ? Math.min(...this.mounted.keys()) : first;
+            const lastMounted = this.mounted.size ? Math.max(...this.mounted.keys()) : first - 1;
+            this.topSpacer.style.height = `${this.offsetOf(firstMounted)}px`;
+            this.bottomSpacer.style.height = `${this.totalHeight() - this.offsetOf(lastMounted + 1)}px`;
+            if (anchorShift) messageListEl.scrollTop += anchorShift;
+        },
 
-            msgDiv.innerHTML = `
-                <div class="sender">${msg.sender.charAt(0).toUpperCase() + msg.sender.slice(1)} (ID: ${msg.id})</div>
-                <div class="content">${renderedText}</div>
-                ${attachmentsHtml}
-                ${codeBlocksHtml}
-                ${toolOutputsHtml}
-            `;
-            messageListEl.appendChild(msgDiv);
-        });
-        messageListEl.scrollTop = messageListEl.scrollHeight; // Scroll to bottom
+        remeasure() {
+            this.scheduleRender();
+        },
+
+        scheduleRender() {
+            if (this.frameRequested) return;
+            this.frameRequested = true;
+            requestAnimationFrame(() => {
+                this.frameRequested = false;
+                this.render();
+            });
+        },
+
+        scrollToBottom() {
+            // Heights are estimates until rows are measured, so settle over a few passes
+            for (let pass = 0; pass < 3; pass++) {
+                messageListEl.scrollTop = messageListEl.scrollHeight;
+                this.render();
+            }
+            messageListEl.scrollTop = messageListEl.scrollHeight;
+        },
+    };
+
+    messageListEl.addEventListener('scroll', () => virtualList.scheduleRender());
+    // 'toggle' doesn't bubble, so listen in the capture phase for any expanded/collapsed <details>
+    messageListEl.addEventListener('toggle', () => virtualList.remeasure(), true);
+    window.addEventListener('resize', () => virtualList.scheduleRender());
+
+    // "Load full output" buttons of truncated tool outputs, in client- and server-rendered messages
+    messageListEl.addEventListener('click', async (event) => {
+        const button = event.target.closest('.load-tool-output');
+        if (!button || !currentComposerId) return;
+        button.disabled = true;
+        button.textContent = 'Loading...';
+        try {
+            const url = `/api/conversations/${currentComposerId}/messages/${encodeURIComponent(button.dataset.messageId)}/tool-output?index=${button.dataset.index}`;
+            const toolOutput = await fetchJson(url);
+            const data = typeof toolOutput.data === 'object' && toolOutput.data !== null
+                ? JSON.stringify(toolOutput.data, null, 2) : String(toolOutput.data ?? '');
+            const preview = button.previousElementSibling;
+            if (preview && preview.tagName === 'PRE') preview.remove();
+            button.outerHTML = `<pre><code>${escapeHtml(data)}</code></pre>`;
+        } catch (error) {
+            button.disabled = false;
+            button.textContent = `Error loading output: ${error.message}`;
+        }
+        virtualList.remeasure();
+    });
+
+    function renderMessages(messages) {
+        if (!messages || messages.length === 0) {
+            virtualList.itemsEl = null;
+            messageListEl.innerHTML = '<p class="placeholder">No messages in this conversation.</p>';
+            return;
+        }
+        virtualList.reset(messages);
+        virtualList.scrollToBottom();
     }
 
     // Initial load